@@ -0,0 +1,177 @@
+"""
+AnalyzePrice の時間ごとのパーセンタイル価格を、生データを読み込んで pandas で集計する場合
+（percentile_price_by_hour）と、Trino で集計する場合（percentile_price_by_hour_sql）と、
+mart のロールアップ（mrt_price_hourly_rollup）から読む場合（rollup=True）の比較ベンチマーク。
+create_price_graph と同じく、6アイテム分の系列を作る（核だけ個数で絞り込む）。
+1d / 1w / 1m の範囲ごとに、転送した行数と所要時間を出す。
+
+    cd dqx
+    python -m benchmark.bench_analyze_pushdown
+    python -m benchmark.bench_analyze_pushdown --host trino.mynet --port 80 --end "2025-06-01 21:00:00"
+
+--host を指定しない場合は benchmark.mock_trino のスタンドインが合成データを返す
+（クエリの範囲の1時間あたり --rows-per-hour 行。集計のクエリとロールアップには1時間1行を返す。
+ロールアップは --rollup-lag 時間前までしか更新されていないものとし、それより新しい時間は
+price_hourly をロールアップと同じ式で集計する）。
+スタンドインでは Trino 側の集計のコストは含まれないので、実際の比較は --host で行う。
+"""
+
+import argparse
+import re
+import time
+
+import pandas as pd
+
+from benchmark.mock_trino import MockTrinoAPI, PRICE_HOURLY_COLUMNS, price_hourly_rows
+from benchmark.synthetic import FOCUS_ITEMS
+from common.AnalyzePrice import AnalyzePrice
+from common.trino_api import TrinoAPI
+
+
+WINDOWS = {
+    "1d": pd.Timedelta(days=1),
+    "1w": pd.Timedelta(weeks=1),
+    "1m": pd.Timedelta(days=30),
+}
+PERCENTILE = 0.05
+# create_price_graph と同じく、核だけまとめ売りを除く
+QUANTITY_THRESHOLDS = {"輝晶核": 3, "閃輝晶核": 3}
+
+
+class CountingTrino:
+    """execute_query が返した行数を数える"""
+
+    def __init__(self, trino):
+        self.trino = trino
+        self.rows = 0
+        self.queries = 0
+
+    def execute_query(self, query, fetch="rows", batch_size=10000):
+        df = self.trino.execute_query(query, fetch=fetch, batch_size=batch_size)
+        self.rows += len(df)
+        self.queries += 1
+        return df
+
+
+ROLLUP_COLUMNS = [("name", "varchar"), ("ts_hour", "timestamp(6)")] + [
+    (column, "double")
+    for column in ["min_price", "p5_price", "min_price_q3", "p5_price_q3"]
+]
+
+
+def mock_trino(rows_per_hour, rollup_high):
+    def result_factory(query):
+        times = [pd.Timestamp(t) for t in re.findall(r"TIMESTAMP '([^']+)'", query)]
+        n_hours = len(pd.date_range(times[0].ceil("h"), times[1].floor("h"), freq="h"))
+        if "mrt_price_hourly_rollup" in query or "date_trunc" in query:
+            # ロールアップと、まだロールアップに無い時間を price_hourly から集計したもの
+            if "date_trunc" in query:
+                hours = pd.date_range(times[0].ceil("h"), times[1].floor("h"), freq="h")
+            else:
+                hours = pd.date_range(times[0], min(times[1], rollup_high), freq="h")
+            columns = ROLLUP_COLUMNS
+            rows = (
+                [name, hour.to_pydatetime()] + [1000.0 + i] * 4
+                for i, hour in enumerate(hours)
+                for name in FOCUS_ITEMS
+            )
+            return columns, rows
+        if "GROUP BY" in query:
+            columns = [
+                ("name", "varchar"),
+                ("observed_at", "timestamp(6)"),
+                ("value", "integer"),
+            ]
+            rows = (
+                [name, observed_at, price]
+                for name, price, _, observed_at in price_hourly_rows(
+                    n_hours, rows_per_hour=1
+                )
+            )
+            return columns, rows
+        return PRICE_HOURLY_COLUMNS, price_hourly_rows(
+            n_hours * rows_per_hour, rows_per_hour
+        )
+
+    return MockTrinoAPI(result_factory)
+
+
+def pandas_series(trino, datetime_range):
+    analyze = AnalyzePrice(
+        "price_hourly", datetime_range, item_names=FOCUS_ITEMS, trino=trino
+    )
+    return {
+        item_name: analyze.percentile_price_by_hour(
+            item_name, PERCENTILE, QUANTITY_THRESHOLDS.get(item_name)
+        )
+        for item_name in FOCUS_ITEMS
+    }
+
+
+def sql_series(trino, datetime_range):
+    analyze = AnalyzePrice(
+        "price_hourly", datetime_range, item_names=FOCUS_ITEMS, load=False, trino=trino
+    )
+    return {
+        item_name: analyze.percentile_price_by_hour_sql(
+            item_name, PERCENTILE, QUANTITY_THRESHOLDS.get(item_name)
+        )
+        for item_name in FOCUS_ITEMS
+    }
+
+
+def rollup_series(trino, datetime_range):
+    analyze = AnalyzePrice(
+        "price_hourly", datetime_range, item_names=FOCUS_ITEMS, trino=trino, rollup=True
+    )
+    return {
+        item_name: analyze.percentile_price_by_hour(
+            item_name, PERCENTILE, QUANTITY_THRESHOLDS.get(item_name)
+        )
+        for item_name in FOCUS_ITEMS
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--user", default="tig")
+    parser.add_argument("--catalog", default="iceberg")
+    parser.add_argument("--end", default="2025-02-01 21:00:00")
+    parser.add_argument("--windows", default="1d,1w,1m")
+    parser.add_argument("--rows-per-hour", type=int, default=300)
+    parser.add_argument("--rollup-lag", type=int, default=1)
+    args = parser.parse_args()
+
+    end = pd.Timestamp(args.end)
+    print(f"{'window':>6} {'mode':>7} {'queries':>8} {'rows':>10} {'sec':>8}")
+    for window in args.windows.split(","):
+        start = end - WINDOWS[window]
+        datetime_range = {"start": start, "end": end}
+        modes = [
+            ("pandas", pandas_series),
+            ("sql", sql_series),
+            ("rollup", rollup_series),
+        ]
+        for mode, build in modes:
+            if args.host:
+                trino = TrinoAPI(
+                    host=args.host, port=args.port, user=args.user, catalog=args.catalog
+                )
+            else:
+                rollup_high = end.floor("h") - pd.Timedelta(hours=args.rollup_lag)
+                trino = mock_trino(args.rows_per_hour, rollup_high)
+            counting = CountingTrino(trino)
+            started = time.perf_counter()
+            series = build(counting, datetime_range)
+            seconds = time.perf_counter() - started
+            points = sum(len(s) for s in series.values())
+            print(
+                f"{window:>6} {mode:>7} {counting.queries:>8} {counting.rows:>10,} "
+                f"{seconds:8.3f}  ({points} points)"
+            )
+
+
+if __name__ == "__main__":
+    main()
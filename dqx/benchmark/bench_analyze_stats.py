@@ -0,0 +1,108 @@
+"""
+AnalyzePrice の hourly_summary / vwap / rolling_stats / volume_zscore のベンチマーク。
+1年分の合成した出品情報に対して、従来の書き方（VWAP を g.apply でグループごとに計算し、
+統計ごとに resample し直す）と、hourly_stats の1回の集計を使い回す書き方を比べる。
+
+    cd dqx
+    python -m benchmark.bench_analyze_stats
+    python -m benchmark.bench_analyze_stats --days 365 --rows-per-hour 300 --repeat 3
+
+Trino には接続せず、benchmark.synthetic の合成データを AnalyzePrice に読ませる。
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark.synthetic import FOCUS_ITEMS, make_price_hourly
+from common.AnalyzePrice import AnalyzePrice
+
+
+class FrameTrino:
+    """execute_query で決まった DataFrame を返す"""
+
+    def __init__(self, df):
+        self.df = df
+
+    def execute_query(self, query, fetch="rows", batch_size=10000):
+        return self.df.copy()
+
+
+def legacy_stats(analyze, item_name, q_threshold=None):
+    """従来の hourly_summary / vwap / rolling_stats / volume_zscore と同じ計算"""
+    df = analyze.extract_item_price(item_name, q_threshold)
+    df = df.set_index("Datetime").rename(
+        columns={"1つあたりの価格": "unit_price", "個数": "quantity"}
+    )[["unit_price", "quantity"]]
+    df = df.astype("float64")
+    g = df.groupby(df.index.floor("h"))
+    summary = pd.DataFrame(
+        {
+            "min": g["unit_price"].min(),
+            "median": g["unit_price"].median(),
+            "vwap": g.apply(
+                lambda d: (d["unit_price"] * d["quantity"]).sum() / d["quantity"].sum()
+            ),
+            "volume": g["quantity"].sum(),
+        }
+    )
+    vol = df["quantity"].sum()
+    vwap = (df["unit_price"] * df["quantity"]).sum() / vol if vol else np.nan
+    s = df["unit_price"].resample("1h").mean()
+    rolling = pd.DataFrame({"ma": s.rolling(24).mean(), "sigma": s.rolling(24).std()})
+    volume = df["quantity"].resample("1h").sum()
+    zscore = (volume - volume.rolling(168).mean()) / volume.rolling(168).std()
+    return summary, vwap, rolling, zscore
+
+
+def vectorized_stats(analyze, item_name, q_threshold=None):
+    return (
+        analyze.hourly_summary(item_name, q_threshold),
+        analyze.vwap(item_name, q_threshold),
+        analyze.rolling_stats(item_name, q_threshold=q_threshold),
+        analyze.volume_zscore(item_name, q_threshold=q_threshold),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--rows-per-hour", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    n_rows = args.days * 24 * args.rows_per_hour
+    df = make_price_hourly(n_rows, rows_per_hour=args.rows_per_hour)
+    df = df.rename(columns={"Name": "name"})[
+        ["name", "1つあたりの価格", "個数", "observed_at"]
+    ]
+    datetime_range = {"start": df["observed_at"].min(), "end": df["observed_at"].max()}
+    print(f"{n_rows:,} rows ({args.days} days, {len(FOCUS_ITEMS)} items)")
+
+    results = {}
+    for name, compute in [("legacy", legacy_stats), ("vectorized", vectorized_stats)]:
+        seconds = 0.0
+        for _ in range(args.repeat):
+            # hourly_stats の使い回しを含めて計るため、毎回新しく作る
+            analyze = AnalyzePrice("price_hourly", datetime_range, trino=FrameTrino(df))
+            start = time.perf_counter()
+            results[name] = [compute(analyze, item_name) for item_name in FOCUS_ITEMS]
+            seconds += time.perf_counter() - start
+        print(
+            f"{name:>10}: {seconds / args.repeat:8.3f} s for {len(FOCUS_ITEMS)} items"
+        )
+
+    for legacy, vectorized in zip(results["legacy"], results["vectorized"]):
+        summary, vwap, rolling, zscore = legacy
+        pd.testing.assert_frame_equal(
+            vectorized[0], summary, check_freq=False, check_names=False
+        )
+        assert np.isclose(vectorized[1], vwap)
+        pd.testing.assert_frame_equal(vectorized[2], rolling, check_names=False)
+        pd.testing.assert_series_equal(vectorized[3], zscore, check_names=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+common.bazaar_parser の backend ("bs4" / "html") の比較ベンチマーク。
+保存しておいた出品一覧のページ (benchmark/fixtures/bazaar/*.html) を各 backend で読み、
+"bs4"（従来の方法）と結果が完全に一致するかを確かめてから、ページ数 / 行数あたりの速度を出す。
+
+    cd dqx
+    python -m benchmark.bench_bazaar_parser
+    python -m benchmark.bench_bazaar_parser --repeat 50 --fixtures path/to/pages
+    python -m benchmark.bench_bazaar_parser --write-fixtures   # 合成ページで作り直す
+
+既定のフィクスチャは benchmark.fake_hiroba の合成ページなので、実際のページでの一致は
+--fixtures に記録したページを渡して確かめる。
+フィクスチャのファイル名は "<アイテムのハッシュ>.<任意のラベル>.html" にする
+（ページャーのリンクをハッシュで判定するため）。
+"""
+
+import argparse
+import pathlib
+import time
+
+from benchmark.fake_hiroba import (
+    bazaar_page_html,
+    empty_bazaar_page_html,
+    item_hash,
+    login_page_html,
+)
+from common.bazaar_parser import PARSER_BACKENDS, parse_bazaar_page
+
+
+FIXTURE_DIR = pathlib.Path(__file__).resolve().parent / "fixtures" / "bazaar"
+
+
+def write_fixtures(fixture_dir):
+    """合成した出品一覧のページをフィクスチャとして書き出す"""
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    hash_value = item_hash("輝晶核")
+    pages = {
+        "single_page": bazaar_page_html(hash_value, 0, 1),
+        "page00_of_12": bazaar_page_html(hash_value, 0, 12),
+        "page05_of_12": bazaar_page_html(hash_value, 5, 12),
+        "page11_of_12": bazaar_page_html(hash_value, 11, 12),
+        "page12_of_12_out_of_range": bazaar_page_html(hash_value, 12, 12),
+        "no_items": empty_bazaar_page_html(),
+        "login": login_page_html(),
+    }
+    for label, html in pages.items():
+        path = fixture_dir / f"{hash_value}.{label}.html"
+        path.write_text(html, encoding="utf-8")
+        print(f"wrote {path}")
+
+
+def load_fixtures(fixture_dir):
+    """(ファイル名, アイテムのハッシュ, HTML のバイト列) のリストを返す"""
+    return [
+        (path.name, path.name.split(".")[0], path.read_bytes())
+        for path in sorted(fixture_dir.glob("*.html"))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", type=pathlib.Path, default=FIXTURE_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--write-fixtures", action="store_true")
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        write_fixtures(args.fixtures)
+        return
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"no fixtures in {args.fixtures} (--write-fixtures で作れる)")
+
+    expected = {
+        name: parse_bazaar_page(content, hash_value, backend="bs4")
+        for name, hash_value, content in fixtures
+    }
+    n_rows = sum(
+        len(page.columns["できのよさ"])
+        for page in expected.values()
+        if page.columns is not None
+    )
+    print(f"{len(fixtures)} pages, {n_rows} rows, repeat {args.repeat}")
+    for backend in PARSER_BACKENDS:
+        try:
+            for name, hash_value, content in fixtures:
+                page = parse_bazaar_page(content, hash_value, backend=backend)
+                assert page.columns == expected[name].columns, (backend, name)
+                assert page.page_numbers == expected[name].page_numbers, (backend, name)
+                assert page.login_required == expected[name].login_required, (
+                    backend,
+                    name,
+                )
+        except ImportError as e:
+            print(f"{backend:>5}: skipped ({e})")
+            continue
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for name, hash_value, content in fixtures:
+                parse_bazaar_page(content, hash_value, backend=backend)
+        elapsed = time.perf_counter() - start
+        pages_per_sec = len(fixtures) * args.repeat / elapsed
+        rows_per_sec = n_rows * args.repeat / elapsed
+        print(
+            f"{backend:>5}: {elapsed:7.3f}s, {pages_per_sec:8.1f} pages/s, "
+            f"{rows_per_sec:9.1f} rows/s (matches bs4)"
+        )
+
+
+if __name__ == "__main__":
+    main()
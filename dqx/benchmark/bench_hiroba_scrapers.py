@@ -0,0 +1,186 @@
+"""
+冒険者の広場のスクレイパーを、フィクスチャのリプレイサーバーに対して動かすベンチマーク。
+広場には接続せず、benchmark/fixtures/hiroba のページを benchmark.replay_server で返す。
+各スクレイパーの結果の行数がフィクスチャから決まる値と一致するか
+（DQXPriceSearch は backend "bs4" の結果と一致するか）を確かめてから、
+取得したページ数 / 読んだ行数あたりの速度を出す。
+
+    cd dqx
+    python -m benchmark.hiroba_fixtures              # フィクスチャを作る（初回 / 変更時）
+    python -m benchmark.bench_hiroba_scrapers
+    python -m benchmark.bench_hiroba_scrapers --repeat 20 --only get_trade
+
+フィクスチャは合成ページなので、一致するのはこちらで書いたマークアップに対してだけ
+（実際の広場のページとの一致は、record で記録したページを置いて確かめる）。
+
+get_trade_buy / get_trade_sell はページごと・行ごとの sleep を入れているが、
+計測したいのはパースなので、計測中はモジュールの sleep を何もしない関数に差し替える。
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from unittest import mock
+
+import pandas as pd
+
+from benchmark.fake_hiroba import StaticCatalog
+from benchmark.hiroba_fixtures import (
+    BAZAAR_ITEMS,
+    DIARY_CHARACTER_ID,
+    DIARY_TITLE,
+    EXPECTED_ROWS,
+    SEARCH_WORDS,
+    SUBSTITUTIONS,
+)
+from benchmark.replay_server import FIXTURE_ROOT, ReplayServer, replay_session
+from common.bazaar_parser import PARSER_BACKENDS
+from common.DQXEditDiary import DQXEditDiary
+from common.DQXPriceSearch import DQXPriceSearch
+from get_item_hash_hiroba import get_item_hash
+from get_momon_bazzar.get_momon_bazzar import DQXDiarySearch
+from get_trade_history import get_trade_history
+
+
+def _no_sleep(seconds):
+    pass
+
+
+def price_search_scenario(backend, mode):
+    def run(session):
+        search = DQXPriceSearch(
+            catalog=StaticCatalog(BAZAAR_ITEMS),
+            requests_per_second=None,
+            session=session,
+            parser=backend,
+        )
+        frames = [
+            search.search_price(item_name, mode=mode) for item_name in BAZAAR_ITEMS
+        ]
+        return sum(len(df) for df in frames), frames
+
+    return run
+
+
+def trade_buy(session):
+    with mock.patch.object(get_trade_history, "sleep", _no_sleep):
+        df = get_trade_history.get_trade_buy.fn(session)
+    return len(df), df
+
+
+def trade_sell(session):
+    with mock.patch.object(get_trade_history, "sleep", _no_sleep):
+        df = get_trade_history.get_trade_sell.fn(session)
+    return len(df), df
+
+
+def item_hash_search(session):
+    # search_item_hash は検索ワードを print するので、計測中の出力は捨てる
+    with contextlib.redirect_stdout(io.StringIO()):
+        hashes = [
+            get_item_hash.search_item_hash.fn(session, search_word)
+            for search_word in SEARCH_WORDS
+        ]
+    return sum(hash_id is not None for hash_id in hashes), hashes
+
+
+def diary_search(session):
+    diaries = DQXDiarySearch(session=session).search_diary(
+        category_num=12, search_word="細胞"
+    )
+    return len(diaries), diaries
+
+
+def diary_id_list(session):
+    id_list = DQXEditDiary(DIARY_CHARACTER_ID, session=session).get_diary_id_list(
+        DIARY_TITLE
+    )
+    return len(id_list), id_list
+
+
+def post_diary(session):
+    status_code, _ = DQXEditDiary(DIARY_CHARACTER_ID, session=session).post_diary(
+        category_num=50, title=DIARY_TITLE, message="ベンチマーク"
+    )
+    if status_code != 200:
+        raise AssertionError(f"post_diary returned {status_code}")
+    return 0, status_code
+
+
+def scenarios():
+    """{名前: (session を受け取り (行数, 結果) を返す関数, 期待する行数 or None)}"""
+    cases = {}
+    for mode in ("sequential", "concurrent"):
+        for backend in PARSER_BACKENDS:
+            cases[f"DQXPriceSearch[{backend},{mode}]"] = (
+                price_search_scenario(backend, mode),
+                None,
+            )
+    cases["get_trade_buy"] = (trade_buy, EXPECTED_ROWS["get_trade_buy"])
+    cases["get_trade_sell"] = (trade_sell, EXPECTED_ROWS["get_trade_sell"])
+    cases["search_item_hash"] = (item_hash_search, EXPECTED_ROWS["search_item_hash"])
+    cases["DQXDiarySearch.search_diary"] = (diary_search, EXPECTED_ROWS["search_diary"])
+    cases["DQXEditDiary.get_diary_id_list"] = (
+        diary_id_list,
+        EXPECTED_ROWS["get_diary_id_list"],
+    )
+    cases["DQXEditDiary.post_diary"] = (post_diary, 0)
+    return cases
+
+
+def _check_price_frames(name, frames, reference):
+    for df, df_ref in zip(frames, reference):
+        pd.testing.assert_frame_equal(
+            df.reset_index(drop=True), df_ref.reset_index(drop=True), obj=name
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=FIXTURE_ROOT)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="名前にこの文字列を含むシナリオだけを実行する")
+    args = parser.parse_args()
+
+    cases = scenarios()
+    if args.only:
+        cases = {name: case for name, case in cases.items() if args.only in name}
+
+    with ReplayServer(args.root, SUBSTITUTIONS) as server:
+        session = replay_session(server)
+        references = {}
+        print(
+            f"{'scenario':>40} {'pages':>6} {'rows':>6} {'sec':>8} "
+            f"{'pages/s':>9} {'rows/s':>10}"
+        )
+        for name, (run, expected_rows) in cases.items():
+            # 1回目で結果を確かめる（計測には含めない）
+            served = server.requests_served
+            n_rows, result = run(session)
+            n_pages = server.requests_served - served
+            if server.missing:
+                raise SystemExit(f"{name}: fixture not found: {server.missing}")
+            if name.startswith("DQXPriceSearch"):
+                mode = name.split(",")[1]
+                if "[bs4," in name:
+                    references[mode] = result
+                elif mode in references:
+                    _check_price_frames(name, result, references[mode])
+            elif n_rows != expected_rows:
+                raise SystemExit(f"{name}: {n_rows} rows (expected {expected_rows})")
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                run(session)
+            seconds = time.perf_counter() - start
+            pages = n_pages * args.repeat
+            rows = n_rows * args.repeat
+            print(
+                f"{name:>40} {n_pages:>6} {n_rows:>6} {seconds:8.3f} "
+                f"{pages / seconds:9.1f} {rows / seconds:10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+get_price_hourly の後段（保存 / discord へのメッセージ / 21時のグラフ / mart の更新）を
+順に行う場合（pipeline=False）と、並行に進める場合（pipeline=True）の所要時間の比較ベンチマーク。
+広場・Trino・discord・Prefect API には接続せず、各ステージを指定した秒数だけ待つ関数に差し替える。
+フローの最後に出るステージごとの時刻（StageTimer.report）で、どこが重なったかを確かめる。
+
+    cd dqx
+    python -m benchmark.bench_hourly_pipeline
+    python -m benchmark.bench_hourly_pipeline --save 8 --graph 2 --weekday Friday
+"""
+
+import argparse
+import time
+from unittest import mock
+
+from benchmark.synthetic import FOCUS_ITEMS, make_price_hourly
+from common.price_sketch import PriceSketches
+from get_price import get_price
+
+
+def _wait(seconds, result=None):
+    def fn(*args, **kwargs):
+        time.sleep(seconds)
+        return result
+
+    return fn
+
+
+class FixedDatetimeTranslator(get_price.DatetimeTranslator):
+    """hour / weekday を固定した DatetimeTranslator（21時のグラフを送る日時にする）"""
+
+    def __init__(self, hour, weekday):
+        super().__init__()
+        self._hour = hour
+        self._weekday = weekday
+
+    def hour(self, replace_hour=None):
+        return self._hour
+
+    def weekday(self, days=0, weeks=0, months=0):
+        return self._weekday
+
+
+def run_hourly(args, pipeline):
+    """各ステージを差し替えて get_price_hourly を1回実行し、所要時間を返す"""
+    df = make_price_hourly(len(FOCUS_ITEMS) * args.rows_per_item)
+    prices = {item_name: df[df["Name"] == item_name] for item_name in FOCUS_ITEMS}
+    patches = [
+        mock.patch.object(
+            get_price,
+            "DatetimeTranslator",
+            lambda: FixedDatetimeTranslator(args.hour, args.weekday),
+        ),
+        mock.patch.object(
+            get_price, "scrape_prices", _wait(args.scrape, (prices, PriceSketches()))
+        ),
+        mock.patch.object(get_price, "save_to_iceberg", _wait(args.save)),
+        mock.patch.object(get_price, "save_hourly_sketches", _wait(args.sketches)),
+        mock.patch.object(
+            get_price,
+            "create_message_kishoukaku_hourly_price",
+            _wait(args.message, "message"),
+        ),
+        mock.patch.object(get_price, "send_to_discord", _wait(args.discord)),
+        mock.patch.object(
+            get_price, "create_price_graph", _wait(args.graph, "graph.png")
+        ),
+        mock.patch.object(get_price.requests, "post", _wait(args.mart)),
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        start = time.perf_counter()
+        get_price.get_price_hourly.fn(pipeline=pipeline, save_sketches=True)
+        return time.perf_counter() - start
+    finally:
+        for patch in patches:
+            patch.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scrape", type=float, default=3.0, help="価格の取得（秒）")
+    parser.add_argument(
+        "--save", type=float, default=4.0, help="Iceberg への保存（秒）"
+    )
+    parser.add_argument(
+        "--sketches", type=float, default=0.1, help="スケッチの保存（秒）"
+    )
+    parser.add_argument(
+        "--message", type=float, default=0.2, help="メッセージの作成（秒）"
+    )
+    parser.add_argument(
+        "--discord", type=float, default=0.3, help="discord への送信1回（秒）"
+    )
+    parser.add_argument(
+        "--graph", type=float, default=1.5, help="グラフ1枚の作成（秒）"
+    )
+    parser.add_argument(
+        "--mart", type=float, default=0.5, help="mart の flow の起動（秒）"
+    )
+    parser.add_argument("--hour", default="21")
+    parser.add_argument("--weekday", default="Monday")
+    parser.add_argument("--rows-per-item", type=int, default=300)
+    args = parser.parse_args()
+
+    results = {}
+    for pipeline in (False, True):
+        print(f"--- pipeline={pipeline}")
+        results[pipeline] = run_hourly(args, pipeline)
+    print(
+        f"sequential {results[False]:.1f}s -> pipeline {results[True]:.1f}s "
+        f"({results[False] - results[True]:.1f}s faster)"
+    )
+
+
+if __name__ == "__main__":
+    main()
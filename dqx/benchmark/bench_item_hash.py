@@ -0,0 +1,91 @@
+"""
+DQXPriceSearch.get_item_hash の引き方の比較ベンチマーク。
+- "mask": 3テーブルを結合した DataFrame を毎回ブールマスクで絞り込む（従来の方法）
+- "dict": build_item_hash_index で作った アイテム名 -> ハッシュ の辞書を引く
+
+    cd dqx
+    python -m benchmark.bench_item_hash
+    python -m benchmark.bench_item_hash --items 30000 --lookups 5000
+
+メタデータは合成したものを使う（Trino には接続しない）。
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from common.DQXPriceSearch import build_item_hash_index
+
+
+def make_hash_tables(n_items, seed=0):
+    """metadata_*_hash と同じ2列の DataFrame を3テーブル分作る（名前の重複も少し混ぜる）"""
+    rng = np.random.default_rng(seed)
+    names = [f"アイテム{i:06d}" for i in range(n_items)]
+    # 武器と防具で同じ名前が出てくるケース
+    names += [names[i] for i in rng.choice(n_items, n_items // 100, replace=False)]
+    hashes = [f"{i:032x}" for i in rng.integers(0, 2**62, len(names))]
+    frames = []
+    for part in np.array_split(np.arange(len(names)), 3):
+        frames.append(
+            pd.DataFrame(
+                {
+                    "アイテム名": [names[i] for i in part],
+                    "ハッシュ": [hashes[i] for i in part],
+                }
+            )
+        )
+    return frames
+
+
+def mask_lookup(df_hash, item_name):
+    """従来の get_item_hash と同じ処理"""
+    item_hash = df_hash[df_hash["アイテム名"] == item_name]["ハッシュ"]
+    if len(item_hash) == 0:
+        return None
+    return item_hash.values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    frames = make_hash_tables(args.items)
+    rng = np.random.default_rng(1)
+    all_names = pd.concat(frames)["アイテム名"].tolist()
+    # 見つからない名前も混ぜる
+    targets = [all_names[i] for i in rng.integers(0, len(all_names), args.lookups)]
+    targets += ["存在しないアイテム"] * (args.lookups // 10)
+
+    start = time.perf_counter()
+    df_hash = pd.concat(frames, ignore_index=True)
+    mask_build = time.perf_counter() - start
+    start = time.perf_counter()
+    mask_results = [mask_lookup(df_hash, name) for name in targets]
+    mask_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = build_item_hash_index(frames)
+    dict_build = time.perf_counter() - start
+    start = time.perf_counter()
+    dict_results = [index.get(name) for name in targets]
+    dict_sec = time.perf_counter() - start
+
+    assert mask_results == dict_results, "mask と dict で結果が異なる"
+    print(f"rows: {len(df_hash)}, lookups: {len(targets)}")
+    print(
+        f"mask: build {mask_build:.4f}s, lookup {mask_sec:.4f}s "
+        f"({mask_sec / len(targets) * 1e6:.1f}us/lookup), "
+        f"{df_hash.memory_usage(deep=True).sum() / 1024**2:.1f} MB"
+    )
+    print(
+        f"dict: build {dict_build:.4f}s, lookup {dict_sec:.6f}s "
+        f"({dict_sec / len(targets) * 1e6:.3f}us/lookup), {len(index)} keys"
+    )
+
+
+if __name__ == "__main__":
+    main()
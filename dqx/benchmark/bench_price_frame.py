@@ -0,0 +1,123 @@
+"""
+価格取得の結果を DataFrame にまとめる方法の比較ベンチマーク（時間とメモリ）。
+- "concat": ページごと・アイテムごとに pd.concat で DataFrame を伸ばしていく（従来の方法）
+- "lists": ページの列ごとのリストを貯めて1回で型付きの DataFrame にし
+  （DQXPriceSearch._merge_pages）、アイテムの分も concat_prices で1回だけ結合する
+
+    cd dqx
+    python -m benchmark.bench_price_frame
+    python -m benchmark.bench_price_frame --pages 200 --rows-per-page 50 --items 6
+
+ページは benchmark.fake_hiroba の合成ページを common.bazaar_parser で読んだものを使う
+（広場には接続しない）。メモリは tracemalloc で計った結合中のピークと、
+できあがった DataFrame の memory_usage(deep=True) を出す。
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+import requests
+
+from benchmark.fake_hiroba import StaticCatalog, bazaar_page_html, item_hash
+from benchmark.synthetic import FOCUS_ITEMS
+from common.bazaar_parser import PRICE_COLUMNS, parse_bazaar_page
+from common.DQXPriceSearch import DQXPriceSearch, concat_prices
+
+
+def make_pages(item_names, n_pages, rows_per_page):
+    """{アイテム名: {ページ番号: 列ごとのリスト}} を作る"""
+    pages = {}
+    for item_name in item_names:
+        hash_value = item_hash(item_name)
+        pages[item_name] = {
+            page_num: parse_bazaar_page(
+                bazaar_page_html(hash_value, page_num, n_pages, rows_per_page),
+                hash_value,
+            ).columns
+            for page_num in range(n_pages)
+        }
+    return pages
+
+
+def build_concat(pages):
+    """従来の search_price / get_price_hourly と同じく、ページごと・アイテムごとに結合する"""
+    df_all_price = pd.DataFrame()
+    for item_name, item_pages in pages.items():
+        for page_num, data in item_pages.items():
+            if page_num == 0:
+                df = pd.DataFrame(data, columns=PRICE_COLUMNS)
+            else:
+                df = pd.concat(
+                    [df, pd.DataFrame(data, columns=df.columns)], ignore_index=True
+                )
+        df["Name"] = item_name
+        df_all_price = pd.concat([df_all_price, df], ignore_index=True)
+    return df_all_price
+
+
+def build_lists(pages, dqx):
+    """ページを列ごとのリストのまま貯め、最後にまとめて DataFrame にする"""
+    frames = []
+    for item_name, item_pages in pages.items():
+        df = dqx._merge_pages(item_pages)
+        df["Name"] = item_name
+        frames.append(df)
+    return concat_prices(frames, list(pages))
+
+
+def measure(build, repeat):
+    """(1回あたりの秒数, 結合中のメモリのピーク, 結果) を返す"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        build()
+    seconds = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    result = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--pages", type=int, default=50, help="1アイテムあたりのページ数"
+    )
+    parser.add_argument("--rows-per-page", type=int, default=10)
+    parser.add_argument("--items", type=int, default=1, help="アイテム数（最大6）")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    item_names = FOCUS_ITEMS[: args.items]
+    pages = make_pages(item_names, args.pages, args.rows_per_page)
+    dqx = DQXPriceSearch(catalog=StaticCatalog(item_names), session=requests.Session())
+    builders = {
+        "concat": lambda: build_concat(pages),
+        "lists": lambda: build_lists(pages, dqx),
+    }
+    results = {}
+    print(
+        f"items: {len(item_names)}, pages: {args.pages}, "
+        f"rows/page: {args.rows_per_page}"
+    )
+    for name, build in builders.items():
+        seconds, peak, df = measure(build, args.repeat)
+        results[name] = df
+        print(
+            f"{name:>7}: {seconds * 1000:8.2f} ms, peak {peak / 1024**2:7.2f} MB, "
+            f"frame {df.memory_usage(deep=True).sum() / 1024**2:7.2f} MB, "
+            f"{len(df)} rows"
+        )
+        print(f"{'':>9}dtypes: {dict(df.dtypes.astype(str))}")
+
+    # 値は同じで、型だけが違うことを確かめる
+    pd.testing.assert_frame_equal(
+        results["lists"].astype(results["concat"].dtypes.to_dict()),
+        results["concat"],
+    )
+
+
+if __name__ == "__main__":
+    main()
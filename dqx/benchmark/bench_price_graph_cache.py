@@ -0,0 +1,101 @@
+"""
+create_price_graph を毎回描き直す場合（cache=None）と、common.price_graph_cache の PNG のキャッシュを使う場合の比較ベンチマーク。
+同じ時間のうちに「!グラフ 1w」を --requests 回（1分ずつずらして）受けた後、price_hourly に次の時間が
+入ってからまた --requests 回受けた時と同じく、2つのアイテムの組のグラフを作る。
+
+    cd dqx
+    python -m benchmark.bench_price_graph_cache
+    python -m benchmark.bench_price_graph_cache --days 30 --requests 10
+
+Trino は benchmark.bench_analyze_pushdown のスタンドイン（max(observed_at) / max(ts_hour) だけはここで答える）。
+グラフの描画と PNG の書き出しは実際の plotly / kaleido で行う。
+"""
+
+import argparse
+import functools
+import tempfile
+import time
+from unittest import mock
+
+import pandas as pd
+
+from benchmark.bench_analyze_pushdown import mock_trino
+from common import get_price_graph
+from common.AnalyzePrice import AnalyzePrice
+from common.price_graph_cache import PriceGraphCache
+
+
+FOCUS_ITEM_MATRIX = [
+    ["輝晶核", "魔因細胞", "魔因細胞のかけら"],
+    ["閃輝晶核", "閃魔細胞", "閃魔細胞のかけら"],
+]
+
+
+class LatestTrino:
+    """max(observed_at) / max(ts_hour) のクエリには latest を返し、それ以外は trino に渡す"""
+
+    def __init__(self, trino, latest):
+        self.trino = trino
+        self.latest = latest
+
+    def execute_query(self, query, fetch="rows", batch_size=10000):
+        if "max(observed_at)" in query or "max(ts_hour)" in query:
+            return pd.DataFrame({"latest": [self.latest]})
+        return self.trino.execute_query(query, fetch=fetch, batch_size=batch_size)
+
+
+def send_graphs(start_datetime, end_datetime, cache):
+    """send_price_image と同じく、アイテムの組ごとにグラフを作る"""
+    for focus_item in FOCUS_ITEM_MATRIX:
+        get_price_graph.create_price_graph.fn(
+            focus_item,
+            start_datetime,
+            end_datetime,
+            graph_title=f"{start_datetime} ~ {end_datetime} {focus_item[0]}の価格推移",
+            cache=cache,
+        )
+
+
+def measure(label, trino, args, cache):
+    now = pd.Timestamp("2025-02-01 21:00:00")
+    seconds = 0.0
+    for hour in range(2):
+        # 次の時間の行が入ったものとする
+        trino.latest = now + pd.Timedelta(hours=hour)
+        start = time.perf_counter()
+        for minute in range(args.requests):
+            # 要求はその時間のうちの好きな時刻に来る（範囲の端は時間単位に揃っていない）
+            end_datetime = trino.latest + pd.Timedelta(minutes=3 + minute, seconds=12)
+            start_datetime = end_datetime - pd.Timedelta(days=args.days)
+            send_graphs(str(start_datetime), str(end_datetime), cache)
+        seconds += time.perf_counter() - start
+    n_requests = 2 * args.requests
+    print(f"{label:>8}: {seconds / n_requests * 1000:9.1f} ms/request")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--rows-per-hour", type=int, default=300)
+    parser.add_argument("--max-entries", type=int, default=64)
+    args = parser.parse_args()
+
+    end = pd.Timestamp("2025-02-01 22:00:00")
+    trino = LatestTrino(mock_trino(args.rows_per_hour, end), end)
+    with (
+        mock.patch.object(
+            get_price_graph,
+            "AnalyzePrice",
+            functools.partial(AnalyzePrice, trino=trino),
+        ),
+        tempfile.TemporaryDirectory() as root,
+    ):
+        measure("no cache", trino, args, None)
+        cache = PriceGraphCache(root, max_entries=args.max_entries)
+        measure("cache", trino, args, cache)
+        print(f"cache stats: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+AnalyzePrice を Trino から直接読む場合と、common.price_history_cache のキャッシュから読む場合の比較ベンチマーク。
+Discord の「!グラフ 1m」を繰り返し受けた時と同じく、同じ範囲の AnalyzePrice を何度も作る。
+- cold: キャッシュが空の状態（範囲全体を Trino から取り、日ごとの Parquet に書く）
+- warm: 2回目以降（settle 以内の新しい時間だけを Trino から取る）
+- next hour: 1時間進めた後（増えた1時間分だけを取ってキャッシュに足す）
+
+    cd dqx
+    python -m benchmark.bench_price_history_cache
+    python -m benchmark.bench_price_history_cache --days 30 --rows-per-hour 300 --repeat 10
+
+Trino は benchmark.mock_trino のスタンドインで、クエリの observed_at の範囲に入る1時間ごとの行を返す。
+"""
+
+import argparse
+import re
+import tempfile
+import time
+from unittest import mock
+
+import pandas as pd
+
+from benchmark.mock_trino import MockTrinoAPI, PRICE_HOURLY_COLUMNS
+from benchmark.synthetic import FOCUS_ITEMS
+from common import price_history_cache
+from common.AnalyzePrice import AnalyzePrice
+from common.price_history_cache import PriceHistoryCache
+
+
+class CountingTrino:
+    """execute_query が返した行数を数える"""
+
+    def __init__(self, trino):
+        self.trino = trino
+        self.rows = 0
+        self.queries = 0
+
+    def execute_query(self, query, fetch="rows", batch_size=10000):
+        df = self.trino.execute_query(query, fetch=fetch, batch_size=batch_size)
+        self.rows += len(df)
+        self.queries += 1
+        return df
+
+
+def range_trino(rows_per_hour):
+    """クエリの observed_at の範囲（>= / BETWEEN / < / <=）に入る時間の行を返すスタンドイン"""
+
+    def hours_in(query):
+        times = [pd.Timestamp(t) for t in re.findall(r"TIMESTAMP '([^']+)'", query)]
+        start, end = times[0], times[1]
+        hours = pd.date_range(start.ceil("h"), end.floor("h"), freq="h")
+        if "observed_at < TIMESTAMP" in query:
+            hours = hours[hours < end]
+        return hours
+
+    def result_factory(query):
+        rows = (
+            [
+                FOCUS_ITEMS[i % len(FOCUS_ITEMS)],
+                1000 + (i * 7919) % 200000,
+                1 + i % 9,
+                hour.to_pydatetime(),
+            ]
+            for hour in hours_in(query)
+            for i in range(rows_per_hour)
+        )
+        return PRICE_HOURLY_COLUMNS, rows
+
+    return MockTrinoAPI(result_factory)
+
+
+def build(trino, datetime_range, cache):
+    analyze = AnalyzePrice(
+        "price_hourly", datetime_range, item_names=FOCUS_ITEMS, trino=trino, cache=cache
+    )
+    return analyze.percentile_price_by_hour(FOCUS_ITEMS[0], 0.05, 3)
+
+
+def measure(label, trino, datetime_range, cache, repeat):
+    rows, queries = trino.rows, trino.queries
+    start = time.perf_counter()
+    for _ in range(repeat):
+        series = build(trino, datetime_range, cache)
+    seconds = (time.perf_counter() - start) / repeat
+    print(
+        f"{label:>18}: {seconds * 1000:9.1f} ms/read, "
+        f"{(trino.rows - rows) / repeat:>10,.0f} rows/read from Trino, "
+        f"{(trino.queries - queries) / repeat:4.1f} queries/read"
+    )
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rows-per-hour", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = pd.Timestamp("2025-02-01 21:10:00")
+    datetime_range = {"start": now - pd.Timedelta(days=args.days), "end": now}
+    trino = CountingTrino(range_trino(args.rows_per_hour))
+    reference = measure("trino", trino, datetime_range, None, args.repeat)
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = PriceHistoryCache(root, trino=trino)
+        with mock.patch.object(
+            price_history_cache, "_current_hour", lambda: now.floor("h")
+        ):
+            series = measure("cache (cold)", trino, datetime_range, cache, 1)
+            pd.testing.assert_series_equal(series, reference)
+            series = measure("cache (warm)", trino, datetime_range, cache, args.repeat)
+            pd.testing.assert_series_equal(series, reference)
+        # 1時間進めて、範囲も1時間ずらす
+        next_hour = now + pd.Timedelta(hours=1)
+        next_range = {
+            "start": datetime_range["start"] + pd.Timedelta(hours=1),
+            "end": next_hour,
+        }
+        with mock.patch.object(
+            price_history_cache, "_current_hour", lambda: next_hour.floor("h")
+        ):
+            measure("cache (next hour)", trino, next_range, cache, 1)
+            measure("cache (warm)", trino, next_range, cache, args.repeat)
+        print(f"cache stats: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
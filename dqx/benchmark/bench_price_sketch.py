@@ -0,0 +1,106 @@
+"""
+取得中に作る価格のスケッチ (common.price_sketch) のベンチマーク。
+- build: ページを DataFrame にまとめる時間（スケッチ無し / ページごとにスケッチに足す）
+- message: create_message_kishoukaku_hourly_price の時間（df_all を毎回絞り込んで quantile する / スケッチから取る）
+- daily: 1時間ごとのスケッチを24時間分まとめた P5 の誤差（全件の順位で見た P5 からのずれ）
+
+    cd dqx
+    python -m benchmark.bench_price_sketch
+    python -m benchmark.bench_price_sketch --pages 200 --rows-per-page 50 --k 200
+
+ページは benchmark.fake_hiroba の合成ページを common.bazaar_parser で読んだものを使う（広場には接続しない）。
+1アイテムの出品が k 件以下ならスケッチは全件を持つので、メッセージは DataFrame から作ったものと一致する。
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from benchmark.bench_price_frame import make_pages
+from benchmark.fake_hiroba import StaticCatalog
+from benchmark.synthetic import FOCUS_ITEMS
+from common.DQXPriceSearch import DQXPriceSearch, concat_prices
+from common.get_hourly_price import create_message_kishoukaku_hourly_price
+from common.price_sketch import KLLSketch, PriceSketches
+
+
+def build(pages, sketches=None):
+    dqx = DQXPriceSearch(
+        catalog=StaticCatalog(list(pages)),
+        session=requests.Session(),
+        sketches=sketches,
+    )
+    frames = []
+    for item_name, item_pages in pages.items():
+        # search_price と同じく、読んだページを1つずつ足してから最後に DataFrame にする
+        dqx._start_item(item_name)
+        merged = {}
+        for page_num, data in item_pages.items():
+            dqx._add_page(merged, page_num, data, item_name)
+        df = dqx._merge_pages(merged)
+        df["Name"] = item_name
+        frames.append(df)
+    return concat_prices(frames, list(pages))
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--rows-per-page", type=int, default=10)
+    parser.add_argument("--k", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--hourly-rows", type=int, default=3000)
+    args = parser.parse_args()
+
+    pages = make_pages(FOCUS_ITEMS, args.pages, args.rows_per_page)
+    print(
+        f"items: {len(FOCUS_ITEMS)}, pages: {args.pages}, "
+        f"rows/page: {args.rows_per_page}, k: {args.k}"
+    )
+    seconds, df_all = timed(lambda: build(pages), args.repeat)
+    print(f"   build (frame only): {seconds * 1000:8.2f} ms")
+    seconds, _ = timed(lambda: build(pages, PriceSketches(k=args.k)), args.repeat)
+    print(f"build (with sketches): {seconds * 1000:8.2f} ms")
+
+    sketches = PriceSketches(k=args.k)
+    build(pages, sketches)
+    message = create_message_kishoukaku_hourly_price.fn
+    seconds, from_frame = timed(lambda: message(df_all), args.repeat)
+    print(f"  message (quantile): {seconds * 1000:8.2f} ms")
+    seconds, from_sketch = timed(lambda: message(df_all, sketches), args.repeat)
+    print(f"  message (sketches): {seconds * 1000:8.2f} ms")
+    if len(df_all) // len(FOCUS_ITEMS) <= args.k:
+        assert from_frame == from_sketch, (from_frame, from_sketch)
+        print("  messages match")
+
+    # 24時間分の1時間ごとのスケッチをまとめて、日の P5 を求める
+    rng = np.random.default_rng(0)
+    hours = [
+        rng.lognormal(10 + 0.05 * np.sin(h / 4), 0.5, args.hourly_rows)
+        for h in range(24)
+    ]
+    daily = KLLSketch(args.k)
+    for values in hours:
+        daily.merge(KLLSketch(args.k).update(values))
+    values = np.concatenate(hours)
+    estimate = daily.quantile(0.05)
+    print(
+        f"  daily P5: exact {pd.Series(values).quantile(0.05):,.0f}, "
+        f"sketch {estimate:,.0f} (rank {np.mean(values <= estimate):.4f}), "
+        f"{sum(len(items) for items in daily.levels)} values kept "
+        f"of {len(values):,}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+get_price_hourly の価格取得（FOCUS_ITEMS の全ページ）にかかる時間の比較ベンチマーク。
+- "sequential": アイテムごとに1ページずつ取得し、アイテムの間で item_sleep 秒待つ（従来の方法）
+- "concurrent": アイテムごとに DQXPriceSearch の mode="concurrent" でページを並列に取得する
+- "async": AsyncDQXPriceSearch で全アイテムの全ページを1つのイベントループで取得する
+
+    cd dqx
+    python -m benchmark.bench_scrape
+    python -m benchmark.bench_scrape --pages 12 --latency 0.3 --rps 4
+
+広場には接続せず、benchmark.fake_hiroba のスタンドインが遅延付きでページを返す。
+"""
+
+import argparse
+import time
+
+from benchmark.fake_hiroba import (
+    FakeHirobaSession,
+    StaticCatalog,
+    fake_hiroba_transport,
+)
+from benchmark.synthetic import FOCUS_ITEMS
+from common.AsyncDQXPriceSearch import AsyncDQXPriceSearch
+from common.DQXPriceSearch import DQXPriceSearch
+
+
+def run_sync(args, mode):
+    session = FakeHirobaSession(args.pages, args.latency)
+    # 従来の方法はリクエストの頻度を制限していなかったので、それに合わせる
+    rps = None if mode == "sequential" else args.rps
+    frames = {}
+    for item_name in FOCUS_ITEMS:
+        dqx = DQXPriceSearch(
+            catalog=StaticCatalog(), requests_per_second=rps, session=session
+        )
+        frames[item_name] = dqx.search_price(item_name, mode=mode)
+        time.sleep(args.item_sleep)
+    return frames, session.requests_sent
+
+
+def run_async(args):
+    requests_sent = []
+    dqx = AsyncDQXPriceSearch(
+        catalog=StaticCatalog(),
+        requests_per_second=args.rps,
+        burst=args.burst,
+        session=FakeHirobaSession(args.pages),
+        transport=fake_hiroba_transport(args.pages, args.latency, requests_sent),
+    )
+    return dqx.search_prices(FOCUS_ITEMS), len(requests_sent)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--pages", type=int, default=8, help="1アイテムあたりのページ数"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.4, help="1リクエストの遅延 (秒)"
+    )
+    parser.add_argument("--item-sleep", type=float, default=0.7)
+    parser.add_argument("--rps", type=float, default=4)
+    parser.add_argument("--burst", type=int, default=4)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("sequential", "concurrent", "async"):
+        start = time.perf_counter()
+        if mode == "async":
+            frames, requests_sent = run_async(args)
+        else:
+            frames, requests_sent = run_sync(args, mode)
+        elapsed = time.perf_counter() - start
+        rows = sum(len(df) for df in frames.values())
+        results[mode] = frames
+        print(f"{mode:>10}: {elapsed:6.2f}s, {requests_sent} requests, {rows} rows")
+
+    for item_name in FOCUS_ITEMS:
+        expected = results["concurrent"][item_name]
+        assert results["async"][item_name].equals(expected), item_name
+        assert results["sequential"][item_name].equals(expected), item_name
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+dqx と life_dashboard の TrinoAPI（common/trino_api.py）を同じワークロードで計測するベンチマーク。
+2つのファイルが同じ内容かを最初に確認し、ずれていれば終了コード 1 で終わる。
+
+    cd dqx
+    python -m benchmark.bench_trino_client
+    python -m benchmark.bench_trino_client --rows 50000 --queries 500
+    python -m benchmark.bench_trino_client --sync   # dqx 側を life_dashboard にコピーする
+
+Trino には接続せず、benchmark.mock_trino のスタンドインに対して実行する。
+接続の再利用数 / DDL のスキップ数 / 送ったクエリ数も出すので、性能の退行が分かる。
+"""
+
+import argparse
+import filecmp
+import importlib.util
+import pathlib
+import shutil
+import sys
+import time
+
+from benchmark.mock_trino import PRICE_HOURLY_COLUMNS, mock_api_class, price_hourly_rows
+from benchmark.synthetic import make_price_hourly
+
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+CLIENT_PATHS = {
+    "dqx": ROOT / "dqx" / "common" / "trino_api.py",
+    "life_dashboard": ROOT / "life_dashboard" / "common" / "trino_api.py",
+}
+
+
+def load_client(project):
+    """プロジェクトの common/trino_api.py を別々のモジュールとして読み込む"""
+    spec = importlib.util.spec_from_file_location(
+        f"trino_api_{project}", CLIENT_PATHS[project]
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_workload(module, n_rows, n_queries):
+    """パイプラインで使う操作を一通り実行し、ステップごとの時間とカウンタを返す"""
+    queries = []
+
+    def result_factory(query):
+        queries.append(query)
+        if query.lstrip().upper().startswith("SELECT"):
+            return PRICE_HOURLY_COLUMNS, price_hourly_rows(n_rows)
+        return [("rows", "bigint")], [[0]]
+
+    api_class = mock_api_class(module.TrinoAPI)
+    trino = api_class(result_factory, ddl_cache=module.DDLCache())
+    df = make_price_hourly(n_rows)
+    timings = {}
+
+    start = time.perf_counter()
+    # compaction_flow / trino_tasks のように結果を返さないクエリを繰り返し投げる
+    for _ in range(n_queries):
+        trino.execute_action('ALTER TABLE "bench"."price_hourly" EXECUTE optimize')
+    timings["execute_action"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(2):
+        trino.create_schema("bench")
+        trino.create_table("price_hourly", "bench", trino.extract_columns(df))
+    timings["ddl x2"] = time.perf_counter() - start
+
+    for fetch in ("rows", "arrow"):
+        start = time.perf_counter()
+        trino.execute_query("SELECT * FROM price_hourly", fetch=fetch)
+        timings[f"execute_query({fetch})"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in trino.iter_query("SELECT * FROM price_hourly"):
+        pass
+    timings["iter_query"] = time.perf_counter() - start
+
+    for mode in ("values", "prepared"):
+        start = time.perf_counter()
+        trino.insert_table("price_hourly", "bench", df, mode=mode)
+        timings[f"insert_table({mode})"] = time.perf_counter() - start
+
+    counters = {
+        "queries": len(queries),
+        "connections_opened": trino.connections_opened,
+        "connections_reused": trino.connections_reused,
+        "ddl_executed": trino.ddl_cache.executed,
+        "ddl_skipped": trino.ddl_cache.skipped,
+    }
+    trino.close()
+    return timings, counters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="dqx 側の trino_api.py を life_dashboard にコピーする",
+    )
+    args = parser.parse_args()
+
+    if args.sync:
+        shutil.copyfile(CLIENT_PATHS["dqx"], CLIENT_PATHS["life_dashboard"])
+        print(f"copied {CLIENT_PATHS['dqx']} -> {CLIENT_PATHS['life_dashboard']}")
+        return
+
+    if not filecmp.cmp(
+        CLIENT_PATHS["dqx"], CLIENT_PATHS["life_dashboard"], shallow=False
+    ):
+        print(
+            "common/trino_api.py が dqx と life_dashboard で異なります (--sync で揃える)"
+        )
+        sys.exit(1)
+
+    for project in CLIENT_PATHS:
+        timings, counters = run_workload(load_client(project), args.rows, args.queries)
+        print(f"== {project} (rows={args.rows}, queries={args.queries})")
+        for step, seconds in timings.items():
+            print(f"{step:>24}: {seconds:8.3f}s")
+        for name, value in counters.items():
+            print(f"{name:>24}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+TrinoAPI.execute_query の fetch="rows" と fetch="arrow" の比較ベンチマーク。
+ピークメモリ (RSS) を正しく測るため、モードごとに別プロセスで実行する。
+
+    cd dqx
+    python -m benchmark.bench_trino_fetch --rows 100000,1000000
+    python -m benchmark.bench_trino_fetch --host trino.mynet --port 80 \\
+        --query "SELECT name, \\"1つあたりの価格\\", \\"個数\\", observed_at FROM dqx.price_hourly"
+
+--host を指定しない場合は benchmark.mock_trino のスタンドインが合成データを返す。
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from common.trino_api import TrinoAPI
+from benchmark.mock_trino import MockTrinoAPI, PRICE_HOURLY_COLUMNS, price_hourly_rows
+
+
+def run_worker(args):
+    """1つのモードを実行し、経過時間とピーク RSS を JSON で出力する"""
+    if args.host:
+        trino = TrinoAPI(
+            host=args.host, port=args.port, user=args.user, catalog=args.catalog
+        )
+        query = args.query
+    else:
+        trino = MockTrinoAPI(
+            lambda query: (PRICE_HOURLY_COLUMNS, price_hourly_rows(args.worker_rows))
+        )
+        query = "SELECT * FROM price_hourly"
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = trino.execute_query(query, fetch=args.worker_mode)
+    elapsed = time.perf_counter() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(
+        json.dumps(
+            {
+                "rows": len(df),
+                "seconds": elapsed,
+                # Linux の ru_maxrss は KB 単位
+                "peak_rss_mb": (rss_peak - rss_before) / 1024,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="100000,1000000")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--user", default="tig")
+    parser.add_argument("--catalog", default="iceberg")
+    parser.add_argument("--query")
+    parser.add_argument("--worker-mode")
+    parser.add_argument("--worker-rows", type=int)
+    args = parser.parse_args()
+
+    if args.worker_mode:
+        run_worker(args)
+        return
+
+    row_counts = [None] if args.host else [int(n) for n in args.rows.split(",")]
+    for n_rows in row_counts:
+        print(f"=== {n_rows:,} rows ===" if n_rows else f"=== {args.query} ===")
+        for mode in ["rows", "arrow"]:
+            command = [
+                sys.executable,
+                "-m",
+                "benchmark.bench_trino_fetch",
+                "--worker-mode",
+                mode,
+                "--worker-rows",
+                str(n_rows or 0),
+            ] + sys.argv[1:]
+            output = subprocess.run(
+                command, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{mode:>6}: {result['seconds']:7.2f}s  "
+                f"peak RSS +{result['peak_rss_mb']:8.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+TrinoAPI.insert_table の "values" / "prepared" / "bulk" モードの比較ベンチマーク。
+get_price_hourly の書き込み方（アイテムごとの INSERT と、全アイテムを1回で書く merge_table /
+replace_rows）の比較もする（merge / replace はリトライを想定して2回書き込む）。
+
+    cd dqx
+    python -m benchmark.bench_trino_insert
+    python -m benchmark.bench_trino_insert --host trino.mynet --port 80 --schema bench
+
+--host を指定しない場合はクライアント側の処理（SQL 文字列の組み立て / パラメータ化 /
+Parquet 化）だけを計測し、書き込み方の比較は benchmark.mock_trino で書き込みの文の数を数える。
+指定した場合は実際に Trino へ INSERT し、エンドツーエンドの時間と
+Iceberg のスナップショット数 / データファイル数 / 行数を計測する。
+
+trino-python-client は prepared のパラメータをサーバ側でバインドせず、クライアントで各値を
+SQL リテラルにして EXECUTE IMMEDIATE '...' USING ... の1つの文に埋め込む。
+クライアント側の計測でも、その組み立て（Cursor._format_prepared_param）までを含める。
+"""
+
+import argparse
+import time
+
+from trino import dbapi
+
+from common.trino_api import TrinoAPI
+from benchmark.mock_trino import MockTrinoAPI
+from benchmark.synthetic import make_price_hourly
+
+
+def prepared_statements(trino, df, chunk_size):
+    """
+    _insert_table_prepared と同じ chunk_size 行ずつの文を、trino-python-client が
+    実際に送る EXECUTE IMMEDIATE の SQL にして返す
+    """
+    format_param = dbapi.Cursor.__new__(dbapi.Cursor)._format_prepared_param
+    placeholder = "(" + ", ".join(["?"] * len(df.columns)) + ")"
+    rows = trino._to_prepared_params(df)
+    statements = []
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i : i + chunk_size]
+        statement = f"INSERT INTO t VALUES {', '.join([placeholder] * len(chunk))}"
+        statements.append(
+            "EXECUTE IMMEDIATE '"
+            + statement
+            + "' USING "
+            + ",".join(format_param(v) for row in chunk for v in row)
+        )
+    return statements
+
+
+def bench_client_side(trino, df, chunk_size=1000):
+    """Trino に送る前の準備にかかる時間とペイロードのサイズを計測する"""
+    start = time.perf_counter()
+    values_sql = ", ".join(trino._to_values_rows(df))
+    values_sec = time.perf_counter() - start
+    start = time.perf_counter()
+    statements = prepared_statements(trino, df, chunk_size)
+    prepared_sec = time.perf_counter() - start
+    start = time.perf_counter()
+    body, _ = trino._to_parquet(df)
+    bulk_sec = time.perf_counter() - start
+    return {
+        "values": (values_sec, len(values_sql.encode("utf-8"))),
+        "prepared": (
+            prepared_sec,
+            sum(len(sql.encode("utf-8")) for sql in statements),
+        ),
+        "bulk": (bulk_sec, len(body)),
+    }
+
+
+def bench_end_to_end(trino, df, schema_name, mode):
+    """ベンチマーク用のテーブルを作って INSERT し、その時間を計測する"""
+    table_name = f"bench_insert_{mode}"
+    trino.create_schema(schema_name)
+    trino.execute_query(f'DROP TABLE IF EXISTS "{schema_name}"."{table_name}"')
+    trino.create_table(table_name, schema_name, trino.extract_columns(df))
+    start = time.perf_counter()
+    try:
+        trino.insert_table(table_name, schema_name, df, mode=mode)
+    except Exception as e:
+        return f"failed: {e}"
+    finally:
+        elapsed = time.perf_counter() - start
+        trino.execute_query(f'DROP TABLE IF EXISTS "{schema_name}"."{table_name}"')
+    return f"{elapsed:8.2f}s"
+
+
+def write_hourly(trino, table_name, schema_name, df, how):
+    """1時間分の価格情報を get_price_hourly の書き込み方で書き込む"""
+    if how == "per-item":
+        for _, df_item in df.groupby("Name", sort=False):
+            trino.insert_table(table_name, schema_name, df_item, mode="prepared")
+        return
+    # 2回目はタイムアウト後のリトライを想定（行は増えないはず）
+    for _ in range(2):
+        if how == "merge":
+            trino.merge_table(table_name, schema_name, df, ["Name", "observed_at"])
+        else:
+            trino.replace_rows(table_name, schema_name, df, ["Name", "observed_at"])
+
+
+def bench_hourly_write(trino, df, schema_name):
+    """アイテムごとの INSERT と merge_table を実際の Trino で比べる"""
+    for how in ["per-item", "merge", "replace"]:
+        table_name = f"bench_hourly_{how.replace('-', '_')}"
+        trino.create_schema(schema_name)
+        trino.execute_query(f'DROP TABLE IF EXISTS "{schema_name}"."{table_name}"')
+        trino.create_table(
+            table_name,
+            schema_name,
+            trino.extract_columns(df),
+            partitioning=["day(observed_at)"],
+        )
+        start = time.perf_counter()
+        write_hourly(trino, table_name, schema_name, df, how)
+        elapsed = time.perf_counter() - start
+        counts = {}
+        for name, query in [
+            (
+                "snapshots",
+                f'SELECT count(*) FROM "{schema_name}"."{table_name}$snapshots"',
+            ),
+            ("files", f'SELECT count(*) FROM "{schema_name}"."{table_name}$files"'),
+            ("rows", f'SELECT count(*) FROM "{schema_name}"."{table_name}"'),
+        ]:
+            counts[name] = trino.execute_query(query).iloc[0, 0]
+        trino.execute_query(f'DROP TABLE IF EXISTS "{schema_name}"."{table_name}"')
+        print(f"{how:>8} write  : {elapsed:8.2f}s  {counts}")
+
+
+def count_hourly_writes(df):
+    """
+    benchmark.mock_trino に対して書き込み、INSERT / DELETE の文の数
+    （= スナップショット数）を数える
+    """
+    for how in ["per-item", "merge", "replace"]:
+        queries = []
+
+        def result_factory(query):
+            queries.append(query)
+            return [("rows", "bigint")], [[0]]
+
+        trino = MockTrinoAPI(result_factory)
+        write_hourly(trino, "price_hourly", "bench", df, how)
+        writes = {
+            statement: sum(q.lstrip().upper().startswith(statement) for q in queries)
+            for statement in ["INSERT", "DELETE"]
+        }
+        # merge / replace はリトライを想定した2回分
+        print(f"{how:>8} write  : {writes}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="10000,100000,1000000")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--user", default="tig")
+    parser.add_argument("--catalog", default="iceberg")
+    parser.add_argument("--schema", default="bench")
+    parser.add_argument("--hourly-rows", type=int, default=3000)
+    args = parser.parse_args()
+
+    trino = TrinoAPI(
+        host=args.host, port=args.port, user=args.user, catalog=args.catalog
+    )
+    for n_rows in [int(n) for n in args.rows.split(",")]:
+        df = make_price_hourly(n_rows)
+        print(f"=== {n_rows:,} rows ===")
+        for mode, (sec, size) in bench_client_side(trino, df).items():
+            print(f"{mode:>8} prepare: {sec:8.2f}s  payload: {size / 1e6:8.1f} MB")
+        if args.host:
+            for mode in ["values", "prepared", "bulk"]:
+                result = bench_end_to_end(trino, df, args.schema, mode)
+                print(f"{mode:>8} insert : {result}")
+
+    # get_price_hourly の1時間分（6アイテム、同じ observed_at）
+    df_hour = make_price_hourly(args.hourly_rows, rows_per_hour=args.hourly_rows)
+    print(f"=== hourly write ({args.hourly_rows:,} rows, 1 hour) ===")
+    if args.host:
+        bench_hourly_write(trino, df_hour, args.schema)
+    else:
+        count_hourly_writes(df_hour)
+
+
+if __name__ == "__main__":
+    main()
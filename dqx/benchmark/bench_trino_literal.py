@@ -0,0 +1,55 @@
+"""
+VALUES 句の組み立て（TrinoAPI._to_values_rows）のマイクロベンチマーク。
+従来の iterrows + _to_trino_literal と、列ごとのベクトル化版を比較し、出力が一致することも確認する。
+
+    cd dqx
+    python -m benchmark.bench_trino_literal --rows 1000,10000,100000
+"""
+
+import argparse
+import time
+
+from common.trino_api import TrinoAPI
+from benchmark.synthetic import make_price_hourly
+
+
+def render_rows_per_cell(trino, df):
+    """ベクトル化前の実装（1セルずつ _to_trino_literal を呼ぶ）"""
+    values_list = []
+    for _, row in df.iterrows():
+        values = ", ".join(trino._to_trino_literal(v) for v in row)
+        values_list.append(f"({values})")
+    return values_list
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    trino = TrinoAPI(host=None, port=None, user=None, catalog=None)
+    for n_rows in [int(n) for n in args.rows.split(",")]:
+        df = make_price_hourly(n_rows)
+        timings = {}
+        outputs = {}
+        for name, render in [
+            ("per-cell", lambda: render_rows_per_cell(trino, df)),
+            ("vectorized", lambda: trino._to_values_rows(df)),
+        ]:
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                outputs[name] = render()
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+        assert outputs["per-cell"] == outputs["vectorized"], "output mismatch"
+        speedup = timings["per-cell"] / timings["vectorized"]
+        print(
+            f"{n_rows:>9,} rows  per-cell: {timings['per-cell']:7.3f}s  "
+            f"vectorized: {timings['vectorized']:7.3f}s  ({speedup:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
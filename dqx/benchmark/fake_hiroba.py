@@ -0,0 +1,131 @@
+"""
+ベンチマーク用の冒険者の広場（バザー検索）のスタンドイン。
+出品一覧のページを合成し、requests のセッション / httpx のトランスポートとして
+遅延付きで返す。ページの構造は DQXPriceSearch._parse_page が読む部分だけを再現している。
+"""
+
+import asyncio
+import hashlib
+import time
+
+import httpx
+import requests
+
+from benchmark.synthetic import FOCUS_ITEMS
+
+
+def item_hash(item_name):
+    return hashlib.md5(item_name.encode("utf-8")).hexdigest()
+
+
+SELLER_NAMES = [
+    "ゆうしゃ",
+    "Tom &amp; Jerry",
+    "&lt;ぷちぷち&gt;",
+    "ｽﾗｲﾑ",
+    "まものつかい",
+]
+
+
+def bazaar_page_html(item_hash, page_num, n_pages, rows_per_page=10):
+    """
+    出品一覧の1ページ分の HTML を作る（範囲外のページは最終ページと同じ内容を返す）。
+    パーサーの差が出やすいよう、文字参照 / コメント / <br> / tbody / 個数1個の出品
+    （ひとつあたりの価格が空）/ 後ろに続く別のテーブルを混ぜている。
+    """
+    page_num = min(page_num, n_pages - 1)
+    rows = []
+    for r in range(rows_per_page):
+        i = page_num * rows_per_page + r
+        count = 1 + i % 5
+        unit_price = 1000 + (i * 7919) % 5000
+        per_unit = f"(ひとつあたり{unit_price}G)" if count > 1 else ""
+        rows.append(
+            "<tr>\n"
+            f'<td class="col1"><p class="itemName"><a class="strongLnk" href="/sc/game/item/{item_hash}/">'
+            f'アイテム</a></p><span class="starArea"> {"★" * (i % 4)} </span></td>\n'
+            f'<td class="col2"><p>個数：{count}こ</p>'
+            f"<p>価格：{count * unit_price}G\n{per_unit}</p>"
+            f'<p>出品者：<a class="strongLnk" href="/sc/character/{i}/">'
+            f"{SELLER_NAMES[i % len(SELLER_NAMES)]}<!-- id:{i} --></a><br></p>"
+            "</td>\n"
+            '<td class="col3">\n  2025/01/01 10:00 ～ 2025/01/08 10:00\n</td>\n'
+            "</tr>\n"
+        )
+    # ページャー：前後2ページと最終ページへのリンク
+    links = [
+        f'<a href="/sc/search/bazaar/{item_hash}/page/{p}">{p + 1}</a>'
+        for p in sorted(
+            {*range(max(0, page_num - 2), min(n_pages, page_num + 3)), n_pages - 1}
+        )
+        if p != page_num
+    ]
+    return (
+        '<html><head><meta charset="utf-8"><title>バザー</title></head><body>\n'
+        '<table class="bazaarTable bazaarlist"><tbody>\n'
+        "<tr><th>できのよさ</th><th>出品情報</th><th>出品期間</th></tr>\n"
+        + "".join(rows)
+        + "</tbody></table>\n"
+        + f'<div class="pageNavi">{"".join(links)}</div>\n'
+        + '<table class="bazaarTable"><tr><td>おすすめ</td></tr></table>\n'
+        + "</body></html>"
+    )
+
+
+def empty_bazaar_page_html():
+    """出品が無いアイテムのページ"""
+    return '<html><body><p class="txt_error">出品されていません</p></body></html>'
+
+
+def login_page_html():
+    """セッション切れでリダイレクトされたログイン画面"""
+    return '<html><body><form id="loginForm" action="/login"></form></body></html>'
+
+
+class StaticCatalog:
+    """ItemHashCatalog の代わりに、決まった アイテム名 -> ハッシュ の辞書を返す"""
+
+    def __init__(self, item_names=FOCUS_ITEMS):
+        self.index = {item_name: item_hash(item_name) for item_name in item_names}
+
+    def get_index(self):
+        return self.index
+
+
+def _page_request(url):
+    """URL の .../{item_hash}/page/{page_num} を取り出す"""
+    parts = url.rstrip("/").split("/")
+    return parts[-3], int(parts[-1])
+
+
+class FakeHirobaSession(requests.Session):
+    """get に latency 秒の遅延を入れて、合成したページを返す requests のセッション"""
+
+    def __init__(self, n_pages, latency=0.1):
+        super().__init__()
+        self.n_pages = n_pages
+        self.latency = latency
+        self.requests_sent = 0
+
+    def get(self, url, **kwargs):
+        self.requests_sent += 1
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = bazaar_page_html(*_page_request(url), self.n_pages).encode(
+            "utf-8"
+        )
+        return response
+
+
+def fake_hiroba_transport(n_pages, latency=0.1, counter=None):
+    """同じページを asyncio.sleep の遅延付きで返す httpx のトランスポート"""
+
+    async def handler(request):
+        if counter is not None:
+            counter.append(str(request.url))
+        await asyncio.sleep(latency)
+        html = bazaar_page_html(*_page_request(str(request.url)), n_pages)
+        return httpx.Response(200, content=html.encode("utf-8"))
+
+    return httpx.MockTransport(handler)
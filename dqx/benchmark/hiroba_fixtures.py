@@ -0,0 +1,268 @@
+"""
+冒険者の広場のスクレイパー用のフィクスチャ（benchmark/fixtures/hiroba）を作る。
+benchmark.replay_server が URL のパスからファイルを引けるよう、パスと同じ階層に書き出す。
+各スクレイパーが読む部分の構造を再現した合成ページで、文字参照 / コメント / 余計な要素も混ぜている。
+日付はページに __YESTERDAY__ などのトークンで書いておき、配信する時に SUBSTITUTIONS で埋める
+（取引履歴は「昨日」、日誌検索は「直近10分」の記事だけを拾うため）。
+
+    cd dqx
+    python -m benchmark.hiroba_fixtures
+
+ここで作るのは合成ページだけで、実際の広場から記録したページはリポジトリに入れていない
+（キャラ名や Cookie を含むため）。記録したページで確かめる場合は
+benchmark.replay_server record で保存し、キャラ名などを伏せてから使う。
+"""
+
+import argparse
+import pathlib
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from benchmark.fake_hiroba import SELLER_NAMES, bazaar_page_html, item_hash
+from benchmark.replay_server import FIXTURE_ROOT, fixture_path
+
+
+# get_trade_history.py に書かれている自キャラのID
+TRADE_CHARACTER_ID = "484618740227"
+# DQXEditDiary に渡す日誌のキャラID
+DIARY_CHARACTER_ID = "123456789012"
+DIARY_TITLE = "ルームメンバー募集"
+
+BAZAAR_ITEMS = ["輝晶核", "ドラゴンのツノ"]
+BAZAAR_PAGES = 6
+TRADE_PAGES = 3
+TRADE_ROWS_PER_PAGE = 20
+SEARCH_WORDS = ["やくそう", "せかいじゅのは", "まほうのせいすい"]
+DIARY_ARTICLES = 40
+DIARY_LIST_ARTICLES = 20
+
+
+def _yesterday():
+    return (datetime.now() - timedelta(1)).strftime("%Y/%m/%d")
+
+
+def _diary_time():
+    """DQXDiarySearch.search_diary が拾う「直近10分」の枠に入る時刻"""
+    now = datetime.now(ZoneInfo("Asia/Tokyo"))
+    boundary = now.replace(second=0, microsecond=0, minute=(now.minute // 10) * 10)
+    return (boundary - timedelta(minutes=5)).strftime("%Y-%m-%d %H:%M")
+
+
+# 配信時に置き換えるトークン
+SUBSTITUTIONS = {
+    "__YESTERDAY__": _yesterday,
+    "__DIARY_TIME__": _diary_time,
+}
+
+# 各シナリオでスクレイパーが返すはずの行数（ベンチマークで結果を確かめるのに使う）
+EXPECTED_ROWS = {
+    # 最終ページの最後の行だけが昨日より前の取引
+    "get_trade_buy": TRADE_PAGES * TRADE_ROWS_PER_PAGE - 1,
+    # 4行に1行が売却済み（取引相手あり）
+    "get_trade_sell": sum(
+        1 for i in range(TRADE_PAGES * TRADE_ROWS_PER_PAGE - 1) if i % 4 == 3
+    ),
+    "search_item_hash": len(SEARCH_WORDS),
+    "search_diary": DIARY_ARTICLES // 2,
+    "get_diary_id_list": DIARY_LIST_ARTICLES // 2,
+}
+
+
+def _page(body, title="冒険者の広場"):
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f"<title>{title}</title></head><body>\n"
+        '<div id="header"><a href="/sc/">トップ</a> &gt; マイページ</div>\n'
+        f"{body}\n"
+        '<!-- footer -->\n<div id="footer">&copy; ARMOR PROJECT/BIRD STUDIO/SQUARE ENIX</div>\n'
+        "</body></html>"
+    )
+
+
+def _trade_item(i):
+    """取引履歴のアイテム名のセル（そうびは2行目にできのよさが入る）"""
+    if i % 3 == 0:
+        return f'<a class="strongLnk" href="/sc/game/item/{i:032x}/">はがねのつるぎ</a>\n<span>できのよさ：{"★" * (i % 4)}</span>'
+    return f'<a class="strongLnk" href="/sc/game/item/{i:032x}/">やくそう</a>'
+
+
+def trade_purchase_html(page_num):
+    """購入履歴 (bazaarTable purchase) の1ページ"""
+    rows = []
+    for r in range(TRADE_ROWS_PER_PAGE):
+        i = page_num * TRADE_ROWS_PER_PAGE + r
+        last = page_num == TRADE_PAGES - 1 and r == TRADE_ROWS_PER_PAGE - 1
+        day = "2000/01/01" if last else "__YESTERDAY__"
+        rows.append(
+            "<tr>\n"
+            f"<td>\n{_trade_item(i)}\n</td>\n"
+            f"<td>{1 + i % 9}こ</td>\n"
+            f"<td>{(i * 7919) % 90000 + 1000:,}G</td>\n"
+            f'<td>\n取引日：{day}\n取引相手：<a href="/sc/character/{i}/">'
+            f"{SELLER_NAMES[i % len(SELLER_NAMES)]}</a>\n</td>\n"
+            "</tr>\n"
+        )
+    return _page(
+        '<table class="bazaarTable purchase"><tbody>\n'
+        "<tr><th>アイテム名</th><th>個数</th><th>価格</th><th>取引日</th></tr>\n"
+        + "".join(rows)
+        + "</tbody></table>"
+    )
+
+
+def trade_entry_html(page_num):
+    """出品履歴 (bazaarTable entry) の1ページ。取り消し / 返却 / 売却済みを混ぜる"""
+    rows = []
+    for r in range(TRADE_ROWS_PER_PAGE):
+        i = page_num * TRADE_ROWS_PER_PAGE + r
+        last = page_num == TRADE_PAGES - 1 and r == TRADE_ROWS_PER_PAGE - 1
+        day = "2000/01/01" if last else "__YESTERDAY__"
+        if i % 4 == 3:
+            result = (
+                f'売却済み\n取引相手：<a href="/sc/character/{i}/">'
+                f"{SELLER_NAMES[i % len(SELLER_NAMES)]}</a>\n受取日：{day}"
+            )
+        elif i % 4 == 2:
+            result = f"返却済み\n受取日：{day}"
+        else:
+            result = "出品取り消し"
+        rows.append(
+            "<tr>\n"
+            f"<td>\n{_trade_item(i)}\n</td>\n"
+            f"<td>{1 + i % 9}こ</td>\n"
+            f"<td>{(i * 7919) % 90000 + 1000:,}G<br><!-- 手数料込み --></td>\n"
+            f"<td>\n出品日：{day}\n{result}\n</td>\n"
+            "</tr>\n"
+        )
+    return _page(
+        '<table class="bazaarTable entry"><tbody>\n'
+        "<tr><th>アイテム名</th><th>個数</th><th>価格</th><th>状態</th></tr>\n"
+        + "".join(rows)
+        + "</tbody></table>"
+    )
+
+
+def item_search_html(search_word):
+    """アイテム検索の結果。完全一致の前に、名前を含む別のアイテムを並べる"""
+    names = [
+        f"上{search_word}",
+        f"特{search_word}",
+        f"{search_word}の素材",
+        search_word,
+    ]
+    rows = "".join(
+        "<tr>"
+        f'<td class="col1"><a class="strongLnk" href="/sc/game/item/{item_hash(name)}/">{name}</a></td>'
+        "<td>どうぐ</td>"
+        "</tr>\n"
+        for name in names
+    )
+    return _page(
+        '<table class="searchItemTable"><thead><tr><th>アイテム名</th><th>種類</th></tr></thead>\n'
+        f"<tbody>\n{rows}</tbody></table>"
+    )
+
+
+def _diary_article(i, class_name, day, link):
+    return (
+        f'<div class="{class_name}">\n'
+        f'<p class="title_diary"><a href="{link}">細胞 &amp; 素材 売ります #{i}</a></p>\n'
+        f'<p class="txt_name">{SELLER_NAMES[i % len(SELLER_NAMES)]}</p>\n'
+        f'<p class="threadlist_catday">モーモンバザー <span>{day}</span></p>\n'
+        f'<p class="txt_comment">\n輝晶核 {i}こ<br>1つ {1000 + i}G<!-- 値下げ交渉可 -->\n</p>\n'
+        "</div>\n"
+    )
+
+
+def diary_search_html():
+    """日誌検索の結果。半分は直近10分、半分は古い記事"""
+    articles = "".join(
+        _diary_article(
+            i,
+            "thread_article",
+            "__DIARY_TIME__" if i % 2 == 0 else "2000-01-01 10:00",
+            f"/sc/diary/{i:012d}/view/{9000000 + i}",
+        )
+        for i in range(DIARY_ARTICLES)
+    )
+    return _page(f'<div class="threadList">\n{articles}</div>')
+
+
+def diary_list_html():
+    """自分の日誌の一覧。半分が DIARY_TITLE の日誌"""
+    articles = "".join(
+        '<div class="article">\n'
+        f'<p class="title_diary"><a href="/sc/diary/{DIARY_CHARACTER_ID}/view/{8000000 + i}">'
+        f"{DIARY_TITLE if i % 2 == 0 else f'日誌 {i}'}</a></p>\n"
+        f'<p class="txt_comment">本文 {i}</p>\n'
+        "</div>\n"
+        for i in range(DIARY_LIST_ARTICLES)
+    )
+    return _page(articles)
+
+
+def diary_form_html(step):
+    """日誌の作成画面 / 確認画面（hidden input を持つフォーム）"""
+    hidden = "".join(
+        f'<input type="hidden" name="{name}" value="{value}">\n'
+        for name, value in [
+            ("csrfToken", f"token-{step}"),
+            ("diaryCategory", "50"),
+            ("publicityflag", "9"),
+            ("step", step),
+        ]
+    )
+    return _page(
+        f'<form method="post" action="/sc/diary/{DIARY_CHARACTER_ID}/create/2/0/{step}">\n'
+        f'<input type="text" name="diaryTitle" value="">\n{hidden}'
+        '<input type="hidden" value="名前の無い hidden">\n'
+        '<button type="submit">次へ</button>\n</form>'
+    )
+
+
+def fixture_pages():
+    """{(メソッド, URL のパス): HTML} を返す"""
+    pages = {}
+    for item_name in BAZAAR_ITEMS:
+        hash_value = item_hash(item_name)
+        # mode="sequential" は最終ページの次（最終ページと同じ内容）まで取得する
+        for page_num in range(BAZAAR_PAGES + 1):
+            pages["GET", f"/sc/search/bazaar/{hash_value}/page/{page_num}"] = (
+                bazaar_page_html(hash_value, page_num, BAZAAR_PAGES)
+            )
+    for page_num in range(TRADE_PAGES):
+        base = f"/sc/character/{TRADE_CHARACTER_ID}/bazaar"
+        pages["GET", f"{base}/purchasehistory/page/{page_num}"] = trade_purchase_html(
+            page_num
+        )
+        pages["GET", f"{base}/entryhistory/page/{page_num}"] = trade_entry_html(
+            page_num
+        )
+    for search_word in SEARCH_WORDS:
+        pages["GET", f"/sc/search/{search_word}/item"] = item_search_html(search_word)
+    pages["POST", "/sc/diary/pub/search/"] = diary_search_html()
+    create = f"/sc/diary/{DIARY_CHARACTER_ID}/create/2/0"
+    pages["GET", f"/sc/diary/{DIARY_CHARACTER_ID}/mode/2/page/0"] = diary_list_html()
+    pages["GET", create] = diary_form_html("confirm")
+    pages["POST", f"{create}/confirm"] = diary_form_html("success")
+    pages["POST", f"{create}/success"] = _page("<p>日誌を投稿しました</p>")
+    return pages
+
+
+def write_fixtures(root=FIXTURE_ROOT):
+    for (method, url_path), html in fixture_pages().items():
+        path = fixture_path(root, method, url_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(html, encoding="utf-8")
+        print(f"wrote {method} {url_path} -> {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=pathlib.Path, default=FIXTURE_ROOT)
+    args = parser.parse_args()
+    write_fixtures(args.root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+ベンチマーク用の Trino のスタンドイン。
+trino.dbapi の Connection / Cursor と同じインターフェースで、合成した結果を返す。
+"""
+
+import datetime
+
+from common.trino_api import TrinoAPI
+
+
+# AnalyzePrice が price_hourly から取る列と同じ構成
+PRICE_HOURLY_COLUMNS = [
+    ("name", "varchar"),
+    ("1つあたりの価格", "integer"),
+    ("個数", "integer"),
+    ("observed_at", "timestamp(6)"),
+]
+
+
+def price_hourly_rows(n_rows, rows_per_hour=300):
+    """price_hourly の行を Trino クライアントと同じくリストで1行ずつ生成する"""
+    items = ["輝晶核", "魔因細胞", "魔因細胞のかけら", "閃輝晶核", "閃魔細胞"]
+    start = datetime.datetime(2025, 1, 1)
+    for i in range(n_rows):
+        observed_at = start + datetime.timedelta(hours=i // rows_per_hour)
+        yield [
+            items[i % len(items)],
+            1000 + (i * 7919) % 200000,
+            1 + i % 99,
+            observed_at,
+        ]
+
+
+class MockCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.arraysize = 1
+        self._rows = iter(())
+        self.queries = connection.queries
+
+    def execute(self, operation, params=None):
+        self.queries.append(operation)
+        columns, rows = self.connection.result_factory(operation)
+        self.description = [
+            (name, type_code, None, None, None, None, None)
+            for name, type_code in columns
+        ]
+        self._rows = iter(rows)
+        return self
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        rows = []
+        for row in self._rows:
+            rows.append(row)
+            if len(rows) >= size:
+                break
+        return rows
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def cancel(self):
+        self._rows = iter(())
+
+
+class MockConnection:
+    def __init__(self, result_factory):
+        self.result_factory = result_factory
+        self.queries = []
+
+    def cursor(self):
+        return MockCursor(self)
+
+    def close(self):
+        pass
+
+
+def mock_api_class(base):
+    """
+    base (TrinoAPI) を継承し、実際の Trino の代わりに MockConnection を使うクラスを作る。
+    result_factory(query) は (カラム定義のリスト, 行のイテラブル) を返す関数。
+    life_dashboard 側の TrinoAPI のように、別のファイルから読み込んだクラスにも使える。
+    """
+
+    class MockAPI(base):
+        def __init__(self, result_factory, **kwargs):
+            super().__init__(
+                host="mock", port=0, user="bench", catalog="iceberg", **kwargs
+            )
+            self.result_factory = result_factory
+
+        def connect(self):
+            with self._lock:
+                self.connections_opened += 1
+            return MockConnection(self.result_factory)
+
+    return MockAPI
+
+
+MockTrinoAPI = mock_api_class(TrinoAPI)
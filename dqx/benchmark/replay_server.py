@@ -0,0 +1,177 @@
+"""
+冒険者の広場のページを保存したフィクスチャから返す、ローカルの HTTP サーバー。
+requests のセッションに ReplayAdapter を付けると、https://hiroba.dqx.jp へのリクエストが
+このサーバーに向くので、スクレイパーのコードを変えずにオフラインで動かせる。
+
+フィクスチャは URL のパスと同じ階層に置く（GET は "<パス>.html"、
+それ以外は "<パス>.<METHOD>.html"。パスが / で終わる場合は "<パス>/index.html"）。
+
+    cd dqx
+    python -m benchmark.replay_server serve                    # フィクスチャを配信する
+    python -m benchmark.replay_server record URL [URL ...]     # 実際のページを保存する
+
+record は保存済みの Cookie (reuse_session) で広場にアクセスし、フィクスチャとして書き出す。
+リポジトリにある benchmark/fixtures/hiroba は benchmark.hiroba_fixtures の合成ページで、
+record で記録したものはまだ入っていない。
+"""
+
+import argparse
+import pathlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+HIROBA_URL = "https://hiroba.dqx.jp"
+FIXTURE_ROOT = pathlib.Path(__file__).resolve().parent / "fixtures" / "hiroba"
+
+
+def fixture_path(root, method, url_path):
+    """リクエストのメソッドとパスから、フィクスチャのファイルのパスを決める"""
+    path = unquote(urlsplit(url_path).path).strip("/") or "index"
+    if url_path.split("?")[0].endswith("/") and path != "index":
+        path += "/index"
+    suffix = ".html" if method == "GET" else f".{method}.html"
+    return pathlib.Path(root) / f"{path}{suffix}"
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def _replay(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        path = fixture_path(server.root, self.command, self.path)
+        with server.lock:
+            server.requests_served += 1
+        if not path.exists():
+            with server.lock:
+                server.missing.append(f"{self.command} {self.path}")
+            self.send_error(404)
+            return
+        body = path.read_text(encoding="utf-8")
+        # 日付などはリクエストの時点の値で埋める
+        for token, value in server.substitutions.items():
+            if token in body:
+                body = body.replace(token, value())
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _replay
+    do_POST = _replay
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    """
+    root 以下のフィクスチャを返す HTTP サーバーを別スレッドで立てる。
+    substitutions: {トークン: 文字列を返す関数}。配信時にページ内のトークンを置き換える。
+    with 文で使うと、抜けた時にサーバーを止める。
+    """
+
+    def __init__(self, root=FIXTURE_ROOT, substitutions=None, port=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.root = pathlib.Path(root)
+        self.httpd.substitutions = substitutions or {}
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests_served = 0
+        self.httpd.missing = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests_served(self):
+        return self.httpd.requests_served
+
+    @property
+    def missing(self):
+        """フィクスチャが無くて 404 を返したリクエスト"""
+        return self.httpd.missing
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class ReplayAdapter(HTTPAdapter):
+    """https://hiroba.dqx.jp へのリクエストの宛先を、リプレイサーバーに書き換える"""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        if request.url.startswith(HIROBA_URL):
+            request.url = self.base_url + request.url[len(HIROBA_URL) :]
+        return super().send(request, **kwargs)
+
+
+def replay_session(server, session=None):
+    """広場へのリクエストを server に向けた requests のセッションを返す"""
+    session = session or requests.Session()
+    session.mount(HIROBA_URL, ReplayAdapter(server.base_url))
+    return session
+
+
+def record(urls, root=FIXTURE_ROOT, session=None):
+    """広場のページを GET して、フィクスチャとして保存する"""
+    if session is None:
+        from common.session_cookies import reuse_session
+
+        session = reuse_session()
+    for url in urls:
+        response = session.get(url)
+        response.raise_for_status()
+        path = fixture_path(root, "GET", url[len(HIROBA_URL) :])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(response.content)
+        print(f"saved {url} -> {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("--root", type=pathlib.Path, default=FIXTURE_ROOT)
+    serve_parser.add_argument("--port", type=int, default=8000)
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("urls", nargs="+")
+    record_parser.add_argument("--root", type=pathlib.Path, default=FIXTURE_ROOT)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.urls, args.root)
+        return
+    from benchmark.hiroba_fixtures import SUBSTITUTIONS
+
+    server = ReplayServer(args.root, SUBSTITUTIONS, port=args.port)
+    print(f"serving {args.root} at {server.base_url}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+
+FOCUS_ITEMS = [
+    "輝晶核",
+    "魔因細胞",
+    "魔因細胞のかけら",
+    "閃輝晶核",
+    "閃魔細胞",
+    "閃魔細胞のかけら",
+]
+
+
+def make_price_hourly(n_rows, start="2025-01-01 00:00:00", rows_per_hour=300, seed=0):
+    """
+    dqx.price_hourly と同じカラム構成の合成データを作る。
+    search_price が返す DataFrame と同じ列順・型（文字列の Date / Hour を含む）にしている。
+    """
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(start, periods=-(-n_rows // rows_per_hour), freq="h")
+    observed_at = np.repeat(hours.values, rows_per_hour)[:n_rows]
+    count = rng.integers(1, 100, n_rows)
+    unit_price = rng.integers(1000, 200000, n_rows)
+    exhibit_start = pd.Series(observed_at) - pd.to_timedelta(
+        rng.integers(0, 72, n_rows), unit="h"
+    )
+    exhibit_end = exhibit_start + pd.Timedelta(days=3)
+    df = pd.DataFrame(
+        {
+            "Name": rng.choice(FOCUS_ITEMS, n_rows),
+            "価格": unit_price * count,
+            "1つあたりの価格": unit_price,
+            "個数": count,
+            "できのよさ": rng.choice(["", "★", "★★", "★★★"], n_rows),
+            "出品開始": exhibit_start.dt.strftime("%Y/%m/%d %H:%M"),
+            "出品終了": exhibit_end.dt.strftime("%Y/%m/%d %H:%M"),
+            "出品者": [f"seller'{i % 5000}" for i in range(n_rows)],
+            "Date": pd.Series(observed_at).dt.strftime("%Y-%m-%d"),
+            "Hour": pd.Series(observed_at).dt.strftime("%H"),
+            "observed_at": observed_at,
+        }
+    )
+    return df
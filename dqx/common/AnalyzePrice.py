@@ -1,10 +1,60 @@
+import numpy as np
 import pandas as pd
+from trino.exceptions import TrinoQueryError
+
 from common.trino_api import TrinoAPI
 
 
+# ロールアップ (iceberg.dqx.mrt_price_hourly_rollup) の列で答えられる時間ごとの統計
+# {(統計, 個数の上限): 列名}。統計は "min" かパーセンタイル
+ROLLUP_COLUMNS = {
+    ("min", None): "min_price",
+    ("min", 3): "min_price_q3",
+    (0.05, None): "p5_price",
+    (0.05, 3): "p5_price_q3",
+}
+
+
+def rollup_aggregates(price, quantity):
+    """
+    ROLLUP_COLUMNS の各列を mrt_price_hourly_rollup.sql と同じ式で集計する SELECT の項目
+    （ロールアップにまだ無い時間を price_hourly から同じ統計で集計するため）
+    """
+    aggregates = []
+    for (statistic, quantity_threshold), column in ROLLUP_COLUMNS.items():
+        if statistic == "min":
+            expr = f"min({price})"
+        else:
+            expr = f"approx_percentile({price}, {float(statistic)})"
+        if quantity_threshold is not None:
+            expr += f" FILTER (WHERE {quantity} <= {int(quantity_threshold)})"
+        aggregates.append(f"{expr} AS {column}")
+    return ",\n          ".join(aggregates)
+
+
 class AnalyzePrice:
-    def __init__(self, table_name, datetime_range=None):
-        self.trino = TrinoAPI(
+    def __init__(
+        self,
+        table_name,
+        datetime_range=None,
+        item_names=None,
+        load=True,
+        trino=None,
+        cache=None,
+        rollup=False,
+    ):
+        """
+        datetime_range: {"start": ..., "end": ...} の範囲の価格情報を1回のクエリで読み込む
+        item_names: 指定した場合は、そのアイテムだけを読み込む（name IN (...) を Trino で絞り込む）。
+        複数のアイテムのグラフを描く場合は、アイテムごとに作らずに1つを共有する
+        load: False なら生データを読み込まない（*_sql のメソッドで集計結果だけを取る場合）
+        cache: PriceHistoryCache を指定した場合は、生データを Trino ではなくキャッシュから読む
+        （rollup=True でも、ロールアップに無い時間の集計は price_hourly から直接読む）
+        rollup: True なら生データの代わりにロールアップを読み、ROLLUP_COLUMNS にある統計は
+        そこから返す（それ以外の統計を求められた時だけ生データを読む）。
+        ロールアップが読めない（mart がまだ作られていない / 壊れている）場合は生データを読む
+        """
+        self.trino = trino or TrinoAPI(
             # host="trino.trino.svc.cluster.local",
             # port=8080,
             host="trino.mynet",
@@ -21,104 +71,333 @@ class AnalyzePrice:
         end = pd.to_datetime(datetime_range["end"])
         if end < start:
             raise ValueError(f"datetime_range end < start: {start} .. {end}")
-        start_s = start.strftime("%Y-%m-%d %H:%M:%S")
-        end_s = end.strftime("%Y-%m-%d %H:%M:%S")
+        self.start = start
+        self.end = end
+        self.start_s = start.strftime("%Y-%m-%d %H:%M:%S")
+        self.end_s = end.strftime("%Y-%m-%d %H:%M:%S")
+        self.item_names = item_names
+        self.cache = cache
+        self.df = None
+        self.rollup = None
+        if not load:
+            return
+        if rollup:
+            self._load_rollup()
+        else:
+            self._load_raw()
+
+    def _query_raw(self, start, end):
+        """start <= observed_at <= end の生データを読む（cache があればキャッシュから）"""
+        if self.cache is not None:
+            df = self.cache.read(start, end, self.item_names)
+        else:
+            sql = f"""
+            SELECT
+              name,
+              "1つあたりの価格",
+              "個数",
+              observed_at
+            FROM iceberg.dqx.price_hourly
+            WHERE {self._where(self.item_names, start=start, end=end)}
+            """
+            # 数週間分の生データになるので、列形式で受け取ってメモリを抑える
+            df = self.trino.execute_query(sql, fetch="arrow")
+        df["Datetime"] = pd.to_datetime(df["observed_at"])
+        return df.sort_values("Datetime")
+
+    def _load_raw(self):
+        self.df = self._query_raw(self.start, self.end)
+        self._index_by_name()
+
+    def _ensure_raw(self):
+        # ロールアップで答えられない統計を求められた時に、生データを読む
+        if self.df is None:
+            self._load_raw()
+
+    def _rollup_where(self):
+        start_hour = self.start.floor("h").strftime("%Y-%m-%d %H:%M:%S")
+        conditions = [
+            f"ts_hour BETWEEN TIMESTAMP '{start_hour}' AND TIMESTAMP '{self.end_s}'"
+        ]
+        if self.item_names is not None:
+            conditions.append(f"item_id IN ({self._names(self.item_names)})")
+        return "\n          AND ".join(conditions)
+
+    def _load_rollup(self):
+        """
+        範囲内のロールアップを読む。mart がまだ更新されていない新しい時間は
+        ロールアップに無いので、その分は price_hourly から mart と同じ式で集計して足す
+        （グラフの線が mart の境目で別の統計に切り替わらないようにする）
+        """
+        columns = ", ".join(dict.fromkeys(ROLLUP_COLUMNS.values()))
+        sql = f"""
+        SELECT
+          item_id AS name,
+          ts_hour,
+          {columns}
+        FROM iceberg.dqx.mrt_price_hourly_rollup
+        WHERE {self._rollup_where()}
+        """
+        try:
+            rollup = self.trino.execute_query(sql, fetch="arrow")
+        except TrinoQueryError as e:
+            print(f"Failed to read the rollup, use price_hourly instead: {e}")
+            self._load_raw()
+            return
+        rollup["Datetime"] = pd.to_datetime(rollup["ts_hour"])
+        if len(rollup):
+            tail_start = rollup["Datetime"].max() + pd.Timedelta(hours=1)
+        else:
+            tail_start = self.start
+        tail_start = max(tail_start, self.start)
+        if tail_start <= self.end:
+            tail = self._query_rollup_tail(tail_start)
+            if len(tail):
+                rollup = pd.concat([rollup, tail], ignore_index=True)
+        self.rollup = rollup.sort_values("Datetime")
+
+    def _query_rollup_tail(self, start):
+        """start 以降の price_hourly を、ロールアップと同じ列・同じ式で時間ごとに集計する"""
         sql = f"""
         SELECT
           name,
-          "1つあたりの価格",
-          "個数",
-          observed_at
+          date_trunc('hour', observed_at) AS ts_hour,
+          {rollup_aggregates('"1つあたりの価格"', '"個数"')}
         FROM iceberg.dqx.price_hourly
-        WHERE observed_at BETWEEN TIMESTAMP '{start_s}' AND TIMESTAMP '{end_s}'
+        WHERE {self._where(self.item_names, start=start)}
+        GROUP BY name, date_trunc('hour', observed_at)
         """
-        self.df = self.trino.execute_query(sql)
-        self.df["Datetime"] = pd.to_datetime(self.df["observed_at"])
-        self.df = self.df.sort_values("Datetime")
+        tail = self.trino.execute_query(sql, fetch="arrow")
+        tail["Datetime"] = pd.to_datetime(tail["ts_hour"])
+        return tail
+
+    def _rollup_price_by_hour(self, item_name, statistic, quantity_threshold):
+        """ロールアップで答えられる統計なら時間ごとの系列を返す。答えられなければ None"""
+        column = ROLLUP_COLUMNS.get((statistic, quantity_threshold))
+        if self.rollup is None or column is None:
+            return None
+        s = self.rollup[self.rollup["name"] == item_name].set_index("Datetime")[column]
+        # FILTER で該当する出品が無かった時間は NULL になるので除く
+        s = s.dropna()
+        return s.rename("1つあたりの価格").rename_axis("Datetime")
+
+    def _names(self, item_names):
+        return ", ".join(
+            "'" + str(name).replace("'", "''") + "'" for name in item_names
+        )
+
+    def _where(self, item_names=None, quantity_threshold=None, start=None, end=None):
+        """範囲・アイテム・個数の条件の WHERE 句を作る（範囲は指定しなければ datetime_range）"""
+        start_s = self.start_s if start is None else f"{start:%Y-%m-%d %H:%M:%S}"
+        end_s = self.end_s if end is None else f"{end:%Y-%m-%d %H:%M:%S}"
+        conditions = [
+            f"observed_at BETWEEN TIMESTAMP '{start_s}' AND TIMESTAMP '{end_s}'"
+        ]
+        if item_names is not None:
+            conditions.append(f"name IN ({self._names(item_names)})")
+        if quantity_threshold is not None:
+            conditions.append(f'"個数" <= {int(quantity_threshold)}')
+        return "\n          AND ".join(conditions)
+
+    def _index_by_name(self):
+        """アイテムごとの行の位置を作っておき、extract_item_price で毎回全行を比較しないようにする"""
+        self._name_index = self.df.groupby("name", sort=False).indices
+        # 生データが変わったら、hourly_stats の結果も作り直す
+        self._hourly_cache = {}
 
     def filter_by_datetime(self, datetime_range):
         """日時範囲でデータを絞り込む"""
+        self._ensure_raw()
         start_datetime = pd.to_datetime(datetime_range["start"])
         end_datetime = pd.to_datetime(datetime_range["end"])
         self.df = self.df[
             (self.df["Datetime"] >= start_datetime)
             & (self.df["Datetime"] <= end_datetime)
         ]
+        self._index_by_name()
 
     # 特定のアイテムの価格情報を取得
     def extract_item_price(self, item_name, quantity_threshold=None):
         # 特定のアイテムの価格情報を取得
-        df = self.df[self.df["name"] == item_name]
+        self._ensure_raw()
+        positions = self._name_index.get(item_name)
+        if positions is None:
+            df = self.df.iloc[0:0]
+        else:
+            df = self.df.iloc[positions]
         if quantity_threshold is not None:
             df = df[df["個数"] <= quantity_threshold]
         return df
 
     def min_price(self, item_name, quantity_threshold=None):
         # 最安の単価を返す
-        df = self.extract_item_price(item_name)
+        df = self.extract_item_price(item_name, quantity_threshold)
         return df["1つあたりの価格"].min()
 
     def min_price_by_hour(self, item_name, quantity_threshold=None):
         # 時間ごとの最安価格を取得
-        df = self.extract_item_price(item_name)
+        s = self._rollup_price_by_hour(item_name, "min", quantity_threshold)
+        if s is not None:
+            return s
+        df = self.extract_item_price(item_name, quantity_threshold)
         return df.groupby("Datetime")["1つあたりの価格"].min()
 
     def percentile_price(self, item_name, percentile, quantity_threshold=None):
-        # パーセンタイル価格を取得
-        df = self.extract_item_price(item_name)
+        # パーセンタイル価格を取得（min_price と同じく個数で絞り込む）
+        df = self.extract_item_price(item_name, quantity_threshold)
         return df["1つあたりの価格"].quantile(percentile)
 
     def percentile_price_by_hour(self, item_name, percentile, quantity_threshold=None):
         # 時間ごとのパーセンタイル価格を取得
+        s = self._rollup_price_by_hour(item_name, percentile, quantity_threshold)
+        if s is not None:
+            return s
         df = self.extract_item_price(item_name, quantity_threshold)
         return df.groupby("Datetime")["1つあたりの価格"].quantile(percentile)
 
+    def hourly_price_sql(self, aggregate, item_names=None, quantity_threshold=None):
+        """
+        時間・アイテムごとの "1つあたりの価格" の集計 (aggregate: SQL の集計式) を Trino で計算し、
+        name / observed_at / value / Datetime の DataFrame で返す。
+        生データを転送せず、時間ごとの系列だけを受け取る
+        """
+        if item_names is None:
+            item_names = self.item_names
+        sql = f"""
+        SELECT
+          name,
+          observed_at,
+          {aggregate} AS value
+        FROM iceberg.dqx.price_hourly
+        WHERE {self._where(item_names, quantity_threshold)}
+        GROUP BY name, observed_at
+        """
+        df = self.trino.execute_query(sql, fetch="arrow")
+        df["Datetime"] = pd.to_datetime(df["observed_at"])
+        return df.sort_values("Datetime")
+
+    def _price_by_hour_sql(self, item_name, aggregate, quantity_threshold):
+        # percentile_price_by_hour などと同じく、Datetime を index にした系列で返す
+        df = self.hourly_price_sql(aggregate, [item_name], quantity_threshold)
+        return df.set_index("Datetime")["value"].rename("1つあたりの価格")
+
+    def min_price_by_hour_sql(self, item_name, quantity_threshold=None):
+        # 時間ごとの最安価格を Trino で集計して取得
+        return self._price_by_hour_sql(
+            item_name, 'min("1つあたりの価格")', quantity_threshold
+        )
+
+    def percentile_price_by_hour_sql(
+        self, item_name, percentile, quantity_threshold=None
+    ):
+        # 時間ごとのパーセンタイル価格を Trino で集計して取得
+        # （approx_percentile は近似値なので、pandas の quantile とは少しずれることがある）
+        return self._price_by_hour_sql(
+            item_name,
+            f'approx_percentile("1つあたりの価格", {float(percentile)})',
+            quantity_threshold,
+        )
+
+    def latest_observed_at(self, item_names=None):
+        """
+        範囲内の最新の observed_at を返す（無ければ None）。
+        生データを読まずに、グラフなどのキャッシュが古くなっていないかを確かめる
+        """
+        if item_names is None:
+            item_names = self.item_names
+        sql = f"""
+        SELECT max(observed_at) AS latest
+        FROM iceberg.dqx.price_hourly
+        WHERE {self._where(item_names)}
+        """
+        latest = self.trino.execute_query(sql)["latest"].iloc[0]
+        return None if pd.isna(latest) else pd.Timestamp(latest)
+
+    def rollup_high_water(self):
+        """
+        範囲内のロールアップの最新の ts_hour を返す（無い / 読めない場合は None）。
+        mart が追いついた時に、グラフなどのキャッシュを作り直すために使う
+        """
+        sql = f"""
+        SELECT max(ts_hour) AS latest
+        FROM iceberg.dqx.mrt_price_hourly_rollup
+        WHERE {self._rollup_where()}
+        """
+        try:
+            latest = self.trino.execute_query(sql)["latest"].iloc[0]
+        except TrinoQueryError as e:
+            print(f"Failed to read the rollup: {e}")
+            return None
+        return None if pd.isna(latest) else pd.Timestamp(latest)
+
     def average_price(self, item_name, quantity_threshold=None):
         # 平均価格を取得
         df = self.extract_item_price(item_name, quantity_threshold)
         return df["1つあたりの価格"].mean()
 
+    def extract_item(self, item_name, q_threshold=None):
+        """
+        extract_item_price の結果を、Datetime を index にして unit_price / quantity の列名にしたもの。
+        金額 (unit_price * quantity) も amount として先に計算しておく（int32 の掛け算で溢れないよう float にする）
+        """
+        df = self.extract_item_price(item_name, q_threshold)
+        unit_price = df["1つあたりの価格"].astype("float64")
+        quantity = df["個数"].astype("float64")
+        return pd.DataFrame(
+            {
+                "unit_price": unit_price.to_numpy(),
+                "quantity": quantity.to_numpy(),
+                "amount": (unit_price * quantity).to_numpy(),
+            },
+            index=pd.DatetimeIndex(df["Datetime"], name="Datetime"),
+        )
+
+    def hourly_stats(self, item_name, q_threshold=None):
+        """
+        1h ごとの min / median / mean / 出来高 / 金額 / VWAP を1回の集計でまとめて出す。
+        出品が無い時間も行を持つ（価格は NaN、出来高は 0）。
+        hourly_summary / rolling_stats / volume_zscore はこの結果を使い回す
+        """
+        key = (item_name, q_threshold)
+        if key not in self._hourly_cache:
+            hourly = (
+                self.extract_item(item_name, q_threshold)
+                .resample("1h")
+                .agg(
+                    min=("unit_price", "min"),
+                    median=("unit_price", "median"),
+                    mean=("unit_price", "mean"),
+                    volume=("quantity", "sum"),
+                    amount=("amount", "sum"),
+                )
+            )
+            hourly["vwap"] = hourly["amount"] / hourly["volume"].where(
+                hourly["volume"] > 0
+            )
+            self._hourly_cache[key] = hourly
+        return self._hourly_cache[key]
+
     # 1) 出来高加重平均 (VWAP)
     def vwap(self, item_name, q_threshold=None):
-        df = self.extract_item(item_name, q_threshold)
-        total = (df["unit_price"] * df["quantity"]).sum()
-        vol = df["quantity"].sum()
-        return total / vol if vol else np.nan
+        hourly = self.hourly_stats(item_name, q_threshold)
+        vol = hourly["volume"].sum()
+        return hourly["amount"].sum() / vol if vol else np.nan
 
     # 2) 1h 粒度ミニ集計（min/median/VWAP/volume）
     def hourly_summary(self, item_name, q_threshold=None):
-        df = self.extract_item(item_name, q_threshold)
-        g = df.groupby(level=0)
-        return pd.DataFrame(
-            {
-                "min": g["unit_price"].min(),
-                "median": g["unit_price"].median(),
-                "vwap": g.apply(
-                    lambda d: (
-                        (d["unit_price"] * d["quantity"]).sum() / d["quantity"].sum()
-                    )
-                ),
-                "volume": g["quantity"].sum(),
-            }
-        )
+        hourly = self.hourly_stats(item_name, q_threshold)
+        return hourly.loc[hourly["volume"] > 0, ["min", "median", "vwap", "volume"]]
 
     # 3) 移動平均とボラティリティ (window = 時間数)
     def rolling_stats(self, item_name, window=24, q_threshold=None):
-        s = (
-            self.extract_item(item_name, q_threshold)["unit_price"]
-            .resample("1H")
-            .mean()
-        )
-        return pd.DataFrame(
-            {"ma": s.rolling(window).mean(), "sigma": s.rolling(window).std()}
-        )
+        rolling = self.hourly_stats(item_name, q_threshold)["mean"].rolling(window)
+        return pd.DataFrame({"ma": rolling.mean(), "sigma": rolling.std()})
 
     # 4) 出来高 z-score → 異常検知
     def volume_zscore(self, item_name, window=168, q_threshold=None):
-        vol = self.extract_item(item_name, q_threshold)["quantity"].resample("1H").sum()
-        mu = vol.rolling(window).mean()
-        std = vol.rolling(window).std()
-        return (vol - mu) / std
+        vol = self.hourly_stats(item_name, q_threshold)["volume"]
+        rolling = vol.rolling(window)
+        return (vol - rolling.mean()) / rolling.std()
 
     # 5) 強化期待コスト (成功確率を外部で与える)
     def expected_cost(self, item_name, success_prob=0.022, q_threshold=None):
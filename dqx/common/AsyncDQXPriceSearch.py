@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import httpx
+
+from common.DQXPriceSearch import DQXPriceSearch, ITEM_HASH_CATALOG, price_frame
+
+
+class TokenBucket:
+    """
+    asyncio 用のトークンバケット。1秒あたり rate 個トークンが貯まり、最大 capacity 個まで
+    続けて使える。アイテムをまたいで1つを共有し、広場へのリクエスト全体の頻度を抑える。
+    イベントループに紐づく Lock を使うので、asyncio.run の中で作ること。
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                elapsed = now - self._updated_at
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncDQXPriceSearch(DQXPriceSearch):
+    """
+    DQXPriceSearch の asyncio 版。複数アイテムの全ページを1つのイベントループで並行に取得する。
+    Cookie は reuse_session() で読み込んだ CookieJar を全リクエストで共有し、
+    リクエストの頻度はトークンバケットで全体として制限する。
+    ページのパースと返す DataFrame の形は DQXPriceSearch と同じ。
+    """
+
+    def __init__(
+        self,
+        catalog=ITEM_HASH_CATALOG,
+        requests_per_second=4,
+        burst=4,
+        max_connections=8,
+        timeout=30,
+        session=None,
+        transport=None,
+        parser="bs4",
+        sketches=None,
+    ):
+        super().__init__(
+            catalog=catalog,
+            requests_per_second=requests_per_second,
+            session=session,
+            parser=parser,
+            sketches=sketches,
+        )
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_connections = max_connections
+        self.timeout = timeout
+        # httpx のトランスポート（ベンチマークでスタンドインに差し替える時に使う）
+        self.transport = transport
+
+    async def _fetch_page_async(self, client, bucket, item_hash, page_num):
+        await bucket.acquire()
+        response = await client.get(self._page_url(item_hash, page_num))
+        # HTML のパースは CPU を使うので、他のリクエストを止めないよう別スレッドで行う
+        return await asyncio.to_thread(
+            self._to_page,
+            response.content,
+            response.is_success,
+            response.status_code,
+            item_hash,
+        )
+
+    async def _search_price_async(self, client, bucket, item_name):
+        """1アイテムの全ページを取得する（ページの辿り方は mode="concurrent" と同じ）"""
+        item_hash = self.get_item_hash(item_name)
+        self._start_item(item_name)
+        page = await self._fetch_page_async(client, bucket, item_hash, 0)
+        pages = {}
+        self._add_page(pages, 0, self._page_data(page, item_name), item_name)
+        if pages[0] is None:
+            return price_frame()
+        last_page = max(page.page_numbers, default=0)
+        if last_page == 0:
+            # ページャーが無い（読めない）場合は、前のページと同じ内容が返るまで順に取得する
+            page_num = 1
+            while True:
+                page = await self._fetch_page_async(client, bucket, item_hash, page_num)
+                data = self._page_data(page, item_name)
+                if data is None or data == pages[page_num - 1]:
+                    break
+                self._add_page(pages, page_num, data, item_name)
+                page_num += 1
+            return self._merge_pages(pages)
+        while True:
+            targets = [i for i in range(1, last_page + 1) if i not in pages]
+            if not targets:
+                break
+            fetched = await asyncio.gather(
+                *(
+                    self._fetch_page_async(client, bucket, item_hash, page_num)
+                    for page_num in targets
+                )
+            )
+            for page_num, page in zip(targets, fetched):
+                self._add_page(
+                    pages, page_num, self._page_data(page, item_name), item_name
+                )
+                last_page = max(page.page_numbers | {last_page})
+        return self._merge_pages(pages)
+
+    async def _search_prices(self, item_names):
+        bucket = TokenBucket(self.requests_per_second, self.burst)
+        async with httpx.AsyncClient(
+            # requests のセッションの CookieJar をそのまま共有する
+            cookies=self.session.cookies,
+            headers=dict(self.session.headers),
+            limits=httpx.Limits(max_connections=self.max_connections),
+            timeout=self.timeout,
+            # requests と同じくリダイレクトを辿る（ログイン画面への転送を検知するため）
+            follow_redirects=True,
+            transport=self.transport,
+        ) as client:
+            frames = await asyncio.gather(
+                *(
+                    self._search_price_async(client, bucket, item_name)
+                    for item_name in item_names
+                )
+            )
+        return dict(zip(item_names, frames))
+
+    def search_prices(self, item_names):
+        """item_names の出品情報をまとめて取得し、{アイテム名: DataFrame} で返す"""
+        return asyncio.run(self._search_prices(item_names))
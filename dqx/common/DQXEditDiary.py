@@ -6,8 +6,8 @@ from bs4 import BeautifulSoup
 from common.session_cookies import reuse_session
 
 class DQXEditDiary:
-    def __init__(self, character_id):
-        self.session = reuse_session()
+    def __init__(self, character_id, session=None):
+        self.session = session or reuse_session()
         self.base_url = "https://hiroba.dqx.jp"
         self.create_url = f"{self.base_url}/sc/diary/{character_id}/create/2/0"
         self.confirm_url = f"{self.create_url}/confirm"
@@ -1,109 +1,365 @@
-from bs4 import BeautifulSoup
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+from common.bazaar_parser import PRICE_COLUMNS, parse_bazaar_page
+from common.cache_dir import cache_dir
 from common.trino_api import TrinoAPI
 from common.session_cookies import reuse_session
 from common.exceptions import SessionExpiredException
 
 
-class DQXPriceSearch:
-    def __init__(self):
-        self.base_url = "https://hiroba.dqx.jp/sc/search/bazaar"
-        self.trino = TrinoAPI(
+# アイテム名とハッシュの対応表（武器 → 防具 → 道具の順に引く）
+HASH_TABLES = [
+    "metadata_weapon_hash",
+    "metadata_armor_hash",
+    "metadata_dougu_hash",
+]
+
+
+def build_item_hash_index(frames):
+    """
+    ("アイテム名", "ハッシュ") の DataFrame を順に読み、アイテム名 -> ハッシュ の辞書を作る。
+    同じ名前が複数のテーブルにある場合は、先に出てきたハッシュを使う。
+    """
+    index = {}
+    for df in frames:
+        for item_name, item_hash in zip(df["アイテム名"], df["ハッシュ"]):
+            index.setdefault(item_name, item_hash)
+    return index
+
+
+# search_price が返す DataFrame の数値カラムの型（それ以外は object のまま）
+PRICE_DTYPES = {
+    "個数": np.int32,
+    "価格": np.int32,
+    "1つあたりの価格": np.int32,
+}
+
+
+def price_frame(columns=None):
+    """
+    PRICE_COLUMNS をキーにした列ごとのリストから、型を指定した DataFrame を1回で作る。
+    columns が None なら空の DataFrame を返す（空でも型は同じにしておく）。
+    """
+    if columns is None:
+        columns = {col: [] for col in PRICE_COLUMNS}
+    return pd.DataFrame(
+        {
+            col: np.asarray(columns[col], dtype=PRICE_DTYPES.get(col, object))
+            for col in PRICE_COLUMNS
+        },
+        columns=PRICE_COLUMNS,
+    )
+
+
+def concat_prices(frames, item_names):
+    """
+    アイテムごとの出品情報（Name カラム付き）をまとめて1回だけ結合する。
+    Name は item_names をカテゴリにしたカテゴリ型にする。
+    """
+    df = pd.concat(list(frames), ignore_index=True)
+    df["Name"] = pd.Categorical(df["Name"], categories=item_names)
+    return df
+
+
+class ItemHashCatalog:
+    """
+    アイテム名 -> ハッシュ の対応表をプロセス内で共有するキャッシュ。
+    ttl 秒が過ぎるまでは Trino に問い合わせず、同じ辞書を返す。
+    snapshot_path を指定すると Parquet に保存し、ttl 以内のものがあればプロセスを
+    またいでそちらを読む（永続ボリュームを指定すればフロー実行をまたいで使える）。
+    trino: 対応表を読む TrinoAPI（フローが使っている接続を渡す。None なら読む時だけ接続する）
+    """
+
+    def __init__(self, ttl=6 * 60 * 60, snapshot_path=None, trino=None):
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.trino = trino
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.trino_loads = 0
+        self.snapshot_loads = 0
+        self.load_seconds = 0.0
+
+    def _load_from_trino(self):
+        if self.trino is not None:
+            return self._build_index(self.trino)
+        with TrinoAPI(
             host="trino.mynet", port=80, user="tig", catalog="iceberg"
+        ) as trino:
+            return self._build_index(trino)
+
+    def _build_index(self, trino):
+        # 検索に使う2列だけを少しずつ読み込み、DataFrame は残さずに辞書にする
+        return build_item_hash_index(
+            df
+            for table_name in HASH_TABLES
+            for df in trino.iter_query(
+                f'SELECT "アイテム名", "ハッシュ" FROM "dqx"."{table_name}"'
+            )
         )
-        # アイテム名とハッシュの対応表を取得
-        self.df_weapon_hash = self.trino.load("metadata_weapon_hash", "dqx")
-        self.df_armor_hash = self.trino.load("metadata_armor_hash", "dqx")
-        self.df_dougu_hash = self.trino.load("metadata_dougu_hash", "dqx")
-        self.df_hash = pd.concat(
-            [self.df_weapon_hash, self.df_armor_hash, self.df_dougu_hash],
-            ignore_index=True,
+
+    def _load_snapshot(self):
+        """ttl 以内に保存されたスナップショットがあれば (辞書, 保存時刻) を返す"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        saved_at = os.path.getmtime(self.snapshot_path)
+        if time.time() - saved_at >= self.ttl:
+            return None
+        try:
+            df = pd.read_parquet(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            print(f"Failed to read item hash snapshot: {e}")
+            return None
+        return build_item_hash_index([df]), saved_at
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        df = pd.DataFrame(
+            {
+                "アイテム名": list(self._index.keys()),
+                "ハッシュ": list(self._index.values()),
+            }
         )
-        # セッションを再利用
-        self.session = reuse_session()
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        # 書きかけのファイルを他のプロセスが読まないよう、別名で書いてから置き換える
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def get_index(self):
+        """アイテム名 -> ハッシュ の辞書を返す。期限切れの場合だけ読み直す"""
+        with self._lock:
+            if self._index is not None and time.time() - self._loaded_at < self.ttl:
+                self.hits += 1
+                return self._index
+            start = time.perf_counter()
+            snapshot = self._load_snapshot()
+            if snapshot is not None:
+                self._index, self._loaded_at = snapshot
+                self.snapshot_loads += 1
+                source = "snapshot"
+            else:
+                self._index = self._load_from_trino()
+                self._loaded_at = time.time()
+                self.trino_loads += 1
+                self._save_snapshot()
+                source = "trino"
+            elapsed = time.perf_counter() - start
+            self.load_seconds += elapsed
+            print(
+                f"-- load item hash catalog from {source} "
+                f"({len(self._index)} items, {elapsed:.2f}s) ---"
+            )
+            return self._index
+
+    def invalidate(self):
+        """ハッシュのテーブルを更新した時などに、次の get_index で Trino から読み直させる"""
+        with self._lock:
+            self._index = None
+            if self.snapshot_path and os.path.exists(self.snapshot_path):
+                os.remove(self.snapshot_path)
+
+    def stats(self):
+        requests = self.hits + self.trino_loads + self.snapshot_loads
+        return {
+            "requests": requests,
+            "hits": self.hits,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "trino_loads": self.trino_loads,
+            "snapshot_loads": self.snapshot_loads,
+            "load_seconds": round(self.load_seconds, 3),
+        }
+
+
+# プロセス内で共有するアイテムハッシュの対応表
+# （スナップショットは DQX_CACHE_DIR に置く。get_price はフローの TrinoAPI を trino に設定する）
+ITEM_HASH_CATALOG = ItemHashCatalog(snapshot_path=cache_dir("dqx_item_hash.parquet"))
+
+
+class RateLimiter:
+    """
+    requests_per_second を超えないよう、リクエストを始める間隔を空ける。
+    スレッド間で共有して使う（None や 0 なら制限しない）。
+    """
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+
+class DQXPriceSearch:
+    def __init__(
+        self,
+        catalog=ITEM_HASH_CATALOG,
+        max_workers=4,
+        requests_per_second=4,
+        session=None,
+        parser="bs4",
+        sketches=None,
+    ):
+        self.base_url = "https://hiroba.dqx.jp/sc/search/bazaar"
+        # 出品一覧のページを読むパーサー（common.bazaar_parser の backend）
+        self.parser = parser
+        # mode="concurrent" でページを並列に取る時のスレッド数と、広場へのリクエストの上限
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+        # アイテム名とハッシュの対応表（プロセス内で共有し、ttl ごとに読み直す）
+        self.item_hashes = catalog.get_index()
+        # セッションを再利用（未指定なら保存済みの Cookie から作る）
+        self.session = session or reuse_session()
+        # 指定した場合は、読んだページの出品を順に価格のスケッチ (PriceSketches) に足す
+        self.sketches = sketches
 
     def get_item_hash(self, item_name):
-        item_hash = self.df_hash[self.df_hash["アイテム名"] == item_name]["ハッシュ"]
-        if len(item_hash) == 0:
+        item_hash = self.item_hashes.get(item_name)
+        if item_hash is None:
             print(f"Item not found: {item_name}")
-            return None
-        return item_hash.values[0]
+        return item_hash
 
-    def _search_price(self, item_name, page_num=0):
-        # 出品情報を格納するリスト
-        data = []
-        item_hash = self.get_item_hash(item_name)
-        url = f"{self.base_url}/{item_hash}/page/{page_num}"
-        target_response = self.session.get(url)
-        soup = BeautifulSoup(target_response.content, "html.parser")
+    def _page_url(self, item_hash, page_num):
+        return f"{self.base_url}/{item_hash}/page/{page_num}"
+
+    def _to_page(self, content, ok, status_code, item_hash):
+        """レスポンスの HTML を読み、セッション切れなら SessionExpiredException を投げる"""
+        page = parse_bazaar_page(content, item_hash, backend=self.parser)
         # ログイン画面のフォームが存在したら、セッション切れとみなす
-        if soup.find("form", {"id": "loginForm"}):
+        if page.login_required:
             print("Session expired! Redirected to login page.")
             raise SessionExpiredException("Cookie is no longer valid.")
-        if not target_response.ok:
-            print(
-                "Failed to retrieve data with status code: ",
-                target_response.status_code,
-            )
-        error_elements = soup.find_all(class_="txt_error")
-        if len(error_elements) > 0:
+        if not ok:
+            print("Failed to retrieve data with status code: ", status_code)
+        return page
+
+    def _fetch_page(self, item_hash, page_num):
+        """出品一覧の1ページを取得して BazaarPage で返す"""
+        self.rate_limiter.wait()
+        target_response = self.session.get(self._page_url(item_hash, page_num))
+        return self._to_page(
+            target_response.content,
+            target_response.ok,
+            target_response.status_code,
+            item_hash,
+        )
+
+    def _page_data(self, page, item_name):
+        """ページの出品情報（列ごとのリスト）を返す（出品が無ければ None）"""
+        if page.columns is None:
             print(f"No items found for {item_name}")
-            return None
-        soup_tr = soup.find_all(class_="bazaarTable bazaarlist")[0]
-        for row in soup_tr.find_all("tr")[1:]:  # 最初の行はヘッダーなのでスキップ
-            cells = row.find_all("td")
-            # できのよさ
-            quality = cells[0].find("span", class_="starArea").text.strip()
-            # 個数
-            count = int(cells[1].find_all("p")[0].text.split("：")[1].rstrip("こ"))
-            # 価格と1つあたりの価格
-            price_info = cells[1].find_all("p")[1].text.split("\n")
-            price = price_info[0].split("：")[1].replace("G", "").strip()
-            price = int(price)
-            unit_price = (
-                price_info[1].replace("(ひとつあたり", "").replace("G)", "").strip()
-            )
-            unit_price = int(unit_price) if unit_price != "" else price
-            # 出品者
-            seller = cells[1].find("a", class_="strongLnk").text.strip()
-            # 出品期間
-            period = cells[2].text.strip()
-            exhibit_start, exhibit_end = period.split(" ～ ")
-            # データをリストに追加
-            data.append(
-                [quality, count, price, unit_price, exhibit_start, exhibit_end, seller]
-            )
-        return data
+        return page.columns
 
-    def search_price(self, item_name):
+    def _start_item(self, item_name):
+        """
+        アイテムを読み始める時に、そのアイテムのスケッチを空にする
+        （セッション切れなどで同じアイテムを読み直しても二重に数えない）
+        """
+        if self.sketches is not None:
+            self.sketches.reset_item(item_name)
+
+    def _add_page(self, pages, page_num, data, item_name):
+        """読んだページを pages に入れ、スケッチにもそのページの出品を足す"""
+        pages[page_num] = data
+        if self.sketches is not None and data is not None:
+            self.sketches.add(item_name, data["1つあたりの価格"], data["個数"])
+
+    def _search_price(self, item_name, page_num=0):
+        item_hash = self.get_item_hash(item_name)
+        page = self._fetch_page(item_hash, page_num)
+        return self._page_data(page, item_name)
+
+    def search_price(self, item_name, mode="sequential"):
+        """
+        mode:
+        - "sequential": 前のページと同じ内容が返ってくるまで1ページずつ取得する（従来通り）
+        - "concurrent": 1ページ目のページャーから残りのページを調べ、並列に取得する
+        """
+        if mode == "concurrent":
+            return self._search_price_concurrent(item_name)
+        if mode != "sequential":
+            raise ValueError(f"Unknown search mode: {mode}")
+        # ページごとの出品情報（列ごとのリスト）を貯めておき、最後に1回だけ DataFrame にする
+        self._start_item(item_name)
+        pages = {}
         # 現在のページ番号
         pagenum = 0
         # 前回取得したページの情報の格納先
         last_page_content = ""
-        # 出品情報を格納するデータフレーム
         while True:
             data = self._search_price(item_name, pagenum)
-            if pagenum == 0:
-                df = pd.DataFrame(
-                    data,
-                    columns=[
-                        "できのよさ",
-                        "個数",
-                        "価格",
-                        "1つあたりの価格",
-                        "出品開始",
-                        "出品終了",
-                        "出品者",
-                    ],
-                )
-            else:
-                df = pd.concat(
-                    [df, pd.DataFrame(data, columns=df.columns)], ignore_index=True
-                )
-            if data is None:
-                return df
-            if data == last_page_content:
-                return df
+            # 範囲外のページは最終ページと同じ内容が返るので、そこで終わる（結合はしない）
+            if data is None or data == last_page_content:
+                return self._merge_pages(pages)
+            self._add_page(pages, pagenum, data, item_name)
             last_page_content = data
             pagenum += 1
+
+    def _search_price_concurrent(self, item_name):
+        """
+        1ページ目のページャーのリンクから最終ページの番号を調べ、残りのページを並列に取得する。
+        取得したページのページャーにさらに先のページがあれば、それも取得する。
+        結果はページ番号順に結合する。
+        """
+        item_hash = self.get_item_hash(item_name)
+        self._start_item(item_name)
+        page = self._fetch_page(item_hash, 0)
+        pages = {}
+        self._add_page(pages, 0, self._page_data(page, item_name), item_name)
+        if pages[0] is None:
+            return price_frame()
+        last_page = max(page.page_numbers, default=0)
+        if last_page == 0:
+            # ページャーが無い（読めない）場合は、前のページと同じ内容が返るまで順に取得する
+            page_num = 1
+            while True:
+                data = self._page_data(self._fetch_page(item_hash, page_num), item_name)
+                if data is None or data == pages[page_num - 1]:
+                    break
+                self._add_page(pages, page_num, data, item_name)
+                page_num += 1
+        else:
+
+            def fetch(page_num):
+                page = self._fetch_page(item_hash, page_num)
+                return self._page_data(page, item_name), page.page_numbers
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while True:
+                    targets = [i for i in range(1, last_page + 1) if i not in pages]
+                    if not targets:
+                        break
+                    for page_num, (data, linked) in zip(
+                        targets, executor.map(fetch, targets)
+                    ):
+                        self._add_page(pages, page_num, data, item_name)
+                        last_page = max(linked | {last_page})
+        return self._merge_pages(pages)
+
+    def _merge_pages(self, pages):
+        """{ページ番号: 列ごとのリスト} をページ番号順につなげて1つの DataFrame にする"""
+        data = {
+            col: [
+                value
+                for page_num in sorted(pages)
+                if pages[page_num] is not None
+                for value in pages[page_num][col]
+            ]
+            for col in PRICE_COLUMNS
+        }
+        return price_frame(data)
@@ -0,0 +1,261 @@
+"""
+冒険者の広場のバザー検索結果（出品一覧）のページを読むパーサー。
+backend で実装を選べる。どれも同じ BazaarPage を返す。
+- "bs4": BeautifulSoup (html.parser) で木を作ってから find_all で辿る（従来の方法）
+- "html": 標準ライブラリの HTMLParser でタグを順に読み、必要な文字列だけを列ごとに集める
+  BeautifulSoup の html.parser と同じトークナイザなので、取り出す文字列も同じになる
+"html" は合成したページ（benchmark.fake_hiroba）でしか確かめていないので、既定は "bs4" のまま。
+"""
+
+import re
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+
+# 出品一覧から取り出すカラム（search_price が返す DataFrame のカラム）
+PRICE_COLUMNS = [
+    "できのよさ",
+    "個数",
+    "価格",
+    "1つあたりの価格",
+    "出品開始",
+    "出品終了",
+    "出品者",
+]
+
+# BeautifulSoup の html.parser と同じく、閉じタグを持たない要素
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+
+class BazaarPage:
+    """
+    出品一覧の1ページを読んだ結果。
+    columns: PRICE_COLUMNS をキーにした列ごとのリスト（出品が無いページは None）
+    page_numbers: ページャーからリンクされているページ番号の集合
+    login_required: ログイン画面が返ってきた（セッション切れ）かどうか
+    """
+
+    def __init__(self, columns, page_numbers, login_required):
+        self.columns = columns
+        self.page_numbers = page_numbers
+        self.login_required = login_required
+
+
+def _new_columns():
+    return {col: [] for col in PRICE_COLUMNS}
+
+
+def _append_row(columns, quality, count_text, price_text, seller, period):
+    """各セルの文字列を数値などに変換して列に追加する（変換は backend によらず共通）"""
+    # 個数
+    count = int(count_text.split("：")[1].rstrip("こ"))
+    # 価格と1つあたりの価格
+    price_info = price_text.split("\n")
+    price = int(price_info[0].split("：")[1].replace("G", "").strip())
+    unit_price = price_info[1].replace("(ひとつあたり", "").replace("G)", "").strip()
+    unit_price = int(unit_price) if unit_price != "" else price
+    # 出品期間
+    exhibit_start, exhibit_end = period.strip().split(" ～ ")
+    columns["できのよさ"].append(quality.strip())
+    columns["個数"].append(count)
+    columns["価格"].append(price)
+    columns["1つあたりの価格"].append(unit_price)
+    columns["出品開始"].append(exhibit_start)
+    columns["出品終了"].append(exhibit_end)
+    columns["出品者"].append(seller.strip())
+
+
+def _page_link_pattern(item_hash):
+    return re.compile(rf"/{re.escape(str(item_hash))}/page/(\d+)")
+
+
+def _class_matches(class_value, name):
+    """BeautifulSoup の class_=name と同じ判定（クラスのどれか、または全体が一致）"""
+    classes = class_value.split()
+    return name in classes or " ".join(classes) == name
+
+
+def _parse_bs4(content, item_hash):
+    soup = BeautifulSoup(content, "html.parser")
+    # ログイン画面のフォームが存在したら、セッション切れとみなす
+    login_required = soup.find("form", {"id": "loginForm"}) is not None
+    pattern = _page_link_pattern(item_hash)
+    page_numbers = set()
+    for link in soup.find_all("a", href=True):
+        match = pattern.search(link["href"])
+        if match:
+            page_numbers.add(int(match.group(1)))
+    if login_required or soup.find_all(class_="txt_error"):
+        return BazaarPage(None, page_numbers, login_required)
+    columns = _new_columns()
+    soup_tr = soup.find_all(class_="bazaarTable bazaarlist")[0]
+    for row in soup_tr.find_all("tr")[1:]:  # 最初の行はヘッダーなのでスキップ
+        cells = row.find_all("td")
+        _append_row(
+            columns,
+            quality=cells[0].find("span", class_="starArea").text,
+            count_text=cells[1].find_all("p")[0].text,
+            price_text=cells[1].find_all("p")[1].text,
+            seller=cells[1].find("a", class_="strongLnk").text,
+            period=cells[2].text,
+        )
+    return BazaarPage(columns, page_numbers, login_required)
+
+
+class _BazaarHTMLParser(HTMLParser):
+    """
+    出品一覧のページを先頭から順に読み、必要な要素の文字列だけを集める。
+    開いている要素をスタックで持ち、閉じタグでは BeautifulSoup と同じく
+    同名の直近の要素まで閉じる。文字列は開いている取得対象の要素すべてに足す
+    （BeautifulSoup の .text と同じく子孫の文字列も含める）。
+    """
+
+    def __init__(self, item_hash):
+        super().__init__(convert_charrefs=True)
+        self.pattern = _page_link_pattern(item_hash)
+        self.page_numbers = set()
+        self.login_required = False
+        self.has_error = False
+        # 開いている要素: (タグ名, 文字列を集めるリスト or None)
+        self.stack = []
+        # 出品一覧のテーブルを開いた時のスタックの深さ
+        self.table_depth = None
+        self.table_found = False
+        self.rows = []
+        self.row = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        class_value = attrs.get("class") or ""
+        if tag == "form" and attrs.get("id") == "loginForm":
+            self.login_required = True
+        if tag == "a" and attrs.get("href"):
+            match = self.pattern.search(attrs["href"])
+            if match:
+                self.page_numbers.add(int(match.group(1)))
+        if class_value and _class_matches(class_value, "txt_error"):
+            self.has_error = True
+        texts = None
+        if self.table_depth is None:
+            # 最初に見つかった出品一覧のテーブルだけを読む
+            if (
+                not self.table_found
+                and class_value
+                and _class_matches(class_value, "bazaarTable bazaarlist")
+            ):
+                self.table_depth = len(self.stack)
+                self.table_found = True
+        elif tag == "tr":
+            self.row = {"cells": [], "quality": None, "p": [], "seller": None}
+            self.rows.append(self.row)
+        elif self.row is not None:
+            texts = self._capture(tag, class_value)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, texts))
+
+    def _capture(self, tag, class_value):
+        """
+        行の中で文字列が必要な要素なら、文字列を集めるリストを行に登録して返す。
+        開始タグの順に登録するので、find_all / find と同じ順序になる。
+        """
+        row = self.row
+        if tag == "td":
+            row["cells"].append([])
+            return row["cells"][-1]
+        n_cells = len(row["cells"])
+        if (
+            n_cells == 1
+            and tag == "span"
+            and row["quality"] is None
+            and _class_matches(class_value, "starArea")
+        ):
+            row["quality"] = []
+            return row["quality"]
+        if n_cells == 2:
+            if tag == "p":
+                row["p"].append([])
+                return row["p"][-1]
+            if (
+                tag == "a"
+                and row["seller"] is None
+                and _class_matches(class_value, "strongLnk")
+            ):
+                row["seller"] = []
+                return row["seller"]
+        return None
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            # 開いていない要素の閉じタグは無視する
+            return
+        del self.stack[i:]
+        if self.table_depth is not None and len(self.stack) <= self.table_depth:
+            # 出品一覧のテーブルを閉じた
+            self.table_depth = None
+            self.row = None
+
+    def handle_data(self, data):
+        for _, texts in self.stack:
+            if texts is not None:
+                texts.append(data)
+
+
+def _parse_html(content, item_hash):
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    parser = _BazaarHTMLParser(item_hash)
+    parser.feed(content)
+    parser.close()
+    if parser.login_required or parser.has_error:
+        return BazaarPage(None, parser.page_numbers, parser.login_required)
+    if not parser.table_found:
+        raise IndexError("bazaarTable bazaarlist not found")
+    columns = _new_columns()
+    for row in parser.rows[1:]:  # 最初の行はヘッダーなのでスキップ
+        cells = row["cells"]
+        _append_row(
+            columns,
+            quality="".join(row["quality"]),
+            count_text="".join(row["p"][0]),
+            price_text="".join(row["p"][1]),
+            seller="".join(row["seller"]),
+            period="".join(cells[2]),
+        )
+    return BazaarPage(columns, parser.page_numbers, parser.login_required)
+
+
+PARSER_BACKENDS = {
+    "bs4": _parse_bs4,
+    "html": _parse_html,
+}
+
+
+def parse_bazaar_page(content, item_hash, backend="bs4"):
+    """出品一覧のページ (HTML) を読み、BazaarPage を返す"""
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    return PARSER_BACKENDS[backend](content, item_hash)
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+
+def cache_dir(name):
+    """
+    ローカルのキャッシュを置くディレクトリ。環境変数 DQX_CACHE_DIR があればその下、
+    無ければ一時ディレクトリの下にする（コンテナのフロー実行をまたいで使うには、
+    永続ボリュームをマウントしたパスを DQX_CACHE_DIR に指定する）
+    """
+    return os.path.join(os.environ.get("DQX_CACHE_DIR", tempfile.gettempdir()), name)
@@ -1,12 +1,15 @@
 import pandas as pd
 
+from common.price_sketch import percentile_price
+
 
 def get_cheap_item_list(item_name,
                         df_all,
                         percentile=0.05,
                         quantity_threshold=10,
                         discount_margin=500,
-                        top_n=15):
+                        top_n=15,
+                        sketches=None):
     u"""
     現在出品されているアイテムから、現在の相場の中で比較的安いものを抽出する
     - item_name: 対象のアイテム名。細胞の場合は欠片を20倍の価格に換算して同時に探索する。
@@ -15,21 +18,25 @@ def get_cheap_item_list(item_name,
     - quantity_threshold: 一定個数以下のかけらの価格を排除。安く出品されていても買わないため
     - discount_margin: 参考価格よりも安いものを取得するためのマージン
     - top_n: 安い順で表示する最大の件数
+    - sketches: 取得中に作った PriceSketches。あれば参考価格はそこから取る
     """
     df = df_all[df_all["Name"] == item_name].copy()
     df["judge_price"] = df["1つあたりの価格"]
-    five_percentile_price = df["judge_price"].quantile(percentile)
+    five_percentile_price = percentile_price(df_all, item_name, percentile, sketches=sketches)
+    df_kakera = df.iloc[0:0]
     if item_name in ["魔因細胞", "閃魔細胞"]:
         # 細胞の場合は欠片の価格を20倍したものも比較対象に含める
         item_name_kakera = item_name + "のかけら"
         df_kakera = df_all[df_all["Name"] == item_name_kakera].copy()
         # 欠片はしきい値よりも出品数が小さいものを除外
         df_kakera = df_kakera[df_kakera["個数"] > quantity_threshold]
+        df_kakera["judge_price"] = df_kakera["1つあたりの価格"] * 20
         five_percentile_price_kakera = df_kakera["judge_price"].quantile(percentile)
         five_percentile_price = min(five_percentile_price, five_percentile_price_kakera)
+    base_price = five_percentile_price
     # 結合
     df_append = pd.concat([df, df_kakera], ignore_index=True)
-    df_append = df_append.sort_values(by="1つあたりの価格", ascending=True)
+    df_append = df_append.sort_values(by="judge_price", ascending=True)
     # しきい値よりも安いものを取得
     df_cheap = df_append[df_append["judge_price"] <= base_price - discount_margin]
     if len(df_cheap) < 3:
@@ -1,11 +1,15 @@
 from prefect import task
 from common.DatetimeTranslator import DatetimeTranslator
+from common.price_sketch import percentile_price as get_percentile_price
 
 @task(name="create hourly price message for discord",
       retries=5,
       retry_delay_seconds=1)
-def create_message_kishoukaku_hourly_price(df_all):
-    u"""discrodに送る価格情報のメッセージを作成する"""
+def create_message_kishoukaku_hourly_price(df_all, sketches=None):
+    u"""
+    discrodに送る価格情報のメッセージを作成する
+    sketches: 取得中に作った PriceSketches。あればパーセンタイルはそこから取る（無いアイテムは df_all から計算）
+    """
     percentile = 0.05
     quantity_threshold = 3  # 一定個数以上の核の価格を排除。まとめ売りを排除するため
     # 価格情報を取得する日時を取得
@@ -18,22 +22,19 @@ def create_message_kishoukaku_hourly_price(df_all):
     for forcus_item_list in focus_item_matrix:
         kaku_name, saibou_name, kakera_name = forcus_item_list
         for item_name in forcus_item_list:
-            df_item = df_all[df_all["Name"] == item_name]
             if item_name in ["輝晶核", "閃輝晶核"]:
                 # 核の場合は安く大量出品している人がいるので除外
-                percentile_price = df_item[(df_item["個数"] <= quantity_threshold)]["1つあたりの価格"].quantile(percentile)
+                percentile_price = get_percentile_price(df_all, item_name, percentile, quantity_threshold, sketches)
             else:
-                percentile_price = df_item["1つあたりの価格"].quantile(percentile)
+                percentile_price = get_percentile_price(df_all, item_name, percentile, sketches=sketches)
             message_price = f"**{item_name}** : " + "{:,}".format(int(percentile_price))+"G\n"
             message += message_price
         # 利益の期待値を計算
         # 細胞1個かかけら20個の内の安い方で計算
-        price_saibou_base = min(df_all[df_all["Name"] == f"{saibou_name}"]["1つあたりの価格"].quantile(percentile),
-                                df_all[df_all["Name"] == f"{kakera_name}"]["1つあたりの価格"].quantile(percentile)*20)
+        price_saibou_base = min(get_percentile_price(df_all, saibou_name, percentile, sketches=sketches),
+                                get_percentile_price(df_all, kakera_name, percentile, sketches=sketches)*20)
         # Nameが輝晶核で列名"個数"の値がquantity_threshold以上の核のデータを排除
-        price_kaku_base = df_all[
-                (df_all["Name"] == f"{kaku_name}") & (df_all["個数"] <= quantity_threshold)
-                ]["1つあたりの価格"].quantile(percentile)
+        price_kaku_base = get_percentile_price(df_all, kaku_name, percentile, quantity_threshold, sketches)
         profit = price_kaku_base*(1*0.1+(75/99)*0.5+(45/99)*0.4)*0.95*4 - price_saibou_base*30
         profit = int(profit)
         message_profit = "**一周持寄の利益期待値**: "+"{:,}".format(profit)+"G\n"
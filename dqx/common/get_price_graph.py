@@ -4,16 +4,37 @@ import tempfile
 from prefect import task
 
 from common.AnalyzePrice import AnalyzePrice
+from common.price_graph_cache import PRICE_GRAPH_CACHE
 
 
 @task(name="send price image to discord",
       retries=5,
       retry_delay_seconds=1)
-def create_price_graph(focus_item, start_datetime, end_datetime, graph_title="価格推移"):
+def create_price_graph(focus_item, start_datetime, end_datetime, graph_title="価格推移",
+                       cache=PRICE_GRAPH_CACHE):
     u"""
     価格推移のグラフを生成し、一時ファイルに保存する。
     生成したグラフはPNG形式で保存され、ファイル名を返す。
+    cache (PriceGraphCache) に同じアイテム・範囲（時間単位）・タイトルで、範囲内の最新の observed_at と
+    ロールアップの最新の時間も同じグラフがあれば、描き直さずにそのファイル名を返す
     """
+    datetime_range = {"start": start_datetime, "end": end_datetime}
+    if cache is not None:
+        # 最新の時間だけを問い合わせ、price_hourly もロールアップも変わっていなければ前の PNG を使う
+        probe = AnalyzePrice(
+            "price_hourly", datetime_range, item_names=focus_item, load=False
+        )
+        key = cache.key(
+            focus_item,
+            start_datetime,
+            end_datetime,
+            probe.latest_observed_at(),
+            graph_title,
+            rollup_high=probe.rollup_high_water(),
+        )
+        cached_file_name = cache.get(key)
+        if cached_file_name is not None:
+            return cached_file_name
     percentile = 0.05
     quantity_threshold = 3  # 一定個数以上の核の価格を排除。まとめ売りを排除するため
     # 閃輝晶核の価格推移を表示
@@ -22,9 +43,16 @@ def create_price_graph(focus_item, start_datetime, end_datetime, graph_title="
         cols=len(focus_item),
         subplot_titles=focus_item
     )
+    # 全アイテム分を1回で読み込み、サブプロットで共有する
+    # （P5 は mart のロールアップから読み、まだ mart に入っていない新しい時間だけを
+    # price_hourly から mart と同じ式で集計して補う）
+    analyze = AnalyzePrice(
+        "price_hourly",
+        datetime_range,
+        item_names=focus_item,
+        rollup=True,
+    )
     for idx, item_name in enumerate(focus_item, start=1):
-        datetime_range = {"start": start_datetime, "end": end_datetime}
-        analyze = AnalyzePrice("price_hourly", datetime_range)
         # 一日の間の価格推移を取得
         if item_name in ["輝晶核", "閃輝晶核"]:
             # 核の場合は安く大量出品している人がいるので除外
@@ -49,5 +77,7 @@ def create_price_graph(focus_item, start_datetime, end_datetime, graph_title="
     # 一時ファイルに保存
     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
     fig.write_image(temp_file.name)
+    if cache is not None:
+        cache.put(key, temp_file.name)
     return temp_file.name
 
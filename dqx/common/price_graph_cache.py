@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+
+import pandas as pd
+
+from common.cache_dir import cache_dir
+
+
+class PriceGraphCache:
+    """
+    create_price_graph が書いた PNG のディスクキャッシュ。キーはアイテム・表示範囲・タイトルと、
+    範囲内の最新の observed_at（price_hourly に新しい時間が入ったら別のキーになる）と
+    ロールアップの最新の ts_hour（mart が追いついて値が入れ替わったら別のキーになる）。
+    observed_at は時間単位なので、範囲は時間単位に切り捨ててキーにする（範囲に入る行は変わらない）。
+    同じ時間のうちに同じ「!グラフ 1w」を何度受けても、描き直さずに前の PNG を返す。
+    タイトルに入っている要求された範囲も切り捨てた範囲に置き換えてキーにするので、
+    返す PNG のタイトルはその時間に最初に描いた時の範囲になる。
+    max_entries を超えたら、最後に使ってから一番時間が経ったものから消す（LRU。使った時に mtime を更新する）。
+    """
+
+    def __init__(self, root, max_entries=64):
+        self.root = pathlib.Path(root)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(
+        self,
+        focus_item,
+        start_datetime,
+        end_datetime,
+        latest_observed_at,
+        title,
+        rollup_high=None,
+    ):
+        start_hour = pd.Timestamp(start_datetime).floor("h")
+        end_hour = pd.Timestamp(end_datetime).floor("h")
+        title = title.replace(str(start_datetime), str(start_hour)).replace(
+            str(end_datetime), str(end_hour)
+        )
+        parts = {
+            "items": list(focus_item),
+            "start": str(start_hour),
+            "end": str(end_hour),
+            "latest": str(latest_observed_at),
+            "rollup_high": str(rollup_high),
+            "title": title,
+        }
+        text = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.root / f"{key}.png"
+
+    def get(self, key):
+        """キャッシュした PNG のパスを返す。無ければ None"""
+        with self._lock:
+            path = self._path(key)
+            if not path.exists():
+                self.misses += 1
+                return None
+            os.utime(path)
+            self.hits += 1
+            return str(path)
+
+    def put(self, key, png_path):
+        """png_path をキャッシュに入れ、キャッシュ側のパスを返す"""
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            # 書きかけのファイルを他のプロセスが読まないよう、別名で書いてから置き換える
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            shutil.copyfile(png_path, tmp_path)
+            os.replace(tmp_path, path)
+            self._evict()
+            return str(path)
+
+    def _evict(self):
+        paths = sorted(self.root.glob("*.png"), key=lambda p: p.stat().st_mtime)
+        for path in paths[: max(0, len(paths) - self.max_entries)]:
+            path.unlink(missing_ok=True)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(list(self.root.glob("*.png"))) if self.root.exists() else 0,
+        }
+
+
+# プロセス内で共有するグラフのキャッシュ（Discord のボットの flow など、常駐するプロセスで使い回す）
+PRICE_GRAPH_CACHE = PriceGraphCache(cache_dir("dqx_price_graph"))
@@ -0,0 +1,194 @@
+import json
+import os
+import pathlib
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from common.trino_api import TrinoAPI
+
+
+# AnalyzePrice が price_hourly から読む列
+PRICE_HISTORY_COLUMNS = ["name", "1つあたりの価格", "個数", "observed_at"]
+
+
+def _current_hour():
+    """JST の現在の時刻を時間単位に切り捨てる（observed_at は JST で保存している）"""
+    return pd.Timestamp.now(tz="Asia/Tokyo").tz_localize(None).floor("h")
+
+
+class PriceHistoryCache:
+    """
+    iceberg.dqx.price_hourly のローカルキャッシュ。日ごとの Parquet (root/YYYY-MM-DD.parquet) に分けて置く。
+    キャッシュ済みの範囲 [low, high) を root/_state.json に覚えておき、
+    読む範囲がその外にはみ出した分（high より新しい時間 / low より古い時間）だけを Trino から取る。
+    現在の時間から settle（既定は1時間）以内の行はまだ書き込まれる（フローの再実行など）ことがあるので
+    キャッシュせず、読むたびに Trino から取る。
+    生データを読む AnalyzePrice(cache=...) に渡して使う（ロールアップを読むグラフでは使わない）。
+    """
+
+    def __init__(self, root, trino=None, settle=None):
+        self.root = pathlib.Path(root)
+        self.trino = trino
+        self.settle = pd.Timedelta(hours=1) if settle is None else settle
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.trino_queries = 0
+        self.rows_fetched = 0
+        self.fetch_seconds = 0.0
+
+    def _get_trino(self):
+        if self.trino is None:
+            self.trino = TrinoAPI(
+                host="trino.mynet", port=80, user="tig", catalog="iceberg"
+            )
+        return self.trino
+
+    @property
+    def _state_path(self):
+        return self.root / "_state.json"
+
+    def _day_path(self, day):
+        return self.root / f"{day:%Y-%m-%d}.parquet"
+
+    def _replace_file(self, path, write):
+        # 書きかけのファイルを他のプロセスが読まないよう、別名で書いてから置き換える
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _load_state(self):
+        """キャッシュ済みの範囲 (low, high) を返す。無ければ (None, None)"""
+        if not self._state_path.exists():
+            return None, None
+        with open(self._state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return pd.Timestamp(state["low"]), pd.Timestamp(state["high"])
+
+    def _save_state(self, low, high):
+        def write(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"low": str(low), "high": str(high)}, f)
+
+        self._replace_file(self._state_path, write)
+
+    def _fetch(self, start, end, include_end=False, item_names=None):
+        """Trino から start <= observed_at < end（include_end なら <= end）の行を取る"""
+        end_op = "<=" if include_end else "<"
+        columns = ", ".join(f'"{column}"' for column in PRICE_HISTORY_COLUMNS)
+        name_filter = ""
+        if item_names is not None:
+            names = ", ".join(
+                "'" + str(name).replace("'", "''") + "'" for name in item_names
+            )
+            name_filter = f"AND name IN ({names})"
+        sql = f"""
+        SELECT {columns}
+        FROM iceberg.dqx.price_hourly
+        WHERE observed_at >= TIMESTAMP '{start:%Y-%m-%d %H:%M:%S}'
+          AND observed_at {end_op} TIMESTAMP '{end:%Y-%m-%d %H:%M:%S}'
+          {name_filter}
+        """
+        started = time.perf_counter()
+        df = self._get_trino().execute_query(sql, fetch="arrow")
+        self.fetch_seconds += time.perf_counter() - started
+        self.trino_queries += 1
+        self.rows_fetched += len(df)
+        df["observed_at"] = pd.to_datetime(df["observed_at"])
+        return df
+
+    def _write_days(self, df, start, end):
+        """
+        [start, end) の範囲を取った結果を日ごとのファイルに書き足す。
+        前回が状態を保存する前に止まっていても重複しないよう、同じ範囲の既存の行は置き換える
+        """
+        for day, df_day in df.groupby(df["observed_at"].dt.normalize()):
+            path = self._day_path(day)
+            if path.exists():
+                df_old = pd.read_parquet(path)
+                in_range = (df_old["observed_at"] >= start) & (
+                    df_old["observed_at"] < end
+                )
+                df_day = pd.concat([df_old[~in_range], df_day], ignore_index=True)
+            df_day = df_day.sort_values("observed_at", kind="stable")
+            self._replace_file(
+                path, lambda p, df_day=df_day: df_day.to_parquet(p, index=False)
+            )
+
+    def _fill(self, start, end):
+        df = self._fetch(start, end)
+        self._write_days(df, start, end)
+
+    def refresh(self, start):
+        """
+        start から確定した時間まで（現在の時間 - settle より前）をキャッシュに揃える。
+        キャッシュ済みの範囲より新しい / 古い時間だけを取る。確定した範囲 (low, high) を返す
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        cutoff = _current_hour() - self.settle
+        start = pd.Timestamp(start).floor("h")
+        low, high = self._load_state()
+        if low is None:
+            if start >= cutoff:
+                return None, None
+            self._fill(start, cutoff)
+            low, high = start, cutoff
+        else:
+            if start < low:
+                self._fill(start, low)
+                low = start
+            if high < cutoff:
+                self._fill(high, cutoff)
+                high = cutoff
+        self._save_state(low, high)
+        return low, high
+
+    def _read_days(self, paths, start, end, item_names):
+        """日ごとのファイルをまとめて1つの Table として読み、範囲とアイテムで絞ってから DataFrame にする"""
+        filters = [("observed_at", ">=", start), ("observed_at", "<=", end)]
+        if item_names is not None:
+            filters.append(("name", "in", list(item_names)))
+        return pq.read_table(paths, filters=filters).to_pandas()
+
+    def read(self, start, end, item_names=None):
+        """
+        start <= observed_at <= end の行を返す（AnalyzePrice の BETWEEN と同じ範囲）。
+        確定した時間はキャッシュから、それより新しい時間は Trino から読む
+        """
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        with self._lock:
+            self.reads += 1
+            _low, high = self.refresh(start)
+            frames = []
+            if high is not None:
+                paths = [
+                    str(self._day_path(day))
+                    for day in pd.date_range(start.normalize(), end.normalize())
+                    if day < high and self._day_path(day).exists()
+                ]
+                if paths:
+                    frames.append(self._read_days(paths, start, end, item_names))
+            tail_start = start if high is None else max(start, high)
+            if tail_start <= end:
+                frames.append(
+                    self._fetch(
+                        tail_start, end, include_end=True, item_names=item_names
+                    )
+                )
+        frames = [df for df in frames if len(df)]
+        if not frames:
+            return pd.DataFrame(columns=PRICE_HISTORY_COLUMNS)
+        df = pd.concat(frames, ignore_index=True)
+        in_range = (df["observed_at"] >= start) & (df["observed_at"] <= end)
+        return df[in_range].reset_index(drop=True)
+
+    def stats(self):
+        return {
+            "reads": self.reads,
+            "trino_queries": self.trino_queries,
+            "rows_fetched": self.rows_fetched,
+            "fetch_seconds": round(self.fetch_seconds, 3),
+        }
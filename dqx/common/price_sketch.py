@@ -0,0 +1,229 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from minio.error import S3Error
+
+
+class KLLSketch:
+    """
+    KLL のクォンタイル・スケッチ。値を少しずつ足していき、パーセンタイルの近似値を返す。
+    レベル h に残った値は 2**h 個分の重みを持ち、容量を超えたレベルは半分に間引いて上のレベルに送る。
+    足した値が k 個以下なら全部を持っているので、quantile は pandas の quantile と同じ値になる
+    （それより多い場合の順位の誤差はおよそ 1.7 / k）。
+    同じ k のスケッチ同士は merge でまとめられる（1時間ごとのスケッチから日・週のスケッチを作る）。
+    """
+
+    def __init__(self, k=1000, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # 上のレベルほど容量を大きくする（一番上が k）
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _size(self):
+        return sum(len(items) for items in self.levels)
+
+    def _compress(self):
+        while self._size() > sum(self._capacity(h) for h in range(len(self.levels))):
+            h = next(
+                h
+                for h, items in enumerate(self.levels)
+                if len(items) >= self._capacity(h)
+            )
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[h])
+            # 奇数個なら1つはこのレベルに残し、残りを1つおきに上のレベルに送る
+            rest, items = items[: len(items) % 2], items[len(items) % 2 :]
+            offset = self._rng.integers(2)
+            self.levels[h] = rest
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[offset::2]])
+
+    def update(self, values):
+        """値（1つでも配列でもよい）を足す"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """other の値をまとめる（k は同じであること）"""
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches with k={self.k} and k={other.k}")
+        self.n += other.n
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """q (0〜1) のパーセンタイルの値を返す（値が無ければ NaN）"""
+        if self.n == 0:
+            return np.nan
+        if len(self.levels) == 1:
+            # 間引いていなければ、pandas の quantile と同じく線形補間した値を返す
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2**h) for h, items in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        rank = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(values[order][min(rank, len(values) - 1)])
+
+    def to_dict(self):
+        return {
+            "k": self.k,
+            "n": self.n,
+            "levels": [items.tolist() for items in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [
+            np.asarray(items, dtype=np.float64) for items in data["levels"]
+        ]
+        return sketch
+
+
+class PriceSketches:
+    """
+    アイテムごとの "1つあたりの価格" の KLLSketch。
+    quantity_thresholds の個数以下に絞った版も持つ（核はまとめ売りを除いて P5 を取るため）。
+    キーは (アイテム名, 個数の上限 or None)。
+    DQXPriceSearch に渡すと、アイテムを読み始める時に reset_item でそのアイテムを空にし、
+    読んだページごとに add で足していく（セッション切れで同じアイテムを取り直しても二重には数えない）。
+    """
+
+    def __init__(self, k=1000, quantity_thresholds=(3,)):
+        self.k = k
+        self.quantity_thresholds = tuple(quantity_thresholds)
+        self.sketches = {}
+
+    def reset_item(self, item_name):
+        """item_name のスケッチを空にする"""
+        for threshold in (None, *self.quantity_thresholds):
+            self.sketches[item_name, threshold] = KLLSketch(self.k)
+
+    def add(self, item_name, unit_prices, quantities):
+        """item_name のスケッチに出品情報（1ページ分など）を足す"""
+        unit_prices = np.asarray(unit_prices, dtype=np.float64)
+        quantities = np.asarray(quantities, dtype=np.float64)
+        for threshold in (None, *self.quantity_thresholds):
+            values = unit_prices
+            if threshold is not None:
+                values = unit_prices[quantities <= threshold]
+            if (item_name, threshold) not in self.sketches:
+                self.sketches[item_name, threshold] = KLLSketch(self.k)
+            self.sketches[item_name, threshold].update(values)
+
+    def quantile(self, item_name, q, quantity_threshold=None):
+        """スケッチが無い（取得していない / 絞り込みに対応していない）場合は None を返す"""
+        sketch = self.sketches.get((item_name, quantity_threshold))
+        if sketch is None:
+            return None
+        return sketch.quantile(q)
+
+    def merge(self, other):
+        for key, sketch in other.sketches.items():
+            if key in self.sketches:
+                self.sketches[key].merge(sketch)
+            else:
+                self.sketches[key] = KLLSketch.from_dict(sketch.to_dict())
+        return self
+
+    def to_json(self):
+        return json.dumps(
+            {
+                "k": self.k,
+                "quantity_thresholds": list(self.quantity_thresholds),
+                "sketches": [
+                    {"name": name, "quantity_threshold": threshold, **sketch.to_dict()}
+                    for (name, threshold), sketch in self.sketches.items()
+                ],
+            },
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        sketches = cls(k=data["k"], quantity_thresholds=data["quantity_thresholds"])
+        for entry in data["sketches"]:
+            sketches.sketches[entry["name"], entry["quantity_threshold"]] = (
+                KLLSketch.from_dict(entry)
+            )
+        return sketches
+
+
+def sketch_key(observed_at):
+    """1時間分のスケッチを置くオブジェクトのキー"""
+    observed_at = pd.Timestamp(observed_at)
+    return f"price_sketches/{observed_at:%Y-%m-%d}/{observed_at:%H}.json"
+
+
+def save_price_sketches(client, bucket, observed_at, sketches):
+    """1時間分のスケッチを MinIO に置く（同じ時間を取り直した場合は上書きする）"""
+    body = sketches.to_json().encode("utf-8")
+    client.put_object(
+        bucket,
+        sketch_key(observed_at),
+        io.BytesIO(body),
+        length=len(body),
+        content_type="application/json",
+    )
+
+
+def load_price_sketches(client, bucket, start, end):
+    """
+    start から end までの1時間ごとのスケッチを読んでまとめる（日・週のパーセンタイル用）。
+    スケッチが無い時間は飛ばす
+    """
+    merged = None
+    for observed_at in pd.date_range(
+        pd.Timestamp(start).floor("h"), pd.Timestamp(end), freq="h"
+    ):
+        try:
+            response = client.get_object(bucket, sketch_key(observed_at))
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                continue
+            raise
+        try:
+            sketches = PriceSketches.from_json(response.read().decode("utf-8"))
+        finally:
+            response.close()
+            response.release_conn()
+        merged = sketches if merged is None else merged.merge(sketches)
+    return merged
+
+
+def percentile_price(
+    df_all, item_name, percentile, quantity_threshold=None, sketches=None
+):
+    """
+    df_all（search_price の結果を結合したもの）の item_name のパーセンタイル価格。
+    sketches にそのアイテムのスケッチがあればそこから返し、無ければ df_all を絞り込んで計算する
+    """
+    if sketches is not None:
+        price = sketches.quantile(item_name, percentile, quantity_threshold)
+        if price is not None:
+            return price
+    df_item = df_all[df_all["Name"] == item_name]
+    if quantity_threshold is not None:
+        df_item = df_item[df_item["個数"] <= quantity_threshold]
+    return df_item["1つあたりの価格"].quantile(percentile)
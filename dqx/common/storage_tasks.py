@@ -0,0 +1,26 @@
+from urllib.parse import urlparse
+
+from minio import Minio
+from prefect.variables import Variable
+from prefect.blocks.system import Secret
+
+
+def connect_s3_client():
+    """
+    MinIO のクライアントと、データレイク用のバケット名を返す。
+    Prefect の Secret "minio-dqx-access-key" / "minio-dqx-secret-key" を作っておくこと
+    （Variable "minio-endpoint" / "datalake-bronze-bucket" は無ければ既定値を使う）
+    """
+    endpoint_url = Variable.get("minio-endpoint", default="http://minio.mynet")
+    bucket = Variable.get("datalake-bronze-bucket", default="bronze-zone")
+    access_key = Secret.load("minio-dqx-access-key").get()
+    secret_key = Secret.load("minio-dqx-secret-key").get()
+    # Minio はスキーム無しのホスト名を受け取るので URL を分解して渡す
+    endpoint = urlparse(endpoint_url)
+    client = Minio(
+        endpoint.netloc,
+        access_key=access_key,
+        secret_key=secret_key,
+        secure=endpoint.scheme == "https",
+    )
+    return client, bucket
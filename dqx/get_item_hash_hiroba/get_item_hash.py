@@ -9,6 +9,7 @@ from bs4 import BeautifulSoup
 project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root))
 from common.session_cookies import load_session_cookies
+from common.DQXPriceSearch import ITEM_HASH_CATALOG
 from common.trino_api import TrinoAPI
 
 
@@ -44,27 +45,31 @@ def get_item_hash():
                          catalog='iceberg')
         schema_name = "dqx"
         trino.create_schema(schema_name)
-        df = trino.load(table_name, "dqx")
         table_name_hash = table_name + "_hash"
+        # 取得済みのアイテム名だけを持っておく（テーブル全体はメモリに載せない）
+        hashed_names = set()
         if trino.table_exists(table_name_hash, schema_name):
-            df_hash = trino.load(table_name_hash, "dqx")
-        else:
-            # 空のデータフレームを作成
-            df_hash = pd.DataFrame(columns=["アイテム名", "カテゴリ", "ハッシュ"])
+            for df_hash in trino.iter_query(
+                    f'SELECT "アイテム名" FROM "{schema_name}"."{table_name_hash}"'):
+                hashed_names.update(df_hash["アイテム名"])
+        # ハッシュIDが未取得のアイテムを先に集めてから検索する
+        # （検索中もカーソルを開いたままにすると、アイドルのクエリが Trino に破棄される）
+        missing_items = []
+        for df in trino.iter_query(
+                f'SELECT "アイテム名", "カテゴリ" FROM "{schema_name}"."{table_name}"'):
+            for item_name, item_category in zip(df["アイテム名"], df["カテゴリ"]):
+                # 既にハッシュIDが取得済みのアイテムはスキップ
+                if item_name not in hashed_names:
+                    missing_items.append((item_name, item_category))
         # 各アイテムのハッシュIDを検索
-        for _, row in df.iterrows():
-            item_name = row["アイテム名"]
-            # 既にハッシュIDが取得済みのアイテムはスキップ
-            if item_name not in df_hash["アイテム名"].values:
-                if item_name == "巨商の妻　かく語りき":
-                    # 何故か検索に失敗するため、ハッシュIDを直接指定
-                    item_category = row["カテゴリ"]
-                    hash_code = "8e0c7280aebc796a7914afa0e007b91125f68f59"
-                else:
-                    item_category = row["カテゴリ"]
-                    hash_code = search_item_hash(session, item_name)
-                exhibition_data.append([item_name, item_category, hash_code])
-                sleep(2)
+        for item_name, item_category in missing_items:
+            if item_name == "巨商の妻　かく語りき":
+                # 何故か検索に失敗するため、ハッシュIDを直接指定
+                hash_code = "8e0c7280aebc796a7914afa0e007b91125f68f59"
+            else:
+                hash_code = search_item_hash(session, item_name)
+            exhibition_data.append([item_name, item_category, hash_code])
+            sleep(2)
         df_hash = pd.DataFrame(exhibition_data,
                                columns=["アイテム名", "カテゴリ", "ハッシュ"])
         trino.create_table(table_name_hash,
@@ -74,6 +79,8 @@ def get_item_hash():
             trino.insert_table(table_name_hash,
                                schema_name,
                                df_hash)
+            # 新しく登録したアイテムをすぐ検索できるよう、対応表のスナップショットを捨てる
+            ITEM_HASH_CATALOG.invalidate()
 
 
 if __name__ == "__main__":
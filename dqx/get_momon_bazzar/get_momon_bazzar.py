@@ -11,9 +11,9 @@ from common.discord_notify import send_to_discord
 
 
 class DQXDiarySearch:
-    def __init__(self):
-        # セッションを再利用
-        self.session = reuse_session()
+    def __init__(self, session=None):
+        # セッションを再利用（ベンチマークではリプレイ用のセッションを渡す）
+        self.session = session or reuse_session()
 
     def search_diary(self, category_num, search_word):
         u"""
@@ -1,16 +1,31 @@
+import contextvars
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-from time import sleep
+from time import perf_counter, sleep
 from prefect import flow, task
 from prefect import get_run_logger
+from prefect.runtime import flow_run
 import requests
 
-from common.DQXPriceSearch import DQXPriceSearch
+from common.DQXPriceSearch import (
+    DQXPriceSearch,
+    ITEM_HASH_CATALOG,
+    concat_prices,
+    price_frame,
+)
+from common.AsyncDQXPriceSearch import AsyncDQXPriceSearch
 from common.trino_api import TrinoAPI
 from common.DatetimeTranslator import DatetimeTranslator
 from common.discord_notify import send_to_discord
 from common.get_cheap_item_list import get_cheap_item_list, create_message_cheap_item
 from common.get_hourly_price import create_message_kishoukaku_hourly_price
 from common.get_price_graph import create_price_graph
+from common.price_graph_cache import PRICE_GRAPH_CACHE
+from common.price_sketch import PriceSketches, save_price_sketches
+from common.storage_tasks import connect_s3_client
 from common.session_cookies import login_dqx_and_save_cookies
 from common.exceptions import SessionExpiredException
 
@@ -18,6 +33,12 @@ trino_host = "trino.trino.svc.cluster.local"
 trino_port = 8080
 trino_user = "tig"
 trino_catalog = "iceberg"
+# 1回のフロー実行の中で Trino への接続を使い回す
+trino = TrinoAPI(
+    host=trino_host, port=trino_port, user=trino_user, catalog=trino_catalog
+)
+# アイテムハッシュの対応表も同じ接続で読む
+ITEM_HASH_CATALOG.trino = trino
 
 
 # 冒険者の広場から価格情報を取得するタスク
@@ -29,10 +50,15 @@ trino_catalog = "iceberg"
     retries=30,
     retry_delay_seconds=1,
 )
-def search_price(item_name, dt=None):
+def search_price(item_name, dt=None, mode="sequential"):
+    """
+    item_name の価格情報と、取得しながら作った価格のスケッチ (PriceSketches) を返す。
+    mode は DQXPriceSearch.search_price の mode（"concurrent" はページを並列に取得する）
+    """
+    sketches = PriceSketches()
     try:
-        dqx = DQXPriceSearch()
-        df_price = dqx.search_price(item_name)
+        dqx = DQXPriceSearch(sketches=sketches)
+        df_price = dqx.search_price(item_name, mode=mode)
     except SessionExpiredException:
         print(
             f"🚨 [Self-Healing] Session expired detected for {item_name}. Refreshing cookies..."
@@ -41,21 +67,42 @@ def search_price(item_name, dt=None):
         login_dqx_and_save_cookies()
         print("✅ New cookies obtained. Retrying the search instantly...")
         # 2. 新しいCookieがSecretに入った状態で、もう一度インスタンスを作り直す
-        dqx = DQXPriceSearch()
-        df_price = dqx.search_price(item_name)
-    # 冒険者の広場から取得したデータには含まれていないカラムを追加
+        dqx = DQXPriceSearch(sketches=sketches)
+        df_price = dqx.search_price(item_name, mode=mode)
+    return format_price(df_price, item_name, dt), sketches
+
+
+# 冒険者の広場から複数アイテムの価格情報をまとめて非同期に取得するタスク
+@task(
+    name="get exhibit prices (async)",
+    log_prints=True,
+    timeout_seconds=120,
+    retries=30,
+    retry_delay_seconds=1,
+)
+def search_prices_async(item_names, dt=None):
+    """{アイテム名: 価格情報} と、取得しながら作った価格のスケッチ (PriceSketches) を返す"""
+    sketches = PriceSketches()
+    try:
+        dqx = AsyncDQXPriceSearch(sketches=sketches)
+        prices = dqx.search_prices(item_names)
+    except SessionExpiredException:
+        print("🚨 [Self-Healing] Session expired detected. Refreshing cookies...")
+        login_dqx_and_save_cookies()
+        print("✅ New cookies obtained. Retrying the search instantly...")
+        dqx = AsyncDQXPriceSearch(sketches=sketches)
+        prices = dqx.search_prices(item_names)
+    prices = {
+        item_name: format_price(df_price, item_name, dt)
+        for item_name, df_price in prices.items()
+    }
+    return prices, sketches
+
+
+def format_price(df_price, item_name, dt=None):
+    """冒険者の広場から取得したデータに、含まれていないカラムを追加して並べ替える"""
     if df_price is None:
-        df_price = pd.DataFrame(
-            columns=[
-                "できのよさ",
-                "個数",
-                "価格",
-                "1つあたりの価格",
-                "出品開始",
-                "出品終了",
-                "出品者",
-            ]
-        )
+        df_price = price_frame()
     df_price["Name"] = item_name
     df_price["Date"] = dt.date() if dt else None
     df_price["Hour"] = dt.hour() if dt else None
@@ -80,11 +127,26 @@ def search_price(item_name, dt=None):
 
 
 @task(name="save table", retries=30, retry_delay_seconds=1)
-def save_to_iceberg(table_name, schema_name, df):
-    """自作のtrino APIを使用して、Icebergにデータを保存するタスク"""
-    trino = TrinoAPI(
-        host=trino_host, port=trino_port, user=trino_user, catalog=trino_catalog
-    )
+def save_to_iceberg(
+    table_name,
+    schema_name,
+    df,
+    insert_mode="values",
+    key_columns=("Name", "observed_at"),
+    run_id=None,
+):
+    """
+    自作のtrino APIを使用して、Icebergにデータを保存するタスク
+    insert_mode:
+    - "values", "prepared", "bulk": TrinoAPI.insert_table の mode で追記する
+    - "merge": key_columns が既にある行は書かずに1回で書き込む（TrinoAPI.merge_table）。
+      リトライしても行が重複せず、先に書いた内容が残る
+    - "replace": key_columns が同じ行を消してから書き込む（TrinoAPI.replace_rows）。
+      リトライしても行が重複せず、後から書いた内容で置き換わる
+    run_id: 指定すると run_id カラムに入れる（どのフロー実行で書いた行かを追えるようにする）
+    """
+    if run_id is not None:
+        df = df.assign(run_id=run_id)
     trino.create_schema(schema_name)
     trino.create_table(
         table_name,
@@ -92,59 +154,131 @@ def save_to_iceberg(table_name, schema_name, df):
         trino.extract_columns(df),
         partitioning=["day(observed_at)"],
     )
-    trino.insert_table(table_name, schema_name, df)
+    if run_id is not None:
+        # run_id を入れる前に作ったテーブルにはカラムが無いので追加する
+        trino.add_column(table_name, schema_name, "run_id", "VARCHAR")
+    if insert_mode == "merge":
+        trino.merge_table(table_name, schema_name, df, list(key_columns))
+    elif insert_mode == "replace":
+        trino.replace_rows(table_name, schema_name, df, list(key_columns))
+    else:
+        trino.insert_table(table_name, schema_name, df, mode=insert_mode)
+
+
+def current_run_id():
+    """Prefect のフロー実行の ID（フローの外で呼んだ場合は新しく作る）"""
+    return str(flow_run.id or uuid.uuid4().hex)
 
 
 @flow(log_prints=True)
 def send_cheap_saibou_price():
     # discordからメッセージを受け取った際にやすい細胞の出品状況を通知する
     focus_item = ["魔因細胞", "閃魔細胞"]
-    # 価格情報を取得するタスクを作成
-    df_all_price = pd.DataFrame()
+    # 価格情報を取得するタスクを作成（アイテムごとの結果を貯めて、最後に1回だけ結合する）
+    item_names = []
+    frames = []
+    # 参考価格のパーセンタイルは、取得しながら作るスケッチから取る
+    sketches = PriceSketches()
     for item_name in focus_item:
-        df_price = search_price(item_name)
-        df_all_price = pd.concat([df_all_price, df_price], ignore_index=True)
-        sleep(0.3)
-        item_name_kakera = item_name + "のかけら"
-        df_price_kakera = search_price(item_name_kakera)
-        df_all_price = pd.concat([df_all_price, df_price_kakera], ignore_index=True)
-        sleep(0.3)
+        for target_name in [item_name, item_name + "のかけら"]:
+            item_names.append(target_name)
+            df_price, item_sketches = search_price(target_name)
+            frames.append(df_price)
+            sketches.merge(item_sketches)
+            sleep(0.3)
+    df_all_price = concat_prices(frames, item_names)
     # やすい出品情報を取得
     for item_name in focus_item:
-        df_cheap = get_cheap_item_list(item_name, df_all_price)
+        df_cheap = get_cheap_item_list(item_name, df_all_price, sketches=sketches)
         message = create_message_cheap_item(item_name, df_cheap)
         send_to_discord(message)
 
 
-@flow(log_prints=True)
-def get_price_hourly(skip_insert: bool = False):
-    focus_item = [
-        "輝晶核",
-        "魔因細胞",
-        "魔因細胞のかけら",
-        "閃輝晶核",
-        "閃魔細胞",
-        "閃魔細胞のかけら",
-    ]
-    # 価格情報を取得する日時を取得
-    dt = DatetimeTranslator()
-    hour = dt.hour()
-    weekday = dt.weekday()
-    # 価格情報を取得するタスクを作成
-    df_all_price = pd.DataFrame()
-    schema_name = "dqx"
-    table_name = "price_hourly"
+class StageTimer:
+    """フローの各ステージの開始・終了時刻（フロー開始からの秒数）を記録する"""
+
+    def __init__(self):
+        self.started_at = perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def run(self, stage, fn, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end = perf_counter()
+            with self._lock:
+                self.stages[stage] = (start - self.started_at, end - self.started_at)
+
+    def report(self):
+        for stage, (start, end) in sorted(self.stages.items(), key=lambda x: x[1]):
+            print(f"{stage:>8}: {start:6.1f}s -> {end:6.1f}s ({end - start:5.1f}s)")
+        print(f"   total: {perf_counter() - self.started_at:6.1f}s")
+
+
+def scrape_prices(focus_item, dt, scrape_mode):
+    """
+    focus_item の価格情報を取得し、{アイテム名: DataFrame} と、
+    取得しながら作ったアイテムごとの価格のスケッチ (PriceSketches) を返す
+    """
+    if scrape_mode == "async":
+        return search_prices_async(focus_item, dt)
+    # "concurrent" はアイテムを1つずつ取り、アイテムの中のページを並列に取得する
+    mode = "concurrent" if scrape_mode == "concurrent" else "sequential"
+    prices = {}
+    sketches = PriceSketches()
     for item_name in focus_item:
-        df_price = search_price(item_name, dt)
-        # 価格情報を保存
-        if len(df_price) > 0 and not skip_insert:
-            save_to_iceberg(table_name, schema_name, df_price)
-        df_all_price = pd.concat([df_all_price, df_price], ignore_index=True)
+        prices[item_name], item_sketches = search_price(item_name, dt, mode=mode)
+        sketches.merge(item_sketches)
         sleep(0.7)
-    # 価格情報からdiscordに送るメッセージを作成
-    message = create_message_kishoukaku_hourly_price(df_all_price)
+    return prices, sketches
+
+
+def save_price_hourly(df_all_price, write_mode):
+    """価格情報を dqx.price_hourly に保存する"""
+    # 全アイテム分を1回で書き込み、Iceberg のスナップショットを1つにする。
+    # Name と observed_at が同じ行が既にあれば書かないので、フローを再実行しても重複しない
+    save_to_iceberg(
+        "price_hourly",
+        "dqx",
+        df_all_price,
+        insert_mode=write_mode,
+        run_id=current_run_id(),
+    )
+    print(
+        f"DDL cache: executed {trino.ddl_cache.executed}, "
+        f"skipped {trino.ddl_cache.skipped}"
+    )
+
+
+def send_hourly_price_message(df_all_price, sketches=None):
+    # 価格情報からdiscordに送るメッセージを作成（P5 は取得中に作ったスケッチから取る）
+    message = create_message_kishoukaku_hourly_price(df_all_price, sketches=sketches)
     # 輝晶核の価格を送信
     send_to_discord(message)
+
+
+@task(name="save price sketches", retries=3, retry_delay_seconds=5)
+def put_hourly_sketches(sketches, dt):
+    """1時間分の価格のスケッチを MinIO に置く（日・週のパーセンタイルは load_price_sketches でまとめる）"""
+    client, bucket = connect_s3_client()
+    save_price_sketches(client, bucket, dt.datetime(align_to="hour"), sketches)
+
+
+def save_hourly_sketches(sketches, dt):
+    """
+    put_hourly_sketches を呼ぶ。スケッチの保存は付け足しなので、リトライしても失敗したら
+    ログに残して先に進む（価格の保存・メッセージ・グラフ・mart の更新は止めない）
+    """
+    try:
+        put_hourly_sketches(sketches, dt)
+    except Exception as e:
+        print(f"⚠️ 価格のスケッチを保存できませんでした: {e}")
+
+
+def send_price_graphs(dt, hour, weekday):
+    """21時に価格推移のグラフを送信する（price_hourly を読むので、保存した後に呼ぶ）"""
     focus_item_matrix = [
         [
             "輝晶核",
@@ -179,7 +313,10 @@ def get_price_hourly(skip_insert: bool = False):
                 graph_title=f"{start_datetime} ~ {end_datetime} {kaku_name}の価格推移",
             )
             send_to_discord("", temp_file_name)
-    # martをアップデート
+
+
+def trigger_price_mart():
+    """martをアップデートする flow を起動する（price_hourly を読むので、保存した後に呼ぶ）"""
     # Prefect API のエンドポイント
     # PREFECT_API_URL = "http://prefect.mynet/api"
     PREFECT_API_URL = "http://prefect-server.prefect.svc.cluster.local:4200/api"
@@ -196,6 +333,86 @@ def get_price_hourly(skip_insert: bool = False):
     #     )
 
 
+@flow(log_prints=True)
+def get_price_hourly(
+    skip_insert: bool = False,
+    scrape_mode: str = "sequential",
+    write_mode: str = "merge",
+    pipeline: bool = False,
+    save_sketches: bool = False,
+):
+    """
+    scrape_mode:
+    - "async": 全アイテムの全ページを1つのイベントループで並行に取得する
+      （合成したページでしか確かめていないので、本番の広場で確かめるまでは指定した時だけ使う）
+    - "concurrent": アイテムを1つずつ取り、アイテムの中のページを並列に取得する
+    - "sequential": アイテムを1つずつ、間隔を空けて取得する（従来通り）
+    write_mode: save_to_iceberg の insert_mode
+    - "merge": 同じ時刻のアイテムが既に保存されていれば書かない（再実行しても先の結果が残る）
+    - "replace": 同じ時刻のアイテムを消してから書く（再実行すると取り直した結果で置き換わる）
+    pipeline: True なら、価格を取得した後の処理を並行に進める
+    - 保存と discord へのメッセージの送信を同時に行う（保存に失敗してもメッセージは送られる）
+    - 保存が終わったら、21時のグラフの送信と mart の更新を同時に行う
+    False（既定）なら従来通り1つずつ順に行う。どちらもステージごとの時間を最後に出す
+    save_sketches: True なら、1時間分の価格のスケッチを MinIO に置く（保存に失敗してもフローは続ける）。
+    Prefect の Secret "minio-dqx-access-key" / "minio-dqx-secret-key" が要る
+    （エンドポイントとバケットは Variable "minio-endpoint" / "datalake-bronze-bucket"）
+    """
+    focus_item = [
+        "輝晶核",
+        "魔因細胞",
+        "魔因細胞のかけら",
+        "閃輝晶核",
+        "閃魔細胞",
+        "閃魔細胞のかけら",
+    ]
+    timer = StageTimer()
+    # 価格情報を取得する日時を取得
+    dt = DatetimeTranslator()
+    hour = dt.hour()
+    weekday = dt.weekday()
+    # 価格情報を取得するタスクを作成（取得しながらアイテムごとの価格のスケッチも作る）
+    prices, sketches = timer.run("scrape", scrape_prices, focus_item, dt, scrape_mode)
+    print(f"Item hash catalog: {ITEM_HASH_CATALOG.stats()}")
+    # アイテムごとに結合し直さず、全アイテム分を1回で結合する
+    df_all_price = timer.run(
+        "concat",
+        concat_prices,
+        (prices[item_name] for item_name in focus_item),
+        focus_item,
+    )
+    save = len(df_all_price) > 0 and not skip_insert
+    save_sketches = save and save_sketches
+    if not pipeline:
+        if save:
+            timer.run("save", save_price_hourly, df_all_price, write_mode)
+        timer.run("message", send_hourly_price_message, df_all_price, sketches)
+        if save_sketches:
+            timer.run("sketches", save_hourly_sketches, sketches, dt)
+        timer.run("graphs", send_price_graphs, dt, hour, weekday)
+        timer.run("mart", trigger_price_mart)
+        timer.report()
+        return
+    with ThreadPoolExecutor(max_workers=3) as executor:
+
+        def submit(stage, fn, *args):
+            # Prefect のフロー実行のコンテキストを引き継いで、タスクをこのフローに紐づける
+            context = contextvars.copy_context()
+            return executor.submit(context.run, timer.run, stage, fn, *args)
+
+        futures = [submit("message", send_hourly_price_message, df_all_price, sketches)]
+        if save_sketches:
+            futures.append(submit("sketches", save_hourly_sketches, sketches, dt))
+        if save:
+            # グラフと mart は price_hourly を読むので、保存が終わるのを待つ
+            submit("save", save_price_hourly, df_all_price, write_mode).result()
+        futures.append(submit("graphs", send_price_graphs, dt, hour, weekday))
+        futures.append(submit("mart", trigger_price_mart))
+        for future in futures:
+            future.result()
+    timer.report()
+
+
 @flow(log_prints=True)
 def send_price_image(period: str = "1w"):
     """
@@ -245,6 +462,7 @@ def send_price_image(period: str = "1w"):
             send_to_discord("", temp_file_name)
         except Exception as e:
             logger.error(f"✨ send_price_image_to_discord で例外発生: {e}")
+    logger.info(f"グラフのキャッシュ: {PRICE_GRAPH_CACHE.stats()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+-- models/marts/mrt_price_hourly_rollup.sql
+-- AnalyzePrice のグラフ用の細いロールアップ。1時間・アイテムごとの最安値と P5 を、
+-- まとめ売りを除いた（個数 3 以下の）ものと合わせて持つ
+{{ config(
+  materialized='incremental',
+  unique_key=['item_id','ts_hour'],
+  incremental_strategy='merge'
+) }}
+
+with s as (
+  select
+    cast(item_name as varchar)      as item_id,
+    unit_price,
+    quantity,
+    date_trunc('hour', observed_at) as ts_hour
+  from {{ ref('stg_price_hourly') }}
+  {% if is_incremental() %}
+  where observed_at >= (
+    select date_add('hour', -50, coalesce(max(ts_hour), current_timestamp))
+    from {{ this }}
+  )
+  {% endif %}
+)
+select
+  item_id,
+  ts_hour,
+  count(*)                                                          as ticks,
+  min(unit_price)                                                   as min_price,
+  approx_percentile(unit_price, 0.05)                               as p5_price,
+  min(unit_price) filter (where quantity <= 3)                      as min_price_q3,
+  approx_percentile(unit_price, 0.05) filter (where quantity <= 3)  as p5_price_q3
+from s
+group by item_id, ts_hour
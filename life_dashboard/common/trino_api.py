@@ -1,74 +1,374 @@
+"""
+dqx と life_dashboard で共通の Trino クライアント。
+Docker のビルドコンテキストがプロジェクトごとに分かれているので、
+dqx/common/trino_api.py と life_dashboard/common/trino_api.py に同じ内容で置いている。
+変更したら dqx 側を正として `python -m benchmark.bench_trino_client --sync` で揃える。
+2つがずれていると CI (.github/workflows/trino-api-sync.yml) が失敗する。
+"""
+
 import contextlib
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import uuid
+import numpy as np
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
 from trino.dbapi import connect
 import datetime
 
 
+PANDAS_TO_TRINO_TYPE = {
+    "int64": "INTEGER",
+    "int32": "INTEGER",
+    "float64": "DOUBLE",
+    "object": "VARCHAR",
+    "datetime64[ns]": "TIMESTAMP",
+}
+
+# fetch="arrow" で Trino の型から Arrow の型を決めるための対応表（pyarrow の型エイリアス）
+# （ここに無い型は pyarrow に推論させる）
+# pyarrow は life_dashboard には入っていないので、使う時にだけ読み込む
+TRINO_TO_ARROW_TYPE = {
+    "boolean": "bool",
+    "tinyint": "int8",
+    "smallint": "int16",
+    "integer": "int32",
+    "bigint": "int64",
+    "real": "float32",
+    "double": "float64",
+    "varchar": "string",
+    "char": "string",
+    "date": "date32",
+    "timestamp": "timestamp[us]",
+}
+
+# bulk モードで Parquet を置く場所（MinIO のバケット直下のプレフィックス）
+STAGING_PREFIX = "_trino_staging"
+
+# 書き込みがこのエラーで失敗したら、テーブルが外で DROP / 作り直しされたとみなして
+# DDL キャッシュから消す（次のリトライで CREATE / ADD COLUMN をやり直す）
+DDL_INVALIDATING_ERRORS = {
+    "SCHEMA_NOT_FOUND",
+    "TABLE_NOT_FOUND",
+    "COLUMN_NOT_FOUND",
+    "TYPE_MISMATCH",
+    "MISMATCHED_COLUMN_ALIASES",
+}
+
+# merge_table で VALUES に埋め込める SQL の長さ（Trino の query.max-length の既定値 1,000,000 より少し短く）
+MAX_VALUES_QUERY_LENGTH = 900_000
+
+
+class DDLCache:
+    """
+    作成済みのスキーマ / テーブルを覚えておき、同じ CREATE を何度も投げないためのキャッシュ。
+    テーブルはカラム定義などのシグネチャ込みで覚えるので、定義が変われば DDL を再実行する。
+    path を指定すると JSON ファイルに保存し、プロセスをまたいで使い回す。
+    insert_table / merge_table / replace_rows がテーブルやカラムが無いエラー
+    (DDL_INVALIDATING_ERRORS) で失敗した場合は、そのテーブルのキーを消す。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._keys = set()
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.skipped = 0
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._keys = {tuple(key) for key in json.load(f)}
+
+    def _save(self):
+        if self.path:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(sorted(self._keys), f, ensure_ascii=False)
+
+    def check(self, key):
+        """既に実行済みなら True を返し、スキップした回数を数える"""
+        with self._lock:
+            if key in self._keys:
+                self.skipped += 1
+                return True
+            return False
+
+    def add(self, key):
+        with self._lock:
+            self.executed += 1
+            self._keys.add(key)
+            self._save()
+
+    def invalidate(self, catalog, schema_name, table_name=None):
+        """
+        外でテーブルを DROP した時などに、該当するキーをキャッシュから消す。
+        table_name を指定しなければスキーマとその中のテーブル / カラムを、
+        指定すればそのテーブルとカラムを消す
+        """
+
+        def matches(key):
+            if key[1:3] != (catalog, schema_name):
+                return False
+            return table_name is None or (key[0] != "schema" and key[3] == table_name)
+
+        with self._lock:
+            self._keys = {key for key in self._keys if not matches(key)}
+            self._save()
+
+
+# プロセス内で共有する DDL キャッシュ
+DDL_CACHE = DDLCache()
+
+
 class TrinoAPI:
-    def __init__(self, host, port, user, catalog):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        catalog,
+        s3_client=None,
+        bucket=None,
+        pool_size=4,
+        ddl_cache=DDL_CACHE,
+    ):
         self.host = host
         self.port = port
         self.user = user
         self.catalog = catalog
+        # bulk モードで使う MinIO のクライアント（未指定なら必要になった時に接続）
+        self.s3_client = s3_client
+        self.bucket = bucket
+        # 接続プール。1つの TrinoAPI の中で接続と HTTP セッション (keep-alive) を使い回す
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._http_session = None
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.connections_reused = 0
+        # 作成済みのスキーマ / テーブルのキャッシュ（None なら毎回 DDL を実行する）
+        self.ddl_cache = ddl_cache
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_http_session(self):
+        """全ての接続で共有する requests.Session を返す"""
+        with self._lock:
+            if self._http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._http_session = session
+            return self._http_session
 
     def connect(self):
-        """Trinoへの接続オブジェクトを返す（HTTPセッションの準備）"""
+        """共有の HTTP セッションを使って、新しい接続を作る"""
         conn = connect(
             host=self.host,
             port=self.port,
             user=self.user,
             catalog=self.catalog,
+            http_session=self._get_http_session(),
         )
+        with self._lock:
+            self.connections_opened += 1
         return conn
 
-    def execute_query(self, query):
-        """汎用的なSELECTクエリを実行し、DataFrameで返す"""
-        with contextlib.closing(self.connect()) as conn:
+    @contextlib.contextmanager
+    def connection(self):
+        """プールから接続を借りて、使い終わったらプールに戻す"""
+        try:
+            conn = self._pool.get_nowait()
+            with self._lock:
+                self.connections_reused += 1
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            # 溢れた接続は捨てるだけ（close すると共有のセッションまで閉じてしまう）
+            if self._pool.qsize() < self.pool_size:
+                self._pool.put(conn)
+
+    @contextlib.contextmanager
+    def _write_connection(self, table_name, schema_name):
+        """
+        書き込み用に接続を借りる。テーブルやカラムが無いエラーで失敗したら、
+        DDL キャッシュからそのテーブル（スキーマが無ければスキーマごと）を消してから例外を上げ直す
+        """
+        try:
+            with self.connection() as conn:
+                yield conn
+        except Exception as e:
+            error_name = getattr(e, "error_name", None)
+            if self.ddl_cache is not None and error_name in DDL_INVALIDATING_ERRORS:
+                print(
+                    f"-- invalidate ddl cache: {schema_name}.{table_name} ({error_name}) ---"
+                )
+                if error_name == "SCHEMA_NOT_FOUND":
+                    self.ddl_cache.invalidate(self.catalog, schema_name)
+                else:
+                    self.ddl_cache.invalidate(self.catalog, schema_name, table_name)
+            raise
+
+    def close(self):
+        """プールの接続と共有の HTTP セッションを閉じる"""
+        while True:
+            try:
+                self._pool.get_nowait()
+            except queue.Empty:
+                break
+        with self._lock:
+            if self._http_session is not None:
+                self._http_session.close()
+                self._http_session = None
+        print(
+            f"-- close trino connections (opened: {self.connections_opened}, "
+            f"reused: {self.connections_reused}) ---"
+        )
+
+    def _arrow_type(self, type_code):
+        """cursor.description の型名 (例: "varchar(20)", "timestamp(6)") を Arrow の型にする"""
+        import pyarrow as pa
+
+        if "with time zone" in type_code:
+            return None
+        alias = TRINO_TO_ARROW_TYPE.get(type_code.split("(")[0])
+        return pa.type_for_alias(alias) if alias else None
+
+    def _fetch_arrow(self, cursor, batch_size):
+        """
+        結果を batch_size 行ずつ取り出して列ごとの Arrow 配列にし、最後に1つの Table にまとめる。
+        全行をタプルのリストとして抱えないので、大きな結果でもメモリを抑えられる。
+        """
+        import pyarrow as pa
+
+        names = [desc[0] for desc in cursor.description]
+        types = [self._arrow_type(desc[1]) for desc in cursor.description]
+        batches = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            arrays = [
+                pa.array(values, type=arrow_type)
+                for values, arrow_type in zip(zip(*rows), types)
+            ]
+            batches.append(pa.RecordBatch.from_arrays(arrays, names=names))
+        if not batches:
+            schema = pa.schema(
+                [
+                    (name, arrow_type or pa.null())
+                    for name, arrow_type in zip(names, types)
+                ]
+            )
+            return schema.empty_table()
+        return pa.Table.from_batches(batches)
+
+    def execute_query_arrow(self, query, batch_size=10000):
+        """SELECT クエリを実行し、結果を pyarrow.Table で返す"""
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query)
+            return self._fetch_arrow(cursor, batch_size)
+
+    def execute_query(self, query, fetch="rows", batch_size=10000):
+        """
+        fetch:
+        - "rows": fetchall で全行をタプルで受け取ってから DataFrame にする（従来通り）
+        - "arrow": batch_size 行ずつ列形式に変換してから DataFrame にする
+        """
+        if fetch == "arrow":
+            return self.execute_query_arrow(query, batch_size).to_pandas()
+        if fetch != "rows":
+            raise ValueError(f"Unknown fetch mode: {fetch}")
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            # 結果とカラム名を取得
             rows = cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
-            df = pd.DataFrame(rows, columns=columns)
-            return df
+        # pandas DataFrame に変換
+        df = pd.DataFrame(rows, columns=columns)
+        return df
 
     def execute_action(self, query):
         """INSERTやCREATEなど、結果を返さないクエリを実行する"""
-        with contextlib.closing(self.connect()) as conn:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query)
+
+    def iter_query(self, query, batch_size=10000):
+        """
+        SELECT クエリの結果を batch_size 行ずつの DataFrame で順に返すジェネレータ。
+        全行を一度にメモリに載せずに大きなテーブルを処理できる。
+        """
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query)
+            columns = [desc[0] for desc in cursor.description]
+            finished = False
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        finished = True
+                        break
+                    yield pd.DataFrame(rows, columns=columns)
+            finally:
+                # 途中で打ち切られた場合は Trino 側のクエリも止める
+                if not finished:
+                    cursor.cancel()
+
+    def iter_load(self, table_name, schema_name, batch_size=10000):
+        """テーブル全体を batch_size 行ずつの DataFrame で順に返す"""
+        print(f"-- load table data {schema_name}.{table_name} (batches) ---")
+        sql_load = f'SELECT * FROM "{schema_name}"."{table_name}"'
+        return self.iter_query(sql_load, batch_size)
 
     def table_exists(self, table_name, schema_name):
-        with contextlib.closing(self.connect()) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(f'SHOW TABLES FROM "{schema_name}"')
             tables = cursor.fetchall()
-            tables = [table[0] for table in tables]
-            return table_name in tables
+        tables = [table[0] for table in tables]
+        return table_name in tables
 
-    def load(self, table_name, schema_name):
+    def load(self, table_name, schema_name, fetch="rows"):
         print(f"-- load table data {schema_name}.{table_name} ---")
         sql_load = f'SELECT * FROM "{schema_name}"."{table_name}"'
-        return self.execute_query(sql_load)
+        return self.execute_query(sql_load, fetch=fetch)
 
     def extract_columns(self, df):
-        pandas_to_trino_type = {
-            "int64": "INTEGER",
-            "float64": "DOUBLE",
-            "object": "VARCHAR",
-            "datetime64[ns]": "TIMESTAMP",
-        }
         columns = []
         for col, dtype in df.dtypes.items():
-            trino_type = pandas_to_trino_type.get(str(dtype), "VARCHAR")
+            trino_type = PANDAS_TO_TRINO_TYPE.get(str(dtype), "VARCHAR")
             columns.append(f'"{col}" {trino_type}')
         table_columns = ",\n    ".join(columns)
         return table_columns
 
+    def _execute_ddl(self, key, sql):
+        """DDL キャッシュに無い場合だけ DDL を実行する"""
+        if self.ddl_cache is not None and self.ddl_cache.check(key):
+            print(f"-- skip ddl (cached): {'.'.join(key[1:4])} ---")
+            return
+        self.execute_action(sql)
+        if self.ddl_cache is not None:
+            self.ddl_cache.add(key)
+
     def create_schema(self, schema_name):
         print(f"-- create schema {schema_name} ---")
-        sql_create_schema = f"""CREATE SCHEMA IF NOT EXISTS "{schema_name}"
+        sql_create_schema = f"""CREATE SCHEMA IF NOT EXISTS \"{schema_name}\"
         with (location = 's3a://iceberg/warehouse/{schema_name}')"""
-        self.execute_action(sql_create_schema)
+        self._execute_ddl(("schema", self.catalog, schema_name), sql_create_schema)
 
     def create_table(
         self, table_name, schema_name, table_columns, partitioning=None, sorted_by=None
@@ -90,45 +390,383 @@ class TrinoAPI:
         )
         """
         print(f"Generated query:\n{create_table_query}")
-        self.execute_action(create_table_query)
+        # カラム定義やパーティションが変わった場合はキャッシュに当たらないようにする
+        signature = hashlib.sha1(create_table_query.encode("utf-8")).hexdigest()
+        key = ("table", self.catalog, schema_name, table_name, signature)
+        self._execute_ddl(key, create_table_query)
+
+    def add_column(self, table_name, schema_name, column_name, trino_type):
+        """既存のテーブルにカラムを追加する（既にあれば何もしない）"""
+        print(f"-- add column {schema_name}.{table_name}.{column_name} ---")
+        sql = f"""ALTER TABLE "{schema_name}"."{table_name}"
+        ADD COLUMN IF NOT EXISTS "{column_name}" {trino_type}"""
+        key = ("column", self.catalog, schema_name, table_name, column_name, trino_type)
+        self._execute_ddl(key, sql)
 
     def _to_trino_literal(self, v):
+        # NULL 判定（pandas の NA, None など全部ここで）
         if v is None or (isinstance(v, float) and pd.isna(v)) or pd.isna(v):
             return "NULL"
+
+        # 1) Pandas Timestamp / datetime.datetime → TIMESTAMP リテラル
         if isinstance(v, (pd.Timestamp, datetime.datetime)):
             ts = v
+            # タイムゾーン付きなら JST に合わせて tz を剥がす
+            # （「JSTのローカルタイムを TIMESTAMP（tzなし）で保存」方針）
             if getattr(ts, "tzinfo", None) is not None:
                 try:
+                    # Pandas Timestamp の場合
                     ts = ts.tz_convert("Asia/Tokyo").tz_localize(None)
                 except Exception:
+                    # 素の datetime の場合
                     JST = datetime.timezone(datetime.timedelta(hours=9))
                     ts = ts.astimezone(JST).replace(tzinfo=None)
+            # マイクロ秒まで（timestamp(6)）を出す。ゼロでも問題なし
             return f"TIMESTAMP '{ts.strftime('%Y-%m-%d %H:%M:%S.%f')}'"
+        # 2) 素の date（※ datetime のサブクラスでない場合のみ）
         if isinstance(v, datetime.date) and not isinstance(v, datetime.datetime):
             return f"DATE '{v.isoformat()}'"
+        # 3) 文字列はクオートをエスケープ
         if isinstance(v, str):
             return "'" + v.replace("'", "''") + "'"
+        # 4) bool
         if isinstance(v, bool):
             return "TRUE" if v else "FALSE"
+        # 5) それ以外（数値など）
         return str(v)
 
-    def insert_table(self, table_name, schema_name, df, replace=False, chunk_size=1000):
+    def _to_trino_literal_column(self, s):
+        """
+        Series 全体をまとめて SQL リテラルの配列に変換する。
+        dtype から変換方法を列ごとに1回だけ決めるので、_to_trino_literal を
+        1セルずつ呼ぶより速い。出力は各セルに _to_trino_literal を適用した結果と同じ。
+        """
+        null_mask = s.isna().to_numpy()
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # カテゴリ型は値の列に戻してから、値の型に合わせて変換する
+            s = s.astype(object)
+        if pd.api.types.is_bool_dtype(s):
+            flags = s.fillna(False).to_numpy(dtype=bool)
+            rendered = np.where(flags, "TRUE", "FALSE").astype(object)
+        elif pd.api.types.is_integer_dtype(s):
+            rendered = s.astype(str).to_numpy(dtype=object)
+        elif pd.api.types.is_float_dtype(s):
+            # float32 も Python の float と同じ表記になるよう float64 にしてから文字列化
+            rendered = s.to_numpy(dtype="float64", na_value=np.nan).astype(str)
+            rendered = rendered.astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            # tz 付きは JST のローカルタイムにして tz を剥がす（_to_trino_literal と同じ方針）
+            if s.dt.tz is not None:
+                s = s.dt.tz_convert("Asia/Tokyo").dt.tz_localize(None)
+            ts = s.dt.strftime("%Y-%m-%d %H:%M:%S.%f").fillna("").to_numpy(dtype=object)
+            rendered = "TIMESTAMP '" + ts + "'"
+        elif pd.api.types.infer_dtype(s, skipna=True) == "string":
+            quoted = s.str.replace("'", "''", regex=False).fillna("")
+            quoted = quoted.to_numpy(dtype=object)
+            rendered = "'" + quoted + "'"
+        else:
+            # date や型が混在した列は1セルずつ変換する
+            rendered = s.map(self._to_trino_literal).to_numpy(dtype=object)
+        rendered[null_mask] = "NULL"
+        return rendered
+
+    def _to_values_rows(self, df):
+        """DataFrame の各行を VALUES 句に並べる "(...)" 形式の文字列のリストにする"""
+        columns = [
+            self._to_trino_literal_column(df.iloc[:, i]) for i in range(df.shape[1])
+        ]
+        return ["(" + ", ".join(row) + ")" for row in zip(*columns)]
+
+    def _to_prepared_params(self, df):
+        """
+        DataFrame を prepared statement に渡す Python ネイティブの値の行リストにする。
+        NaN / NaT は None (NULL) にし、tz 付きの時刻は JST のローカルタイムにする。
+        """
+        columns = []
+        for i in range(df.shape[1]):
+            s = df.iloc[:, i]
+            if pd.api.types.is_datetime64_any_dtype(s) and s.dt.tz is not None:
+                s = s.dt.tz_convert("Asia/Tokyo").dt.tz_localize(None)
+            values = s.astype(object).where(s.notna(), None)
+            columns.append(values.tolist())
+        return list(zip(*columns))
+
+    def _insert_table_prepared(self, cursor, table_name, schema_name, df, chunk_size):
+        """
+        INSERT ... VALUES (?, ?, ...) をパラメータ付きで実行する。
+        trino の executemany は1行ごとにクエリを投げるので、chunk_size 行分の
+        プレースホルダを並べた1つの文にまとめて execute する。
+        trino-python-client はサーバ側でバインドせず、各値をクライアントで SQL リテラルにして
+        EXECUTE IMMEDIATE '...' USING ... に埋め込むので、リテラルの組み立ては "values" と同じく残る
+        （benchmark.bench_trino_insert では "values" より遅く、送る SQL も大きい）。
+        """
+        columns = ", ".join(f'"{col}"' for col in df.columns)
+        placeholder = "(" + ", ".join(["?"] * len(df.columns)) + ")"
+        rows = self._to_prepared_params(df)
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i : i + chunk_size]
+            insert_query = f"""
+            INSERT INTO "{schema_name}"."{table_name}" ({columns})
+            VALUES {", ".join([placeholder] * len(chunk))}
+            """
+            cursor.execute(insert_query, [v for row in chunk for v in row])
+            cursor.fetchall()
+            print(f"Inserted chunk {i} to {i + len(chunk)}")
+
+    def _to_staging_column(self, s):
+        """
+        Series を Parquet に書ける Arrow の配列と、ステージング表の型に変換する。
+        型は extract_columns で作ったテーブルにそのまま INSERT ... SELECT できるよう揃える。
+        """
+        import pyarrow as pa
+
+        if pd.api.types.is_bool_dtype(s):
+            return pa.array(s, type=pa.bool_(), from_pandas=True), "BOOLEAN"
+        if pd.api.types.is_integer_dtype(s):
+            try:
+                return pa.array(s, type=pa.int32(), from_pandas=True), "INTEGER"
+            except pa.ArrowInvalid:
+                # INTEGER に収まらない値がある場合だけ BIGINT にする
+                return pa.array(s, type=pa.int64(), from_pandas=True), "BIGINT"
+        if pd.api.types.is_float_dtype(s):
+            return pa.array(s, type=pa.float64(), from_pandas=True), "DOUBLE"
+        if pd.api.types.is_datetime64_any_dtype(s):
+            # VALUES モードと同じく、tz 付きは JST のローカルタイムにして tz を剥がす
+            if s.dt.tz is not None:
+                s = s.dt.tz_convert("Asia/Tokyo").dt.tz_localize(None)
+            # Hive の TIMESTAMP はミリ秒精度
+            array = pa.array(s, type=pa.timestamp("ms"), from_pandas=True, safe=False)
+            return array, "TIMESTAMP"
+        values = s.astype(str).to_numpy(dtype=object)
+        return pa.array(values, type=pa.string(), mask=s.isna().to_numpy()), "VARCHAR"
+
+    def _to_parquet(self, df):
+        """DataFrame を Parquet のバイト列と、ステージング表のカラム定義に変換する"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrays = []
+        columns = []
+        for col in df.columns:
+            array, trino_type = self._to_staging_column(df[col])
+            arrays.append(array)
+            columns.append(f'"{col}" {trino_type}')
+        table = pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression="snappy")
+        return buffer.getvalue(), ",\n    ".join(columns)
+
+    def _put_staging_object(self, key, body):
+        """ステージング用の Parquet を置く（dqx は minio、life_dashboard は boto3 のクライアント）"""
+        if hasattr(self.s3_client, "remove_object"):
+            self.s3_client.put_object(self.bucket, key, io.BytesIO(body), len(body))
+        else:
+            self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    def _delete_staging_object(self, key):
+        if hasattr(self.s3_client, "remove_object"):
+            self.s3_client.remove_object(self.bucket, key)
+        else:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+
+    @contextlib.contextmanager
+    def _staging_table(self, cursor, table_name, schema_name, df, staging_schema):
+        """
+        DataFrame を Parquet にして MinIO に置き、Hive の外部テーブルとして読めるようにする。
+        外部テーブルの名前を返し、抜ける時にテーブルとファイルを消す。
+        """
+        if self.s3_client is None:
+            from common.storage_tasks import connect_s3_client
+
+            self.s3_client, self.bucket = connect_s3_client()
+        run_id = uuid.uuid4().hex
+        prefix = f"{STAGING_PREFIX}/{schema_name}/{table_name}/{run_id}"
+        object_key = f"{prefix}/data.parquet"
+        staging_table = f'hive."{staging_schema}"."tmp_{table_name}_{run_id}"'
+        body, staging_columns = self._to_parquet(df)
+        self._put_staging_object(object_key, body)
+        try:
+            cursor.execute(
+                f"""CREATE SCHEMA IF NOT EXISTS hive."{staging_schema}"
+                with (location = 's3a://{self.bucket}/{STAGING_PREFIX}')"""
+            )
+            cursor.fetchall()
+            cursor.execute(
+                f"""CREATE TABLE {staging_table} (
+                {staging_columns}
+                )
+                WITH (
+                format = 'PARQUET',
+                external_location = 's3a://{self.bucket}/{prefix}'
+                )"""
+            )
+            cursor.fetchall()
+            yield staging_table
+        finally:
+            # 外部テーブルなので DROP してもファイルは残る。ファイルも消しておく
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            cursor.fetchall()
+            self._delete_staging_object(object_key)
+
+    def _insert_table_bulk(self, cursor, table_name, schema_name, df, staging_schema):
+        """
+        DataFrame を Parquet にして MinIO に置き、Hive の外部テーブル経由で
+        INSERT INTO ... SELECT する。行ごとに SQL リテラルを組み立てないので大量データ向け。
+        """
+        columns = ", ".join(f'"{col}"' for col in df.columns)
+        with self._staging_table(
+            cursor, table_name, schema_name, df, staging_schema
+        ) as staging_table:
+            cursor.execute(
+                f"""INSERT INTO "{schema_name}"."{table_name}" ({columns})
+                SELECT {columns} FROM {staging_table}"""
+            )
+            cursor.fetchall()
+            print(f"Inserted {len(df)} rows via {staging_table}")
+
+    def merge_table(
+        self,
+        table_name,
+        schema_name,
+        df,
+        key_columns,
+        source="values",
+        staging_schema="staging",
+    ):
+        """
+        df を1つの文でテーブルに書き込む（Iceberg のスナップショットは1つだけ増える）。
+        MERGE ... WHEN NOT MATCHED THEN INSERT と同じく、key_columns の組み合わせが
+        既にテーブルにある行は書き込まないので、同じ df を何度書き込んでも行は重複しない
+        （リトライや再実行をしても安全）。key_columns に NULL を含む行は毎回書き込まれる。
+        Trino の MERGE は1つの行に複数の行が一致するとエラーになり、1つのキーに
+        複数の行がある price_hourly には使えないので、INSERT ... SELECT ... WHERE NOT EXISTS にする。
+        source:
+        - "values": df の全行を SQL リテラルにして (VALUES ...) として埋め込む
+          （SQL が MAX_VALUES_QUERY_LENGTH を超える場合は "bulk" にする）
+        - "bulk": insert_table の "bulk" と同じく Parquet をステージングして読む
+        """
+        if source not in ("values", "bulk"):
+            raise ValueError(f"Unknown merge source: {source}")
+        print(f"-- merge into {schema_name}.{table_name} on {key_columns} ---")
+        if len(df) == 0:
+            return
+        columns = ", ".join(f'"{col}"' for col in df.columns)
+        source_columns = ", ".join(f's."{col}"' for col in df.columns)
+        conditions = [f't."{col}" = s."{col}"' for col in key_columns]
+        # キーの値で絞り込み、パーティション（day(observed_at) など）を読み飛ばせるようにする
+        for col in key_columns:
+            keys = self._to_trino_literal_column(df[col].drop_duplicates())
+            keys = [key for key in keys if key != "NULL"]
+            if keys:
+                conditions.append(f't."{col}" IN ({", ".join(keys)})')
+        where_clause = "\n                AND ".join(conditions)
+
+        def merge_query(using):
+            return f"""
+            INSERT INTO "{schema_name}"."{table_name}" ({columns})
+            SELECT {source_columns} FROM {using}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM "{schema_name}"."{table_name}" AS t
+                WHERE {where_clause}
+            )
+            """
+
+        if source == "values":
+            values = ", ".join(self._to_values_rows(df))
+            if len(values) > MAX_VALUES_QUERY_LENGTH:
+                print(f"VALUES is too long ({len(values)} chars), use bulk instead")
+                source = "bulk"
+
+        with self._write_connection(table_name, schema_name) as conn:
+            cursor = conn.cursor()
+            if source == "bulk":
+                with self._staging_table(
+                    cursor, table_name, schema_name, df, staging_schema
+                ) as staging_table:
+                    cursor.execute(merge_query(f"{staging_table} AS s"))
+                    cursor.fetchall()
+            else:
+                cursor.execute(merge_query(f"(VALUES {values}) AS s ({columns})"))
+                cursor.fetchall()
+        print(f"Merged {len(df)} rows into {schema_name}.{table_name}")
+
+    def _key_conditions(self, df, key_columns):
+        """
+        df の key_columns の値の組み合わせごとに、一致する行を選ぶ条件を作る
+        （merge_table と同じく、NULL を含む組み合わせはどの行とも一致しないとみなす）
+        """
+        keys = df[key_columns].dropna().drop_duplicates()
+        literals = [self._to_trino_literal_column(keys[col]) for col in key_columns]
+        return [
+            "("
+            + " AND ".join(f'"{col}" = {value}' for col, value in zip(key_columns, row))
+            + ")"
+            for row in zip(*literals)
+        ]
+
+    def replace_rows(self, table_name, schema_name, df, key_columns, mode="values"):
+        """
+        key_columns の値の組み合わせが df と同じ行をテーブルから消してから、df を書き込む
+        （insert_table の mode で書き込む）。途中で失敗してもやり直せば同じ結果になる。
+        merge_table と違い、後から書いた df で置き換わる。
+        """
+        print(f"-- replace rows in {schema_name}.{table_name} on {key_columns} ---")
+        if len(df) == 0:
+            return
+        conditions = self._key_conditions(df, key_columns)
+        if conditions:
+            with self._write_connection(table_name, schema_name) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f'DELETE FROM "{schema_name}"."{table_name}"\n'
+                    f"WHERE {' OR '.join(conditions)}"
+                )
+                # 消し終わってから書き込む
+                cursor.fetchall()
+        self.insert_table(table_name, schema_name, df, mode=mode)
+
+    def insert_table(
+        self,
+        table_name,
+        schema_name,
+        df,
+        replace=False,
+        mode="values",
+        staging_schema="staging",
+        chunk_size=1000,
+    ):
+        """
+        mode:
+        - "values": chunk_size 行ずつ、各行を SQL リテラルにして INSERT ... VALUES で投入する
+        - "prepared": chunk_size 行ずつ、パラメータ付きの INSERT ... VALUES (?, ...) で投入する
+          （クライアントがリテラルに展開するので速くはならない。_insert_table_prepared を参照）
+        - "bulk": Parquet を MinIO にステージングして INSERT ... SELECT で投入する
+        """
+        if mode not in ("values", "prepared", "bulk"):
+            raise ValueError(f"Unknown insert mode: {mode}")
         print(f"-- insert to {schema_name}.{table_name} ---")
         columns = ", ".join(f'"{col}"' for col in df.columns)
 
-        # 1回のINSERT処理全体を1つのコネクションでカバーする
-        with contextlib.closing(self.connect()) as conn:
+        with self._write_connection(table_name, schema_name) as conn:
             cursor = conn.cursor()
 
             if replace:
                 cursor.execute(f'DELETE FROM "{schema_name}"."{table_name}"')
 
+            if mode == "bulk":
+                self._insert_table_bulk(
+                    cursor, table_name, schema_name, df, staging_schema
+                )
+                return
+            if mode == "prepared":
+                self._insert_table_prepared(
+                    cursor, table_name, schema_name, df, chunk_size
+                )
+                return
+
             for i in range(0, len(df), chunk_size):
                 chunk = df.iloc[i : i + chunk_size]
-                values_list = []
-                for _, row in chunk.iterrows():
-                    values = ", ".join(self._to_trino_literal(v) for v in row)
-                    values_list.append(f"({values})")
+                values_list = self._to_values_rows(chunk)
                 insert_query = f"""
                 INSERT INTO "{schema_name}"."{table_name}" ({columns})
                 VALUES {", ".join(values_list)}
@@ -21,9 +21,9 @@ def create_external(system_name: str, params: dict = None):
         template = f.read()
     query = template.format(**params) if params else template
     query = query.strip().rstrip(";")
-    api = TrinoAPI(host="trino.mynet", port=80, user="tig", catalog=catalog_name)
     print(f"🚀 Executing DDL for [{system_name}] from {sql_file_path}")
-    api.execute_action(query)
+    with TrinoAPI(host="trino.mynet", port=80, user="tig", catalog=catalog_name) as api:
+        api.execute_action(query)
 
 
 @task(name="Sync Trino Partition", retries=3, retry_delay_seconds=10)
@@ -31,13 +31,13 @@ def sync_table_partition(table_name: str):
     """1つのテーブルのパーティションを同期するタスク"""
     catalog_name = "hive"
     schema_name = "life_bronze"
-    api = TrinoAPI(
+    query = f"CALL hive.system.sync_partition_metadata('{schema_name}', '{table_name}', 'ADD')"
+    print(f"Executing: {query}")
+    with TrinoAPI(
         host="trino.mynet",
         port=80,
         user="tig",
         catalog=catalog_name,
-    )
-    query = f"CALL hive.system.sync_partition_metadata('{schema_name}', '{table_name}', 'ADD')"
-    print(f"Executing: {query}")
-    api.execute_action(query)
+    ) as api:
+        api.execute_action(query)
     print(f"{schema_name}.{table_name} のパーティション同期完了！")